@@ -44,13 +44,16 @@ import backend.mixins as mxn
 import backend.models as md
 import backend.schedules as schd
 import backend.security as scty
+import backend.serializers as srlz
 import backend.servers as srv
+import backend.solvers as slv
 import backend.track_usage as tu
 import backend.uclouvain_apis as ucl
 
 # CLI commands
 from cli import (
     cli_api_usage,
+    cli_benchmarks,
     cli_client,
     cli_external_calendars,
     cli_mails,
@@ -61,6 +64,7 @@ from cli import (
     cli_sql,
     cli_usage,
     cli_users,
+    cli_workers,
 )
 
 # Views imports
@@ -131,6 +135,8 @@ app.cli.add_command(cli_api_usage.api_usage)
 app.cli.add_command(cli_plots.plots)
 app.cli.add_command(cli_mails.mails)
 app.cli.add_command(cli_external_calendars.extcals)
+app.cli.add_command(cli_benchmarks.benchmark)
+app.cli.add_command(cli_workers.workers)
 
 # Load REDIS TTL config
 redis_ttl_config = configparser.ConfigParser()
@@ -157,13 +163,63 @@ app.config["ADE_FAKE_API"] = (
     else False
 )
 
+# Setup the HTTP session shared by all requests to the APIs
+ucl.configure_session(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", ucl.POOL_SIZE)),
+    timeout=(
+        float(os.getenv("HTTP_CONNECT_TIMEOUT", ucl.TIMEOUT[0])),
+        float(os.getenv("HTTP_READ_TIMEOUT", ucl.TIMEOUT[1])),
+    ),
+    retries=int(os.getenv("HTTP_RETRIES", ucl.RETRIES)),
+)
+
+# Optionally refresh expired courses in a background worker (see `flask workers courses`)
+app.config["ADE_BACKGROUND_REFRESH"] = (
+    bool(distutils.util.strtobool(os.environ["ADE_BACKGROUND_REFRESH"]))
+    if "ADE_BACKGROUND_REFRESH" in os.environ
+    else False
+)
+
+# Number of processes computing the best schedules in parallel, one week each
+slv.configure_workers(int(os.getenv("SOLVER_WORKERS", slv.WORKERS)))
+
+# Optionally compute the best schedules in a background worker (see
+# `flask workers schedules`)
+app.config["BACKGROUND_BEST_SCHEDULES"] = (
+    bool(distutils.util.strtobool(os.environ["BACKGROUND_BEST_SCHEDULES"]))
+    if "BACKGROUND_BEST_SCHEDULES" in os.environ
+    else False
+)
+
+# Optionally render again the ICS feeds of shared links when their courses change, in
+# a background worker (see `flask workers feeds`)
+app.config["BACKGROUND_ICS_FEEDS"] = (
+    bool(distutils.util.strtobool(os.environ["BACKGROUND_ICS_FEEDS"]))
+    if "BACKGROUND_ICS_FEEDS" in os.environ
+    else False
+)
+
+# Optional compression of large values stored in Redis: none, zlib, zstd or lz4
+app.config["REDIS_COMPRESSION"] = os.getenv("REDIS_COMPRESSION", None)
+app.config["REDIS_COMPRESSION_THRESHOLD"] = int(
+    os.getenv("REDIS_COMPRESSION_THRESHOLD", 1024)
+)
+
 manager = mng.Manager(
     ade.Client(app.config["ADE_API_CREDENTIALS"])
     if not app.config["ADE_FAKE_API"]
     else ade.FakeClient(app.config["ADE_API_CREDENTIALS"]),
-    srv.Server(host="localhost", port=6379),
+    srv.Server(
+        host="localhost",
+        port=6379,
+        compression=app.config["REDIS_COMPRESSION"],
+        compression_threshold=app.config["REDIS_COMPRESSION_THRESHOLD"],
+    ),
     md.db,
     redis_ttl_config,
+    background_refresh=app.config["ADE_BACKGROUND_REFRESH"],
+    background_best_schedules=app.config["BACKGROUND_BEST_SCHEDULES"],
+    background_ics_feeds=app.config["BACKGROUND_ICS_FEEDS"],
 )
 app.config["MANAGER"] = manager
 
@@ -245,6 +301,8 @@ app.config["SESSION_TYPE"] = "redis"
 app.config["SESSION_REDIS"] = manager.server
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(**redis_ttl_config["user_session"])
 app.config["SESSION_MANAGER"] = Session(app)
+# Schedules are pickled in a compact state in sessions only
+app.session_interface.serializer = srlz.SessionSerializer
 
 # Setup Flask-Babel
 app.config["LANGUAGES"] = ["en", "fr"]
@@ -404,6 +462,7 @@ def migrate(token):
 # Error handlers
 @app.errorhandler(HTTPError)
 @app.errorhandler(ConnectionError)
+@app.errorhandler(mng.FetchTimeoutError)
 def api_request_failed(e):
     """
     This catches the HTTPError raised when doing `resp.raise_for_status()`.
@@ -5,7 +5,19 @@ import pickle
 import time
 import warnings
 from collections import Counter, defaultdict
-from typing import Callable, Dict, List, Tuple, Type, Union
+from io import BytesIO
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 import pandas as pd
 import requests
@@ -18,7 +30,7 @@ import backend.resources as rsrc
 from backend import professors
 from backend.classrooms import Address, Classroom
 from backend.courses import Course
-from backend.uclouvain_apis import ADE
+from backend.uclouvain_apis import ADE, get_session
 
 
 class ExpiredTokenError(Exception):
@@ -336,7 +348,7 @@ def get_token(credentials: ClientCredentials) -> Tuple[str, int]:
     data = credentials["data"]
     authorization = credentials["Authorization"]
     header = {"Authorization": authorization}
-    resp = requests.post(url=url, headers=header, data=data)
+    resp = get_session().post(url=url, headers=header, data=data)
 
     if current_app:  # To prevent error on app initilisation where a token is requested
         md.ApiUsage("token", resp)
@@ -357,6 +369,51 @@ def response_to_root(response: requests.Response) -> etree._Element:
     return etree.fromstring(response.content)
 
 
+def iterparse_response(
+    response: requests.Response, tag: str, attributes_only: bool = False
+) -> Iterator[etree._Element]:
+    """
+    Parses an API response incrementally, yielding the elements matching a given tag in
+    document order.
+
+    Contrary to :func:`response_to_root`, the tree is never fully built: each element is
+    cleared, and removed from its parent, as soon as it has been parsed and consumed.
+    Therefore, the yielded elements must be consumed before requesting the next one.
+
+    :param response: a response from the API
+    :type response: requests.Response
+    :param tag: the tag of the elements
+    :type tag: str
+    :param attributes_only: if True, elements are yielded as soon as their start tag is
+        parsed, so only their attributes are available, and nested elements matching the
+        tag are also yielded in document order
+    :type attributes_only: bool
+    :return: the elements
+    :rtype: Iterator[etree._Element]
+    """
+    if attributes_only:
+        context = etree.iterparse(
+            BytesIO(response.content), events=("start", "end"), huge_tree=True
+        )
+    else:
+        context = etree.iterparse(
+            BytesIO(response.content), events=("end",), tag=tag, huge_tree=True
+        )
+
+    for event, element in context:
+        if event == "start":
+            if element.tag == tag:
+                yield element
+            continue
+        elif not attributes_only:
+            yield element
+
+        # The element and its previous siblings are not needed anymore
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
 def response_to_project_ids(project_ids_response: requests.Response) -> Dict[str, str]:
     """
     Extracts an API response into an iterator of project ids and years.
@@ -371,11 +428,48 @@ def response_to_project_ids(project_ids_response: requests.Response) -> Dict[str
     >>> response = client.get_project_ids()
     >>> ids_years = response_to_project_ids(response)
     """
-    root = response_to_root(project_ids_response)
-    ids = root.xpath("//project/@id")
-    years = root.xpath("//project/@name")
+    return {
+        project.get("name"): project.get("id")
+        for project in iterparse_response(
+            project_ids_response, "project", attributes_only=True
+        )
+    }
+
 
-    return {year: id for id, year in zip(ids, years)}
+def attributes_to_dataframe(
+    response: requests.Response, tag: str, index: str = "id"
+) -> pd.DataFrame:
+    """
+    Extracts the attributes of all the elements matching a given tag in an API response
+    into a dataframe.
+
+    The columns are the attributes of the first element.
+
+    :param response: a response from the API
+    :type response: requests.Response
+    :param tag: the tag of the elements
+    :type tag: str
+    :param index: the attribute used as index
+    :type index: str
+    :return: the attributes, one row per element
+    :rtype: pd.DataFrame
+    """
+    columns = None
+    values = []
+
+    for element in iterparse_response(response, tag, attributes_only=True):
+        if columns is None:
+            columns = element.attrib.keys()
+        values.append(element.attrib.values())
+
+    if columns is None:
+        raise IndexError(f"no element <{tag}> was found in the response")
+
+    df = pd.DataFrame(data=values, columns=columns, dtype=str)
+
+    df.set_index(index, inplace=True)
+
+    return df
 
 
 def response_to_resources(resources_response: requests.Response) -> pd.DataFrame:
@@ -392,19 +486,7 @@ def response_to_resources(resources_response: requests.Response) -> pd.DataFrame
     >>> response = client.get_resources(9)  # project id for 2019-2020
     >>> resources = response_to_resources(response)
     """
-    root = response_to_root(resources_response)
-
-    resources = root.xpath("//resource/.")
-
-    index = resources[0].attrib.keys()
-
-    values = [resource.attrib.values() for resource in resources]
-
-    df = pd.DataFrame(data=values, columns=index, dtype=str)
-
-    df.set_index("id", inplace=True)
-
-    return df
+    return attributes_to_dataframe(resources_response, "resource")
 
 
 def response_to_course_resources(
@@ -419,26 +501,12 @@ def response_to_course_resources(
     :return: all the course resources
     :rtype: pd.Dataframe
     """
-    dfs = []
-
     categories = [rsrc.TYPES.COURSE, rsrc.TYPES.COURSE_COMBO]
 
-    for response, category in zip(course_resources_response, categories):
-        root = response_to_root(response)
-
-        resources = root.xpath(f"//{category}/.")
-
-        index = resources[0].attrib.keys()
-
-        values = [resource.attrib.values() for resource in resources]
-
-        df = pd.DataFrame(data=values, columns=index, dtype=str)
-
-        df.set_index("id", inplace=True)
-
-        dfs.append(df)
-
-    return pd.concat(dfs)
+    return pd.concat(
+        attributes_to_dataframe(response, category)
+        for response, category in zip(course_resources_response, categories)
+    )
 
 
 def response_to_resource_ids(resource_ids_response) -> Dict[str, str]:
@@ -455,22 +523,14 @@ def response_to_resource_ids(resource_ids_response) -> Dict[str, str]:
     >>> response = client.get_resource_ids(9)  # project id for 2019-2020
     >>> resources_ids = response_to_resource_ids(response)
     """
-    root = response_to_root(resource_ids_response)
+    ids = defaultdict(list)
 
-    df = pd.DataFrame(
-        data=root.xpath("//resource/@id"),
-        index=map(lambda x: x.upper(), root.xpath("//resource/@name")),
-        columns=["id"],
-        dtype=str,
-    )
-
-    d = (
-        df.groupby(level=0)
-        .apply(lambda x: "|".join(x.to_dict(orient="list")["id"]))
-        .to_dict()
-    )
+    for resource in iterparse_response(
+        resource_ids_response, "resource", attributes_only=True
+    ):
+        ids[resource.get("name").upper()].append(resource.get("id"))
 
-    return d
+    return {name: "|".join(ids[name]) for name in sorted(ids)}
 
 
 def room_to_classroom(room: etree._Element) -> Classroom:
@@ -514,16 +574,69 @@ def response_to_classrooms(classrooms_response: requests.Response) -> List[Class
     >>> response = client.get_classrooms(9)  # project id for 2019-2020
     >>> classrooms = response_to_classrooms(response)
     """
-    root = response_to_root(classrooms_response)
+    return [
+        room_to_classroom(room)
+        for room in iterparse_response(
+            classrooms_response, "room", attributes_only=True
+        )
+    ]
 
-    rooms = root.xpath("//room")
 
-    classrooms = []
-    for room in rooms:
-        classroom = room_to_classroom(room)
-        classrooms.append(classroom)
+def event_participants(event: etree._Element) -> Dict[str, List[etree._Element]]:
+    """
+    Groups the participants of an event by category, in a single pass over its
+    descendants.
+
+    :param event: the event element
+    :type event: etree._Element
+    :return: the participants, with their category as key
+    :rtype: Dict[str, List[etree._Element]]
+    """
+    participants = defaultdict(list)
+
+    for participant in event.iter("eventParticipant"):
+        participants[participant.get("category")].append(participant)
 
-    return classrooms
+    return participants
+
+
+def read_event(
+    event: etree._Element,
+    participants: Optional[Dict[str, List[etree._Element]]] = None,
+) -> Dict[str, Any]:
+    """
+    Reads the information of an event element, without parsing its date and hours.
+
+    :param event: the event element
+    :type event: etree._Element
+    :param participants: the participants of the event, as returned by
+        :func:`event_participants`, if already known
+    :type participants: Optional[Dict[str, List[etree._Element]]]
+    :return: the date, startHour, endHour, professor, classrooms and note of the event
+    :rtype: Dict[str, Any]
+    """
+    if participants is None:
+        participants = event_participants(event)
+
+    attrib = event.attrib
+    classrooms = [
+        room_to_classroom(room) for room in participants.get(rsrc.TYPES.CLASSROOM, [])
+    ]
+    event_instructor = professors.merge_professors(
+        [
+            professors.Professor(instructor.attrib["name"], None)
+            for instructor in participants.get(rsrc.TYPES.TEACHER, [])
+        ]
+    )
+
+    return dict(
+        date=attrib["date"],
+        startHour=attrib["startHour"],
+        endHour=attrib["endHour"],
+        professor=event_instructor,
+        classrooms=classrooms,
+        note=attrib["note"],
+    )
 
 
 def parse_event(
@@ -532,6 +645,7 @@ def parse_event(
     activity_name: str,
     activity_id: str,
     activity_code: str,
+    participants: Optional[Dict[str, List[etree._Element]]] = None,
 ) -> backend.events.AcademicalEvent:
     """
     Parses an element from a request into an academical event.
@@ -547,54 +661,55 @@ def parse_event(
     :type activity_id: str
     :param activity_code: the code of the activity
     :type activity_code: str
+    :param participants: the participants of the event, as returned by
+        :func:`event_participants`, if already known
+    :type participants: Optional[Dict[str, List[etree._Element]]]
     :return: the academical event
     :rtype: backend.events.AcademicalEvent
     """
-    event_date = event.attrib["date"]
-    event_start = event.attrib["startHour"]
-    event_end = event.attrib["endHour"]
-    rooms = event.xpath('.//eventParticipant[@category="classroom"]')
-    classrooms = [room_to_classroom(room) for room in rooms]
-    note = event.attrib["note"]
-
-    instructors = list()
-    for instructor in event.xpath('.//eventParticipant[@category="instructor"]'):
-        instructors.append(professors.Professor(instructor.attrib["name"], None))
-    event_instructor = professors.merge_professors(instructors)
+    fields = read_event(event, participants=participants)
 
     # We create the event
-    t0, t1 = backend.events.extract_datetime(event_date, event_start, event_end)
+    t0, t1 = backend.events.extract_datetime(
+        fields.pop("date"), fields.pop("startHour"), fields.pop("endHour")
+    )
     return event_type(
         name=activity_name,
         begin=t0,
         end=t1,
-        professor=event_instructor,
-        classrooms=classrooms,
         id=activity_id,
         code=activity_code,
-        note=note,
+        **fields,
     )
 
 
-def parse_activity(
+def read_activity(
     activity: etree._Element,
-) -> Tuple[List[backend.events.AcademicalEvent], str, str, str]:
+) -> Tuple[str, str, str, Type[backend.events.AcademicalEvent], List[Dict[str, Any]]]:
     """
-    Parses an element from a request into a list of events and some activity information.
+    Reads the information of an activity element and of its events, without creating
+    the events.
+
+    The activity is walked only once: the participants of each event are grouped by
+    category before the activity code is determined.
 
     :param activity: the activity element
     :type activity: etree._Element
-    :return: the events, the name, the id and the code of this activity
-    :rtype: Tuple[List[backend.events.AcademicalEvent], str, str, str]
+    :return: the name, the id, the code, the event type of this activity and its events,
+        as returned by :func:`read_event`
+    :rtype: Tuple[str, str, str, Type[backend.events.AcademicalEvent], List[Dict[str, Any]]]
     """
     activity_id = activity.attrib["name"]
     activity_type = activity.attrib["type"]
     activity_name = activity.attrib["code"]
 
     event_type = backend.events.extract_type(activity_type, activity_id)
-    event_codes = activity.xpath('.//eventParticipant[@category="category5"]/@name')
-    events = activity.xpath(".//event")
-    events_list = list()
+    events = [(event, event_participants(event)) for event in activity.iter("event")]
+    event_codes = [
+        participant.get("name")
+        for _, participants in events
+        for participant in participants.get(rsrc.TYPES.COURSE, [])
+    ]
 
     if len(event_codes) == 0:
         activity_code = backend.events.extract_code(activity_id)
@@ -603,12 +718,79 @@ def parse_activity(
     if activity_code == "":
         activity_code = "Other"
 
-    for event in events:
-        events_list.append(
-            parse_event(event, event_type, activity_name, activity_id, activity_code)
-        )
+    events_fields = [
+        read_event(event, participants=participants) for event, participants in events
+    ]
+
+    return activity_name, activity_id, activity_code, event_type, events_fields
+
+
+def parse_activities(
+    activities: Iterable[etree._Element],
+) -> List[Tuple[List[backend.events.EventRecord], str, str, str]]:
+    """
+    Parses elements from a request into lists of events and some activity information.
 
-    return events_list, activity_name, activity_id, activity_code
+    All the activities are read first, so that the dates and hours of all their events
+    are parsed at once, see :func:`backend.events.extract_datetimes`. Events are
+    returned as compact records, see :class:`backend.events.EventRecord`.
+
+    :param activities: the activity elements
+    :type activities: Iterable[etree._Element]
+    :return: for each activity, the events, the name, the id and the code
+    :rtype: List[Tuple[List[backend.events.EventRecord], str, str, str]]
+    """
+    activities = [read_activity(activity) for activity in activities]
+
+    events_fields = [
+        fields for *_, activity_fields in activities for fields in activity_fields
+    ]
+    begins, ends = backend.events.extract_datetimes(
+        [fields.pop("date") for fields in events_fields],
+        [fields.pop("startHour") for fields in events_fields],
+        [fields.pop("endHour") for fields in events_fields],
+    )
+    times = iter(zip(begins, ends))
+
+    parsed = list()
+
+    for (
+        activity_name,
+        activity_id,
+        activity_code,
+        event_type,
+        activity_fields,
+    ) in activities:
+        events_list = list()
+        for fields, (t0, t1) in zip(activity_fields, times):
+            events_list.append(
+                backend.events.EventRecord(
+                    event_type,
+                    name=activity_name,
+                    begin=t0,
+                    end=t1,
+                    id=activity_id,
+                    code=activity_code,
+                    **fields,
+                )
+            )
+        parsed.append((events_list, activity_name, activity_id, activity_code))
+
+    return parsed
+
+
+def parse_activity(
+    activity: etree._Element,
+) -> Tuple[List[backend.events.EventRecord], str, str, str]:
+    """
+    Parses an element from a request into a list of events and some activity information.
+
+    :param activity: the activity element
+    :type activity: etree._Element
+    :return: the events, the name, the id and the code of this activity
+    :rtype: Tuple[List[backend.events.EventRecord], str, str, str]
+    """
+    return parse_activities([activity])[0]
 
 
 def response_to_courses(activities_response: requests.Response) -> List[Course]:
@@ -625,16 +807,12 @@ def response_to_courses(activities_response: requests.Response) -> List[Course]:
     >>> response = client.get_activities(['1234'], 9)  # project id for 2019-2020
     >>> courses = response_to_courses(response)
     """
-    root = response_to_root(activities_response)
-
     courses = defaultdict(Course)
 
     # Each activity has its unique event type
-    for activity in root.xpath("//activity"):
-        events_list, activity_name, activity_id, activity_code = parse_activity(
-            activity
-        )
-
+    for events_list, activity_name, activity_id, activity_code in parse_activities(
+        iterparse_response(activities_response, "activity")
+    ):
         if activity_code not in courses and events_list:
             courses[activity_code] = Course(activity_code, activity_name)
         if events_list:
@@ -643,35 +821,117 @@ def response_to_courses(activities_response: requests.Response) -> List[Course]:
     return list(courses.values())
 
 
+def response_to_courses_by_resource(
+    activities_response: requests.Response, resource_ids: Dict[str, str]
+) -> Tuple[Dict[str, List[Course]], List[str]]:
+    """
+    Extracts an API response to a request on several resources into the courses of
+    each of them, see :func:`response_to_courses`.
+
+    Each activity is attributed to every code having one of its event participants
+    among its resource ids, whatever the code of the activity itself, so that a
+    resource shared by several codes gives its activities to each of them. The codes
+    without any activity are returned apart, without courses.
+
+    If an activity cannot be attributed, as none of its participants is a requested
+    resource (e.g., it is one of a sub-resource), the code it was parsed with (see
+    :func:`backend.events.extract_code`) is returned apart, to be fetched alone, the
+    other codes being kept. If that code was not requested either, any code may be
+    missing the activity: all the codes are returned apart.
+
+    :param activities_response: a response from the API to the activities request
+    :type activities_response: requests.Response
+    :param resource_ids: the resource ids of each requested code, as in
+        :func:`response_to_resource_ids`
+    :type resource_ids: Dict[str, str]
+    :return: the courses of each code that could be matched, and the codes that could
+        not
+    :rtype: Tuple[Dict[str, List[Course]], List[str]]
+
+    :Example:
+
+    >>> ids = {'LEPL1101': '1234', 'LEPL1102': '5678'}
+    >>> response = client.get_activities(list(ids.values()), 9)
+    >>> courses, not_matched = response_to_courses_by_resource(response, ids)
+    """
+    owners = defaultdict(set)
+
+    for code, ids in resource_ids.items():
+        for resource_id in ids.split("|"):
+            owners[resource_id].add(code)
+
+    participants = list()
+
+    def activities():
+        # Participants are read before the activity is parsed and cleared
+        for activity in iterparse_response(activities_response, "activity"):
+            participants.append(
+                {
+                    participant.get("id")
+                    for participant in activity.iter("eventParticipant")
+                }
+            )
+            yield activity
+
+    courses = defaultdict(dict)
+    unattributed = set()
+
+    for (events_list, activity_name, activity_id, activity_code), ids in zip(
+        parse_activities(activities()), participants
+    ):
+        if not events_list:
+            continue
+
+        codes = set().union(*(owners[i] for i in ids if i in owners))
+
+        if not codes:
+            code = backend.events.extract_code(activity_code).upper()
+
+            if code not in resource_ids:
+                return dict(), list(resource_ids)
+
+            unattributed.add(code)
+            continue
+
+        for code in codes:
+            if activity_code not in courses[code]:
+                courses[code][activity_code] = Course(activity_code, activity_name)
+            courses[code][activity_code].add_activity(events_list)
+
+    matched = {
+        code: list(courses[code].values())
+        for code in resource_ids
+        if courses[code] and code not in unattributed
+    }
+
+    return matched, [code for code in resource_ids if code not in matched]
+
+
 def response_to_events(
     activities_response: requests.Response,
-    filter_func: Callable[[backend.events.AcademicalEvent], bool],
-) -> List[backend.events.AcademicalEvent]:
+    filter_func: Callable[[backend.events.EventRecord], bool],
+) -> List[backend.events.EventRecord]:
     """
     Extracts an API response into list of events.
 
     :param activities_response: a response from the API to the activities request
     :type activities_response: requests.Response
     :param filter_func: a function to filter out events
-    :type filter_func: Callable[[backend.events.AcademicalEvent], bool]
+    :type filter_func: Callable[[backend.events.EventRecord], bool]
     :return: all events present in the response, optionnally filtered
-    :rtype: List[backend.events.AcademicalEvents]
+    :rtype: List[backend.events.EventRecord]
 
     :Example:
 
     >>> response = client.get_activities(['1234'], 9)  # project id for 2019-2020
     >>> events = response_to_events(response)
     """
-    root = response_to_root(activities_response)
-
     events = list()
 
     # Each activity has its unique event type
-    for activity in root.xpath("//activity"):
-        events_list, activity_name, activity_id, activity_code = parse_activity(
-            activity
-        )
-
+    for events_list, activity_name, activity_id, activity_code in parse_activities(
+        iterparse_response(activities_response, "activity")
+    ):
         events.extend(filter(filter_func, events_list))
 
     return events
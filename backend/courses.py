@@ -1,14 +1,21 @@
+import hashlib
+import uuid
 from collections import defaultdict
 from itertools import repeat
 from typing import Any, Dict, Iterable, List, Optional, Set, Union
 
+import numpy as np
 import pandas as pd
 
-from backend.events import AcademicalEvent
+from backend.events import AcademicalEvent, EventRecord
 
 View = Union[List[str], Set[str], Dict[int, str]]
 
 
+INDEX = ["code", "type", "id"]
+FIELDS = INDEX + ["week", "begin", "end", "event"]
+
+
 def generate_empty_dataframe():
     index = ["code", "type", "id"]
     columns = ["week", "event"]
@@ -19,11 +26,95 @@ def generate_empty_dataframe():
     return activities
 
 
+def to_timestamp(time: Any) -> float:
+    """
+    Returns the POSIX timestamp of a datetime or an arrow object.
+
+    :param time: the datetime or arrow object
+    :type time: Any
+    :return: the timestamp, in seconds
+    :rtype: float
+    """
+    return getattr(time, "datetime", time).timestamp()
+
+
+def to_object_array(values: Iterable[Any]) -> np.ndarray:
+    """
+    Returns an array of objects, preventing numpy from unpacking the values.
+
+    :param values: the values
+    :type values: Iterable[Any]
+    :return: the array
+    :rtype: np.ndarray
+    """
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def dataframe_to_columns(activities: pd.DataFrame) -> Dict[str, List[Any]]:
+    """
+    Converts activities, as formerly stored in a course, into columns.
+
+    :param activities: a structure of all the events indexed by code, type and id
+    :type activities: pd.DataFrame
+    :return: the columns
+    :rtype: Dict[str, List[Any]]
+    """
+    index = activities.index
+    events = activities["event"].tolist()
+
+    return {
+        "code": index.get_level_values("code").tolist(),
+        "type": index.get_level_values("type").tolist(),
+        "id": index.get_level_values("id").tolist(),
+        "week": [int(week) for week in activities["week"]],
+        "begin": [to_timestamp(event.begin) for event in events],
+        "end": [to_timestamp(event.end) for event in events],
+        "event": events,
+    }
+
+
+def canonical_view(view: Optional[View]) -> Optional[list]:
+    """
+    Returns a canonical, JSON serializable, representation of a view, e.g. to be hashed.
+
+    :param view: the view, as accepted by :func:`Course.get_mask`
+    :type view: Optional[View]
+    :return: the sorted ids, or the sorted weeks with their sorted ids
+    :rtype: Optional[list]
+    """
+    if view is None:
+        return None
+    elif isinstance(view, dict):
+        return sorted((int(week), sorted(ids)) for week, ids in view.items() if ids)
+    else:
+        return sorted(view)
+
+
+def new_revision() -> str:
+    """
+    Returns a new, unique, revision token.
+
+    :return: the revision
+    :rtype: str
+    """
+    return uuid.uuid4().hex
+
+
 class Course:
     """
     A course aims to represent one or more courses.
     It contains its events and is represented with a name and a code.
 
+    Activities are stored in columns (code, type, id, week, begin, end and event), one
+    row per event, that are only appended to. Dataframes are built on demand, see
+    :func:`Course.get_activities`.
+
+    Each course has a revision, a token renewed whenever activities are added, so that
+    anything derived from its content can be cached until it changes.
+
     :param code: the code of the course
     :type code: str
     :param name: the full name of the course
@@ -50,10 +141,31 @@ class Course:
         self.name = name
         self.weight = weight
 
+        self._columns = {field: [] for field in FIELDS}
+        self._arrays = None
+        self.revision = new_revision()
+
         if activities is not None:
-            self.activities = activities
-        else:
-            self.activities = generate_empty_dataframe()
+            self.extend(dataframe_to_columns(activities))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        activities = state.pop("activities", None)
+        self.__dict__.update(state)
+        self._arrays = None
+
+        # Courses pickled before they had a revision
+        if "revision" not in state:
+            self.revision = new_revision()
+
+        # Courses pickled before activities were stored in columns
+        if activities is not None:
+            self._columns = {field: [] for field in FIELDS}
+            self.extend(dataframe_to_columns(activities))
 
     def __eq__(self, other: Union["Course", str]) -> bool:
         if isinstance(other, Course):
@@ -66,12 +178,87 @@ class Course:
     def __ne__(self, other: Union["Course", str]) -> bool:
         return not self.__eq__(other)
 
+    def __len__(self) -> int:
+        return len(self._columns["event"])
+
     def __str__(self) -> str:
         return self.code + ": " + self.name
 
     def __repr__(self) -> str:
         return str(self)
 
+    @property
+    def activities(self) -> pd.DataFrame:
+        return self.get_activities()
+
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        Returns a compact, columnar representation of this course, made of plain lists
+        only, so that it can be serialized without pandas' internals.
+
+        :return: the columns
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "code": self.code,
+            "name": self.name,
+            "weight": self.weight,
+            "revision": self.revision,
+            "codes": self._columns["code"],
+            "types": self._columns["type"],
+            "ids": self._columns["id"],
+            "weeks": self._columns["week"],
+            "begins": self._columns["begin"],
+            "ends": self._columns["end"],
+            "events": self._columns["event"],
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "Course":
+        """
+        Creates a course from its columnar representation.
+
+        :param columns: the columns, as returned by :func:`Course.to_columns`
+        :type columns: Dict[str, Any]
+        :return: the course
+        :rtype: Course
+        """
+        course = cls(columns["code"], columns["name"], weight=columns["weight"])
+        events = columns["events"]
+
+        # Begins and ends were not part of the representation at first
+        course.extend(
+            {
+                "code": columns["codes"],
+                "type": columns["types"],
+                "id": columns["ids"],
+                "week": columns["weeks"],
+                "begin": columns.get("begins")
+                or [to_timestamp(event.begin) for event in events],
+                "end": columns.get("ends")
+                or [to_timestamp(event.end) for event in events],
+                "event": events,
+            }
+        )
+
+        # Revisions were not part of the representation at first
+        course.revision = columns.get("revision") or course.revision
+
+        return course
+
+    def extend(self, columns: Dict[str, Iterable[Any]]):
+        """
+        Appends rows to the current course's activities, in bulk.
+
+        :param columns: the values of each field (see :data:`FIELDS`) of the rows
+        :type columns: Dict[str, Iterable[Any]]
+        """
+        for field in FIELDS:
+            self._columns[field].extend(columns[field])
+
+        self._arrays = None
+        self.revision = new_revision()
+
     def add_activity(self, events: List[AcademicalEvent]):
         """
         Adds an activity to the current course's activities. An activity is a set of events with the same id.
@@ -81,13 +268,41 @@ class Course:
         """
         if len(events) == 0:
             return
-        data = [[event.get_week(), event] for event in events]
-        event_type = type(events[0])
-        id = events[0].id
-        tuples = list(repeat((self.code, event_type, id), len(data)))
-        index = pd.MultiIndex.from_tuples(tuples, names=self.activities.index.name)
-        df = pd.DataFrame(data=data, columns=self.activities.columns, index=index)
-        self.activities = pd.concat([self.activities, df])
+        n = len(events)
+        self.extend(
+            {
+                "code": repeat(self.code, n),
+                "type": repeat(events[0].event_type, n),
+                "id": repeat(events[0].id, n),
+                "week": [event.get_week() for event in events],
+                "begin": [to_timestamp(event.begin) for event in events],
+                "end": [to_timestamp(event.end) for event in events],
+                "event": events,
+            }
+        )
+
+    def get_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the activities as contiguous arrays, one per field (see :data:`FIELDS`).
+
+        The arrays are cached until new activities are added, and must not be modified.
+
+        :return: the arrays
+        :rtype: Dict[str, np.ndarray]
+        """
+        if self._arrays is None:
+            columns = self._columns
+            self._arrays = {
+                "code": to_object_array(columns["code"]),
+                "type": to_object_array(columns["type"]),
+                "id": to_object_array(columns["id"]),
+                "week": np.array(columns["week"], dtype=np.int64),
+                "begin": np.array(columns["begin"], dtype=np.float64),
+                "end": np.array(columns["end"], dtype=np.float64),
+                "event": to_object_array(columns["event"]),
+            }
+
+        return self._arrays
 
     def set_weights(
         self, percentage: float = 50, event_type: Optional[AcademicalEvent] = None
@@ -100,16 +315,39 @@ class Course:
         :param event_type: if present, modify the weight of a certain type of event only
         :type event_type: Optional[AcademicalEvent]
         """
+        for event, type in zip(self._columns["event"], self._columns["type"]):
+            if event_type is None or type == event_type:
+                event.set_weight(percentage / 10)
 
-        def f(event):
-            event.set_weight(percentage / 10)
+    def get_digest(self) -> str:
+        """
+        Returns a digest of the content of this course. Contrary to its revision, it is
+        the same for two courses parsed from the same activities, e.g., when a course is
+        fetched again without having changed. Weights are not part of the content.
 
-        if event_type is None:
-            self.activities["event"].apply(f)
-        else:
-            level = self.activities.index.names.index(event_type)
-            valid = self.activities.index.get_level_values(level) == event_type
-            self.activities["event"][valid].apply(f)
+        :return: the digest
+        :rtype: str
+        """
+        digest = hashlib.sha256(f"{self.code}\n{self.name}".encode())
+
+        for event in self._columns["event"]:
+            if isinstance(event, EventRecord):
+                fields = [
+                    getattr(event, slot)
+                    for slot in EventRecord.__slots__
+                    if slot not in ("weight", "_uid")
+                ]
+            else:
+                fields = [
+                    event.name,
+                    event.begin,
+                    event.end,
+                    event.id,
+                    event.description,
+                ]
+            digest.update(("\n".join(map(str, fields)) + "\n").encode())
+
+        return digest.hexdigest()
 
     def get_summary(self) -> Dict[str, Set[str]]:
         """
@@ -120,66 +358,114 @@ class Course:
         """
         # TODO: Fix summary for external calendar
         summary = defaultdict(set)
-        ids = self.activities.index.get_level_values("id").sort_values().unique()
-        for id in ids:
+        for id in sorted(set(self._columns["id"])):
             event_type, code = id.split(": ", maxsplit=1)
             summary[event_type].add(code)
 
         return summary
 
-    def get_activities(
+    def get_mask(
         self, view: Optional[View] = None, reverse: bool = False
-    ) -> pd.DataFrame:
+    ) -> Optional[np.ndarray]:
         """
-        Returns a table of all activities that optionally match correct ids.
+        Returns which activities optionally match correct ids.
 
         :param view: if present, list of ids or dict {week_number : ids}
         :type view: Optional[View]
         :param reverse: if True, the activities in View will be removed
         :type reverse: bool
-        :return: table containing all the activities and their events
-        :rtype: pd.DataFrame
+        :return: a boolean array, True for the selected rows
+        :rtype: Optional[np.ndarray]
         """
+        n = len(self)
+
+        def isin(ids: Iterable[str]) -> np.ndarray:
+            ids = set(ids)
+            return np.fromiter((id in ids for id in self._columns["id"]), bool, n)
+
         if view is None:
-            return self.activities
+            return np.ones(n, dtype=bool)
         elif isinstance(view, list) or isinstance(view, set):
-            valid = self.activities.index.get_level_values("id").isin(view)
+            valid = isin(view)
 
             if reverse:
                 valid = ~valid
 
-            return self.activities[valid]
+            return valid
         elif isinstance(view, dict):
-            activities = [generate_empty_dataframe()]
+            weeks = self.get_arrays()["week"]
+            valid = np.zeros(n, dtype=bool)
 
-            grp_weeks = self.activities.groupby("week")
+            for week, ids in view.items():
+                in_week = weeks == week
+                in_view = in_week & isin(ids)
 
-            # weeks that are both in ids dict and in activities
-            valid_weeks = set(view.keys()).intersection(grp_weeks.groups.keys())
+                if reverse:
+                    valid |= in_week & ~in_view
+                else:
+                    valid |= in_view
 
-            for week in valid_weeks:
-                week_data = grp_weeks.get_group(week)
-                valid = week_data.index.get_level_values("id").isin(view[week])
+            return valid
+        else:
+            return None
 
-                if reverse:
-                    valid = ~valid
+    def get_columns(
+        self, view: Optional[View] = None, reverse: bool = False
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Returns the arrays of all activities that optionally match correct ids.
+
+        :param view: if present, list of ids or dict {week_number : ids}
+        :type view: Optional[View]
+        :param reverse: if True, the activities in View will be removed
+        :type reverse: bool
+        :return: the arrays, one per field (see :data:`FIELDS`)
+        :rtype: Optional[Dict[str, np.ndarray]]
+        """
+        valid = self.get_mask(view=view, reverse=reverse)
 
-                activities.append(week_data[valid])
+        if valid is None:
+            return None
 
-            return pd.concat(activities)
-        else:
+        return {field: array[valid] for field, array in self.get_arrays().items()}
+
+    def get_activities(
+        self, view: Optional[View] = None, reverse: bool = False
+    ) -> pd.DataFrame:
+        """
+        Returns a table of all activities that optionally match correct ids.
+
+        :param view: if present, list of ids or dict {week_number : ids}
+        :type view: Optional[View]
+        :param reverse: if True, the activities in View will be removed
+        :type reverse: bool
+        :return: table containing all the activities and their events
+        :rtype: pd.DataFrame
+        """
+        columns = self.get_columns(view=view, reverse=reverse)
+
+        if columns is None:
             return None
+        elif len(columns["event"]) == 0:
+            return generate_empty_dataframe()
+
+        index = pd.MultiIndex.from_arrays(
+            [columns[field] for field in INDEX], names=INDEX
+        )
+        return pd.DataFrame(
+            data={"week": columns["week"], "event": columns["event"]}, index=index
+        )
 
     def get_events(self, **kwargs) -> Iterable[AcademicalEvent]:
         """
         Returns a list of events that optionally matches correct ids.
 
-        :param kwargs: parameters that will be passed to :func:`Course.get_activities`
+        :param kwargs: parameters that will be passed to :func:`Course.get_columns`
         :type kwargs: Any
         :return: list of events
         :rtype: Iterable[AcademicalEvent]
         """
-        return self.get_activities(**kwargs)["event"].values
+        return self.get_columns(**kwargs)["event"]
 
 
 def merge_courses(
@@ -201,18 +487,19 @@ def merge_courses(
     :type name: str
     :param weight: the new weight
     :type weight: float
-    :param views: map of views that will be passed to :func:`Course.get_activities`
+    :param views: map of views that will be passed to :func:`Course.get_columns`
     :type views: Optional[Dict[str, View]]
-    :param kwargs: additional parameters that will be passed to :func:`Course.get_activities`
+    :param kwargs: additional parameters that will be passed to :func:`Course.get_columns`
     :type kwargs: Any
     :return: the new course
     :rtype: Course
     """
-    if views:
-        activities = pd.concat(
-            course.get_activities(view=views[course.code], **kwargs)
-            for course in courses
-        )
-    else:
-        activities = pd.concat(course.get_activities(**kwargs) for course in courses)
-    return Course(code=code, name=name, weight=weight, activities=activities)
+    merged = Course(code=code, name=name, weight=weight)
+
+    for course in courses:
+        if views:
+            merged.extend(course.get_columns(view=views[course.code], **kwargs))
+        else:
+            merged.extend(course.get_columns(**kwargs))
+
+    return merged
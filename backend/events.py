@@ -1,8 +1,12 @@
+import hashlib
 import re
+import sys
 import unicodedata
-from datetime import datetime
-from typing import Any, Dict, Iterable, Optional, Tuple, Type, Union
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
 
+import numpy as np
+import pandas as pd
 from flask_babel import gettext
 from ics import Event
 from ics.utils import arrow_to_iso, get_arrow
@@ -17,6 +21,8 @@ COURSE_REGEX = "^([A-Z]+[0-9]+)"
 PRETTY_HOUR_FORMAT = "HH:mm"
 PRETTY_DATE_FORMAT = "DD/MM/YY"
 PRETTY_FORMAT = "HH:mm - DD/MM/YY"
+# Domain of the UIDs derived from academical events
+UID_DOMAIN = "ade-scheduler"
 
 
 def pretty_hour_formatter(arrow) -> str:
@@ -124,6 +130,15 @@ class CustomEvent(Event):
         """
         self.weight = weight
 
+    def to_event(self) -> "CustomEvent":
+        """
+        Returns this event as an ics.Event, that is, itself.
+
+        :return: the event
+        :rtype: CustomEvent
+        """
+        return self
+
     def json(self, color: str = None) -> Dict[str, Any]:
         """
         Returns the event as a json-like format.
@@ -320,6 +335,10 @@ class AcademicalEvent(CustomEvent):
     def matches(cls, string):
         return any(kw in string for kw in cls.KEYWORDS)
 
+    @property
+    def event_type(self) -> Type["AcademicalEvent"]:
+        return type(self)
+
     def get_id(self) -> str:
         """
         Returns the id of this event.
@@ -413,6 +432,269 @@ class EventEXTERN(AcademicalEvent):
         return e
 
 
+class EventRecord:
+    """
+    A compact, slotted record of an academical event, as parsed from the ADE API.
+
+    Records are the representation stored in courses: they only hold what is needed to
+    compute schedules (begin, end, weight, id and code) and strings to render the event.
+    The description, the JSON and the ics.Event are built on demand, see
+    :func:`EventRecord.json` and :func:`EventRecord.to_event`.
+
+    :param event_type: the type of the event
+    :type event_type: Type[AcademicalEvent]
+    :param name: the name of the event
+    :type name: str
+    :param begin: the start of the event
+    :type begin: datetime
+    :param end: the end of the event
+    :type end: datetime
+    :param professor: the professor(s) in charge of this event
+    :type professor: Professor
+    :param classrooms: all the classrooms were this event takes place
+    :type classrooms: Optional[List[Classroom]]
+    :param id: the id of the event
+    :type id: Optional[str]
+    :param weight: the weight attributed to the event
+    :type weight: Union[int, float]
+    :param code: code of the course related to this event
+    :type code: Optional[str]
+    :param note: a note to be added to the event description
+    :type str: Optional[str]
+    """
+
+    __slots__ = (
+        "event_type",
+        "raw_name",
+        "begin",
+        "end",
+        "professor",
+        "location",
+        "classroom_ids",
+        "id",
+        "code",
+        "note",
+        "weight",
+        "_uid",
+    )
+
+    color = CustomEvent.DEFAULT_COLOR
+    all_day = False
+
+    def __init__(
+        self,
+        event_type: Type[AcademicalEvent],
+        name: str,
+        begin: datetime,
+        end: datetime,
+        professor: Professor,
+        classrooms: Optional[Iterable[Classroom]] = None,
+        id: Optional[str] = None,
+        weight: Union[int, float] = 5,
+        code: Optional[str] = None,
+        note: Optional[str] = None,
+    ):
+        # Strings are interned as most of them are shared by many events
+        self.event_type = event_type
+        self.raw_name = sys.intern(name) if name else name
+        self.begin = begin
+        self.end = end
+        self.professor = sys.intern(str(professor))
+        self.location = (
+            sys.intern(merge_classrooms(classrooms).location()) if classrooms else ""
+        )
+        self.classroom_ids = tuple(
+            classroom.infos["id"] for classroom in classrooms or []
+        )
+        self.id = sys.intern(f"{self.prefix}{id}")
+        self.code = sys.intern(code) if code else code
+        self.note = note
+        self.weight = weight
+        self._uid = None
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state: tuple):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __repr__(self) -> str:
+        return (
+            self.id
+            + ":"
+            + self.begin.strftime("%d/%m - %Hh%M")
+            + " to "
+            + self.end.strftime("%Hh%M")
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            self.get_id() == other.get_id()
+            and self.begin == other.begin
+            and self.duration == other.duration
+        )
+
+    def __ne__(self, other: Any) -> bool:
+        return not self.__eq__(other)
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.begin, self.end))
+
+    def __lt__(self, other: Any) -> bool:
+        return (self.begin, self.end) < (other.begin, other.end)
+
+    def __gt__(self, other: Any) -> bool:
+        return (self.begin, self.end) > (other.begin, other.end)
+
+    @property
+    def uid(self) -> str:
+        # Derived from the event, so that it is the same in every process, whenever
+        # the course is parsed or loaded; the same activity can be in several courses
+        if self._uid is None:
+            key = f"{self.code}:{self.id}:{int(self.begin.timestamp())}"
+            self._uid = f"{hashlib.sha1(key.encode()).hexdigest()}@{UID_DOMAIN}"
+        return self._uid
+
+    @property
+    def prefix(self) -> str:
+        return f"{getattr(self.event_type, 'PREFIX', None)}"
+
+    @property
+    def name(self) -> str:
+        if not self.raw_name:  # Fix for special events with no name
+            return remove_prefix(self.id, self.prefix)
+        return f"{self.prefix}{self.raw_name}"
+
+    @property
+    def summary(self) -> str:
+        # External events are exported without their prefix, see EventEXTERN
+        if self.event_type is EventEXTERN:
+            return remove_prefix(self.name, self.prefix)
+        return self.name
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end - self.begin
+
+    @property
+    def description(self) -> str:
+        description = f"{self.raw_name}\n{str(self.duration)}\n{self.professor}"
+
+        if self.note:
+            description = f"{description}\n{self.note}"
+
+        return description
+
+    def get_id(self) -> str:
+        """
+        Returns the id of this event.
+
+        :return: the id of the event
+        :rtype: str
+        """
+        return self.id
+
+    def get_week(self) -> int:
+        """
+        Returns the week of this event in the gregorian calendar, starting at 0 for the first week.
+
+        :return: the week number relative to gregorian calendar numbering
+        :rtype: int
+        """
+        return self.begin.isocalendar()[1] - 1
+
+    def set_weight(self, weight: float):
+        """
+        changes the weight of the event.
+
+        :param weight: the weight
+        :type weight: float
+        """
+        self.weight = weight
+
+    def intersects(self, other: Any) -> bool:
+        """
+        Returns whether two events intersect each other.
+
+        :param other: the event to compare with
+        :type other: Any
+        :return: true if both events intersect
+        :rtype: bool
+        """
+        return self.end > other.begin and other.end > self.begin
+
+    __xor__ = intersects
+
+    def overlap(self, other: Any) -> float:
+        """
+        If both events intersect, returns the product of the weights.
+
+        :param other: the event to compare with
+        :type other: Any
+        :return: self.weight * other.weight if intersect, else 0
+        :rtype: float
+        """
+        return self.weight * other.weight * self.intersects(other)
+
+    __mul__ = overlap
+
+    def to_event(self) -> AcademicalEvent:
+        """
+        Builds the ics.Event matching this record, e.g., to export it in a calendar.
+
+        :return: the event
+        :rtype: AcademicalEvent
+        """
+        kwargs = dict(
+            name=self.raw_name,
+            begin=self.begin,
+            end=self.end,
+            professor=self.professor,
+            id=remove_prefix(self.id, self.prefix),
+            weight=self.weight,
+            code=self.code,
+            note=self.note,
+        )
+
+        event = self.event_type(**kwargs)
+        event.location = self.location
+        event.uid = self.uid
+        return event
+
+    def json(self, color: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the event as a json-like format, as :func:`AcademicalEvent.json` does.
+
+        :param color: the color of the event, its default color if None
+        :type color: Optional[str]
+        :return: a dictionary containing relevant information
+        :rtype: Dict[str, Any]
+        """
+        if color is None:
+            color = self.color
+
+        begin, end = get_arrow(self.begin), get_arrow(self.end)
+
+        return {
+            "id": self.uid,
+            "title": self.summary,
+            "start": str(begin),
+            "end": str(end),
+            "location": self.location,
+            # Remove empty lines
+            "description": "\n".join(
+                line for line in self.description.splitlines() if line
+            ),
+            "editable": False,
+            "backgroundColor": color,
+            "borderColor": color,
+            "pretty_start": pretty_formatter(begin),
+            "pretty_end": pretty_formatter(end),
+            "code": self.code,
+        }
+
+
 def extract_code(course_id: str) -> str:
     """
     Extracts a code from a course id.
@@ -482,9 +764,53 @@ def extract_datetime(date: str, start: str, end: str) -> Tuple[datetime, datetim
     :return: datetime objects (start date, end date)
     :rtype: Tuple[datetime, datetime]
     """
-    t0 = datetime.strptime(date + "-" + start, "%d/%m/%Y-%H:%M").astimezone(TZ)
-    t1 = datetime.strptime(date + "-" + end, "%d/%m/%Y-%H:%M").astimezone(TZ)
+    # Hours are given in Brussels' local time, whatever the timezone of the host
+    t0 = TZ.localize(datetime.strptime(date + "-" + start, "%d/%m/%Y-%H:%M"))
+    t1 = TZ.localize(datetime.strptime(date + "-" + end, "%d/%m/%Y-%H:%M"))
     if t0 < t1:
         return t0, t1
     else:
         return t1, t0
+
+
+def extract_datetimes(
+    dates: Sequence[str], starts: Sequence[str], ends: Sequence[str]
+) -> Tuple[List[datetime], List[datetime]]:
+    """
+    Parses infos to return the start and end times of many events at once.
+
+    This is the vectorized version of :func:`extract_datetime`, meant to parse all the
+    events of a response in a single pass.
+
+    :param dates: the dates matching %d/%m/%Y format
+    :type dates: Sequence[str]
+    :param starts: the start hours matching %H:%M format
+    :type starts: Sequence[str]
+    :param ends: the end hours matching %H:%M format
+    :type ends: Sequence[str]
+    :return: datetime objects (start dates, end dates)
+    :rtype: Tuple[List[datetime], List[datetime]]
+    """
+    if len(dates) == 0:
+        return [], []
+
+    dates = pd.Series(dates, dtype=str) + "-"
+    t0 = pd.to_datetime(dates + pd.Series(starts, dtype=str), format="%d/%m/%Y-%H:%M")
+    t1 = pd.to_datetime(dates + pd.Series(ends, dtype=str), format="%d/%m/%Y-%H:%M")
+
+    ordered = t0 < t1
+    begins, ends = t0.where(ordered, t1), t1.where(ordered, t0)
+
+    # Same as pytz' localize: ambiguous and nonexistent hours are assumed to be in
+    # winter time, the latter giving the same instants as a shift by the skipped hour
+    ambiguous = np.zeros(len(dates), dtype=bool)
+    nonexistent = pd.Timedelta(hours=1)
+
+    return tuple(
+        list(
+            t.dt.tz_localize(
+                TZ, ambiguous=ambiguous, nonexistent=nonexistent
+            ).dt.to_pydatetime()
+        )
+        for t in (begins, ends)
+    )
@@ -0,0 +1,226 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import backend.events as evt
+
+# For each event UID, the digest of the last content exported and its sequence number
+Revisions = Dict[str, Tuple[str, int]]
+
+# Identifier of the product that created the calendars
+PRODID = "-//ADE Scheduler//ICS//EN"
+
+# Maximum length of a content line, in octets, line break excluded (RFC 5545, 3.1)
+LINE_LENGTH = 75
+
+# Number of events serialized per chunk when streaming a calendar
+CHUNK_SIZE = 100
+
+DAYS = ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
+
+
+def escape(text: str) -> str:
+    """
+    Escapes a text value, as :func:`ics.utils.escape_string` does.
+
+    :param text: the text
+    :type text: str
+    :return: the escaped text
+    :rtype: str
+    """
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def fold(line: str) -> str:
+    """
+    Folds a content line into lines of at most `LINE_LENGTH` octets, each continuation
+    line starting with a space. Multi-byte characters are never split.
+
+    :param line: the content line, without line break
+    :type line: str
+    :return: the folded line, without final line break
+    :rtype: str
+    """
+    # Each character takes at most 4 octets in UTF-8
+    if 4 * len(line) <= LINE_LENGTH:
+        return line
+
+    encoded = line.encode()
+
+    if len(encoded) <= LINE_LENGTH:
+        return line
+
+    parts = list()
+    begin = 0
+    length = LINE_LENGTH
+
+    while begin < len(encoded):
+        end = min(begin + length, len(encoded))
+
+        # Continuation bytes of UTF-8 are 10xxxxxx
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+
+        parts.append(encoded[begin:end].decode())
+        begin = end
+        length = LINE_LENGTH - 1  # The leading space counts
+
+    return "\r\n ".join(parts)
+
+
+def format_datetime(instant: datetime) -> str:
+    """
+    Formats an aware datetime (or arrow) in UTC, as :func:`ics.utils.arrow_to_iso` does.
+
+    :param instant: the datetime
+    :type instant: datetime
+    :return: the formatted datetime
+    :rtype: str
+    """
+    instant = getattr(instant, "datetime", instant)
+    return instant.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def format_date(instant: datetime) -> str:
+    """
+    Formats the date of an aware datetime (or arrow) in UTC, for all-day events.
+
+    :param instant: the datetime
+    :type instant: datetime
+    :return: the formatted date
+    :rtype: str
+    """
+    instant = getattr(instant, "datetime", instant)
+    return instant.astimezone(timezone.utc).strftime("%Y%m%d")
+
+
+def event_lines(event: Union[evt.EventRecord, evt.CustomEvent]) -> List[str]:
+    """
+    Returns the content lines describing an event, unfolded, with the same properties
+    as the :mod:`ics` library would serialize, but its UID.
+
+    :param event: the event, either a record or an ics.Event
+    :type event: Union[evt.EventRecord, evt.CustomEvent]
+    :return: the content lines, between BEGIN:VEVENT and UID
+    :rtype: List[str]
+    """
+    if isinstance(event, evt.EventRecord):
+        name, description, location = event.summary, event.description, event.location
+    else:
+        name, description, location = event.name, event.description, event.location
+
+    lines = list()
+
+    if event.all_day:
+        lines.append(f"DTSTART;VALUE=DATE:{format_date(event.begin)}")
+        lines.append(f"DTEND;VALUE=DATE:{format_date(event.end)}")
+    else:
+        lines.append(f"DTSTART:{format_datetime(event.begin)}")
+        lines.append(f"DTEND:{format_datetime(event.end)}")
+
+    if name:
+        lines.append(f"SUMMARY:{escape(name)}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape(description)}")
+    if location:
+        lines.append(f"LOCATION:{escape(location)}")
+
+    if isinstance(event, evt.RecurringCustomEvent):
+        lines.append(
+            "RRULE:FREQ=WEEKLY;INTERVAL=1;"
+            f"BYDAY={','.join(DAYS[i] for i in event.freq)};"
+            f"UNTIL={format_datetime(event.end_recurrence)}"
+        )
+
+    return lines
+
+
+def iter_calendar(
+    events: Iterable[Union[evt.EventRecord, evt.CustomEvent]],
+    revisions: Optional[Revisions] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[str]:
+    """
+    Serializes events into an iCalendar (RFC 5545) calendar, chunk by chunk, without
+    building :class:`ics.Event` objects. The same events always give the same output.
+
+    Each event is identified by its UID (see :func:`backend.events.EventRecord.uid`),
+    an event whose UID was already exported in the calendar is skipped.
+
+    The SEQUENCE of an event is incremented each time its content differs from the
+    revision previously exported, if any. Revisions are updated as the chunks are
+    generated, only the events of this calendar being kept once it is complete, and
+    are to be kept for the next export of the same calendar.
+
+    :param events: the events, either records or ics.Event
+    :type events: Iterable[Union[evt.EventRecord, evt.CustomEvent]]
+    :param revisions: the revisions previously exported, updated in place; if None,
+        every SEQUENCE is 0
+    :type revisions: Optional[Revisions]
+    :param chunk_size: the number of events per chunk
+    :type chunk_size: int
+    :return: the chunks of the calendar, which are to be concatenated
+    :rtype: Iterator[str]
+    """
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}"]
+    uids = set()
+
+    for event in events:
+        uid = event.uid
+
+        if uid in uids:
+            continue
+
+        uids.add(uid)
+        properties = event_lines(event)
+        sequence = 0
+
+        if revisions is not None:
+            digest = hashlib.sha1("\n".join(properties).encode()).hexdigest()
+            previous = revisions.get(uid)
+
+            if previous is not None:
+                sequence = previous[1] + (previous[0] != digest)
+
+            revisions[uid] = (digest, sequence)
+
+        lines.append("BEGIN:VEVENT")
+        lines.extend(properties)
+        lines.append(f"UID:{uid}")
+        lines.append(f"SEQUENCE:{sequence}")
+        lines.append("END:VEVENT")
+
+        if len(uids) % chunk_size == 0:
+            yield "".join(fold(line) + "\r\n" for line in lines)
+            lines = []
+
+    # Events no longer in the calendar would otherwise be kept forever
+    if revisions is not None:
+        for uid in revisions.keys() - uids:
+            del revisions[uid]
+
+    lines.append("END:VCALENDAR")
+    yield "".join(fold(line) + "\r\n" for line in lines)
+
+
+def to_calendar(
+    events: Iterable[Union[evt.EventRecord, evt.CustomEvent]],
+    revisions: Optional[Revisions] = None,
+) -> str:
+    """
+    Serializes events into an iCalendar (RFC 5545) calendar, see :func:`iter_calendar`.
+
+    :param events: the events, either records or ics.Event
+    :type events: Iterable[Union[evt.EventRecord, evt.CustomEvent]]
+    :param revisions: the revisions previously exported, updated in place
+    :type revisions: Optional[Revisions]
+    :return: the calendar
+    :rtype: str
+    """
+    return "".join(iter_calendar(events, revisions=revisions))
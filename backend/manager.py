@@ -1,8 +1,14 @@
-from typing import Dict, Iterator, List, Optional, Tuple, Union
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import lxml
 import pandas as pd
-import requests
+from flask import current_app, has_app_context
 from flask_babel import gettext
 from ics import Calendar
 
@@ -14,6 +20,65 @@ import backend.models as md
 import backend.resources as rsrc
 import backend.schedules as schd
 import backend.servers as srv
+import backend.uclouvain_apis as ucl
+
+REFRESH_QUEUE = "[REFRESH_QUEUE]"
+BEST_SCHEDULES_QUEUE = "[BEST_SCHEDULES_QUEUE]"
+ICS_FEEDS_QUEUE = "[ICS_FEEDS_QUEUE]"
+
+# Single-flight: maximum life of a lock and maximum time spent waiting for the
+# worker holding it, in seconds
+LOCK_TIMEOUT = 60
+LOCK_WAIT = 10
+
+# Maximum number of courses requested at once to the ADE API
+BATCH_SIZE = 10
+
+# Maximum number of concurrent fetches per process, and maximum time, in seconds,
+# spent fetching the courses of one call to Manager.get_courses
+FETCH_WORKERS = 4
+FETCH_DEADLINE = 30
+
+# Maximum number of courses whose events are kept rendered as JSON, per process
+JSON_CACHE_SIZE = 256
+
+# Maximum number of schedules read at once from the database when re-rendering feeds
+FEEDS_BATCH_SIZE = 50
+
+_fetch_executor = None
+
+
+def submit_fetch(func: Callable, *args: Any, **kwargs: Any) -> Future:
+    """
+    Submits a function to the process-wide pool of `FETCH_WORKERS` threads, used to
+    fetch data concurrently. The function runs within the current app context, if any.
+
+    :param func: the function
+    :type func: Callable
+    :param args: positional arguments passed to the function
+    :type args: Any
+    :param kwargs: keyword arguments passed to the function
+    :type kwargs: Any
+    :return: the future result of the function
+    :rtype: Future
+    """
+    global _fetch_executor
+
+    if _fetch_executor is None:
+        _fetch_executor = ThreadPoolExecutor(
+            max_workers=FETCH_WORKERS, thread_name_prefix="fetch"
+        )
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def task():
+        if app is None:
+            return func(*args, **kwargs)
+
+        with app.app_context():
+            return func(*args, **kwargs)
+
+    return _fetch_executor.submit(task)
 
 
 class ScheduleNotFountError(Exception):
@@ -25,6 +90,20 @@ class ScheduleNotFountError(Exception):
         return gettext("The given schedule is somehow not saved in our database...")
 
 
+class FetchTimeoutError(Exception):
+    """
+    Exception that will occur if some courses could not be fetched before the deadline.
+    """
+
+    def __init__(self, *codes: str):
+        self.codes = codes
+
+    def __str__(self):
+        return gettext("The following courses took too long to load: %s") % ", ".join(
+            self.codes
+        )
+
+
 class ExternalCalendarAlreadyExistsError(Exception):
     """
     Exception that will occur if someone tries to create a calendar with a code already taken.
@@ -49,15 +128,45 @@ class Manager:
     :type database: md.SQLAlchemy
     :param ttl: a dictionary mapping keys in server to their default time-to-live value
     :type ttl: Dict
+    :param background_refresh: if True, expired courses are returned as is and their
+        refresh is queued for a background worker, instead of being fetched again right away
+    :type background_refresh: bool
+    :param background_best_schedules: if True, best schedules are computed by a
+        background worker, instead of right away in the submitting process
+    :type background_best_schedules: bool
+    :param cache: the in-process cache placed in front of the server for slow-changing data
+        (project ids, resource ids, course resources and classrooms), a new one is created if None
+    :type cache: Optional[srv.LocalCache]
+    :param json_cache: the in-process cache of the events of courses rendered as JSON (see
+        :func:`Manager.get_events_json`), a new one is created if None
+    :type json_cache: Optional[srv.LocalCache]
     """
 
     def __init__(
-        self, client: ade.Client, server: srv.Server, database: md.SQLAlchemy, ttl: Dict
+        self,
+        client: ade.Client,
+        server: srv.Server,
+        database: md.SQLAlchemy,
+        ttl: Dict,
+        background_refresh: bool = False,
+        background_best_schedules: bool = False,
+        background_ics_feeds: bool = False,
+        cache: Optional[srv.LocalCache] = None,
+        json_cache: Optional[srv.LocalCache] = None,
     ):
         self.server = server
         self.client = client
         self.database = database
         self.ttl = ttl
+        self.background_refresh = background_refresh
+        self.background_best_schedules = background_best_schedules
+        self.background_ics_feeds = background_ics_feeds
+        self.cache = cache if cache is not None else srv.LocalCache(server)
+        self.json_cache = (
+            json_cache
+            if json_cache is not None
+            else srv.LocalCache(server, maxsize=JSON_CACHE_SIZE)
+        )
 
     def get_courses(self, *codes: str, project_id: str = None) -> List[crs.Course]:
         """
@@ -79,102 +188,684 @@ class Manager:
         # Fetch from the server
         prefix = f"[project_id={project_id}]"
 
-        courses_expired = self.server.get_multiple_values_expired(
-            *codes,
-            prefix=prefix,
+        values = self.server.get_multiple_values_and_expired(*codes, prefix=prefix)
+        courses, codes_not_found, courses_expired = values
+
+        # Refresh the courses that have expired, either in a background worker while
+        # the stale course is returned, or right now
+        codes_expired = [
+            key
+            for key, expired in courses_expired.items()
+            if expired is True and key not in codes_not_found
+        ]
+
+        if self.background_refresh:
+            for code_expired in codes_expired:
+                self.queue_course_refresh(code_expired, project_id=project_id)
+            codes_expired = []
+
+        # Fetch from the api the missing and expired courses, batching requests
+        fetched = self.fetch_and_store_courses(
+            *codes_not_found,
+            *codes_expired,
+            project_id=project_id,
+            stale={code: courses[code] for code in codes_expired},
+        )
+
+        for code, course in fetched.items():
+            if course is None:
+                codes = [c for c in codes if c != code]
+            else:
+                courses[code] = course
+
+        ret = list()
+
+        for code in codes:
+            course = courses[code]
+            if isinstance(course, list):  # Happens if course is a course combo
+                ret.extend(course)
+            else:
+                ret.append(course)
+
+        return ret
+
+    def get_events_json(
+        self, course: crs.Course, view: crs.View, color: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the events of a course, filtered by a view, in a json-like format (see
+        :func:`backend.events.EventRecord.json`).
+
+        Events are rendered once per revision of the course, view and color, then kept in
+        an in-process cache, so that only the courses that changed are rendered again.
+        The returned list and its dictionaries must not be modified.
+
+        :param course: the course
+        :type course: crs.Course
+        :param view: the view, as accepted by :func:`backend.courses.Course.get_events`
+            with `reverse=True`
+        :type view: crs.View
+        :param color: the color of the events
+        :type color: str
+        :return: the events
+        :rtype: List[Dict[str, Any]]
+        """
+        content = json.dumps(crs.canonical_view(view))
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        key = f"[EVENTS_JSON]{course.revision},{color},{digest}"
+
+        def load():
+            events = course.get_events(view=view, reverse=True)
+            return [event.json(color) for event in events]
+
+        return self.json_cache.get_or_set(key, load)
+
+    def fetch_course(
+        self, code: str, project_id: str
+    ) -> Union[List[crs.Course], crs.Course, None]:
+        """
+        Fetches a course from the ADE API, or from its url if it is an external calendar.
+        This method does not use nor modify the server.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the course(s) matching this code, None if an external calendar does not exist anymore
+        :rtype: Union[List[crs.Course], crs.Course, None]
+        """
+        if code.startswith("EXT:"):
+            extCal = (
+                md.ExternalCalendar.query.filter_by(approved=True)
+                .filter(md.ExternalCalendar.code == code)
+                .first()
+            )
+            if extCal is None:  # In case the owner of extCal deleted it
+                return None
+            url = extCal.url
+            events = Calendar(ucl.get_session().get(url).text).events
+            events = [evt.EventEXTERN.from_event(event, code[4:]) for event in events]
+            course = crs.Course(code[4:], extCal.name)
+            for event in events:
+                course.add_activity([event])
+
+            return course
+
+        resource_ids = self.get_resource_ids(code, project_id=project_id)
+        return ade.response_to_courses(
+            self.client.get_activities(resource_ids, project_id)
+        )
+
+    def store_course(
+        self,
+        code: str,
+        course: Union[List[crs.Course], crs.Course],
+        project_id: str,
+        notify_expire_in: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Stores a course in the server, with its expire notification. Its version is
+        only renewed if its content changed (see :func:`Manager.bump_course_version`).
+
+        :param code: the code of the course
+        :type code: str
+        :param course: the course(s) matching this code
+        :type course: Union[List[crs.Course], crs.Course]
+        :param project_id: the project id
+        :type project_id: str
+        :param notify_expire_in: the delay before the course is considered expired,
+            default is the `courses_notify` ttl
+        :type notify_expire_in: Optional[Dict[str, int]]
+        """
+        if notify_expire_in is None:
+            notify_expire_in = self.ttl["courses_notify"]
+
+        self.server.set_value(
+            f"[project_id={project_id}]{code}",
+            course,
+            expire_in=self.ttl["courses"],
+            notify_expire_in=notify_expire_in,
         )
-        courses, codes_not_found = self.server.get_multiple_values(
-            *codes, prefix=prefix
+
+        # Courses are fetched again periodically, mostly without any change
+        parts = course if isinstance(course, list) else [course]
+        digest = hashlib.sha256(
+            "".join(part.get_digest() for part in parts).encode()
+        ).hexdigest()
+        digest_key = f"[COURSE_DIGEST,project_id={project_id}]{code}"
+        expire_in = timedelta(**self.ttl["courses"])
+
+        previous = self.server.getset(digest_key, digest)
+        self.server.expire(digest_key, expire_in)
+
+        if previous is not None and previous.decode() == digest:
+            self.server.expire(
+                f"[COURSE_VERSION,project_id={project_id}]{code}", expire_in
+            )
+        else:
+            self.bump_course_version(code, project_id=project_id)
+
+    def bump_course_version(self, code: str, project_id: str):
+        """
+        Renews the version of a course, each time its content changes or it is deleted,
+        which invalidates the best schedules and ICS feeds computed with it.
+
+        Versions expire with the courses. So that a version is never reused, even after
+        it expired, it is the current time in nanoseconds rather than a counter.
+
+        If enabled, the ICS feeds including this course are re-rendered by a background
+        worker (see :func:`Manager.queue_ics_feeds_render`).
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        """
+        self.server.set(
+            f"[COURSE_VERSION,project_id={project_id}]{code}",
+            time.time_ns(),
+            ex=timedelta(**self.ttl["courses"]),
         )
 
-        def _fetch_code(code_not_found):
-            course_not_found = None
-            if code_not_found.startswith("EXT:"):
-                extCal = (
-                    md.ExternalCalendar.query.filter_by(approved=True)
-                    .filter(md.ExternalCalendar.code == code_not_found)
-                    .first()
-                )
-                if extCal is None:  # In case the owner of extCal deleted it
-                    return None
-                url = extCal.url
-                events = Calendar(requests.get(url).text).events
-                events = [
-                    evt.EventEXTERN.from_event(event, code_not_found[4:])
-                    for event in events
-                ]
-                course_not_found = crs.Course(code_not_found[4:], extCal.name)
-                for event in events:
-                    course_not_found.add_activity([event])
+        if self.background_ics_feeds:
+            self.queue_ics_feeds_render(code, project_id=project_id)
 
+    def get_course_versions(self, *codes: str, project_id: str) -> List[int]:
+        """
+        Returns the version of each course (see :func:`Manager.bump_course_version`).
+
+        :param codes: the codes of the courses
+        :type codes: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the version of each course, 0 if it was never stored
+        :rtype: List[int]
+        """
+        if not codes:
+            return []
+
+        versions = self.server.mget(
+            [f"[COURSE_VERSION,project_id={project_id}]{code}" for code in codes]
+        )
+        return [int(version or 0) for version in versions]
+
+    def fetch_courses(
+        self, *codes: str, project_id: str
+    ) -> Dict[str, List[crs.Course]]:
+        """
+        Fetches multiple courses from the ADE API with a single request, and splits the
+        parsed courses back by code. This method does not use nor modify the server.
+
+        Parsed activities are attributed to the requested codes by the resource ids of
+        their participants (see :func:`backend.ade_api.response_to_courses_by_resource`):
+        the codes that could not be matched, e.g., for course combos, are not returned
+        and are to be fetched alone.
+
+        :param codes: the codes of the courses, external calendars are not supported
+        :type codes: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the courses of each code that could be matched
+        :rtype: Dict[str, List[crs.Course]]
+        """
+        codes = list(dict.fromkeys(codes))
+        resource_ids = self.get_resource_ids_map(project_id=project_id)
+        resource_ids = {
+            code: resource_ids[code] for code in codes if code in resource_ids
+        }
+        response = self.client.get_activities(list(resource_ids.values()), project_id)
+
+        if len(codes) == 1:
+            return {codes[0]: ade.response_to_courses(response)}
+
+        courses, _ = ade.response_to_courses_by_resource(response, resource_ids)
+        return courses
+
+    def fetch_and_store_courses(
+        self,
+        *codes: str,
+        project_id: str,
+        stale: Optional[Dict[str, Union[List[crs.Course], crs.Course]]] = None,
+    ) -> Dict[str, Union[List[crs.Course], crs.Course, None]]:
+        """
+        Fetches multiple courses and stores them in the server.
+
+        Courses are requested to the ADE API by batches of `BATCH_SIZE` codes (see
+        :func:`Manager.fetch_and_store_batch`). External calendars, courses being fetched
+        by another worker and courses that could not be matched from a batch, or whose
+        batch was not done before the deadline, are then fetched one by one (see
+        :func:`Manager.fetch_missing_course` and :func:`Manager.refresh_course`).
+
+        :param codes: the codes of the courses
+        :type codes: str
+        :param project_id: the project id
+        :type project_id: str
+        :param stale: the courses currently stored, for the codes that have expired
+        :type stale: Optional[Dict[str, Union[List[crs.Course], crs.Course]]]
+        :return: the course(s) matching each code, None if an external calendar does not exist anymore
+        :rtype: Dict[str, Union[List[crs.Course], crs.Course, None]]
+        """
+        codes = list(dict.fromkeys(codes))
+        stale = stale or dict()
+        fetched = dict()
+        deadline = time.monotonic() + FETCH_DEADLINE
+
+        batch = [code for code in codes if not code.startswith("EXT:")]
+        futures = self.run_concurrently(
+            {
+                i: (self.fetch_and_store_batch, batch[i : i + BATCH_SIZE])
+                for i in range(0, len(batch), BATCH_SIZE)
+            },
+            project_id=project_id,
+            deadline=deadline,
+        )
+
+        for future in futures.values():
+            if future.done():  # Else, each course will be fetched again, one by one
+                fetched.update(future.result())
+
+        futures = self.run_concurrently(
+            {
+                code: (self.refresh_course, [code], dict(stale=stale[code]))
+                if code in stale
+                else (self.fetch_missing_course, [code])
+                for code in codes
+                if code not in fetched
+            },
+            project_id=project_id,
+            deadline=deadline,
+        )
+
+        timed_out = list()
+
+        for code, future in futures.items():
+            if future.done():
+                fetched[code] = future.result()
+            elif code in stale:
+                fetched[code] = stale[code]
             else:
-                resource_ids = self.get_resource_ids(
-                    code_not_found, project_id=project_id
-                )
-                course_not_found = ade.response_to_courses(
-                    self.client.get_activities(resource_ids, project_id)
-                )
+                timed_out.append(code)
 
-            return course_not_found
+        if timed_out:
+            raise FetchTimeoutError(*timed_out)
 
-        # Fetch from the api the missing courses
-        if codes_not_found:
-            for code_not_found in codes_not_found:
-                course_not_found = _fetch_code(code_not_found)
+        return {code: fetched[code] for code in codes}
 
-                if course_not_found is None:
-                    codes.remove(code_not_found)
-                    continue
+    def fetch_and_store_batch(
+        self, *codes: str, project_id: str
+    ) -> Dict[str, List[crs.Course]]:
+        """
+        Fetches a batch of courses with a single request (see
+        :func:`Manager.fetch_courses`) and stores those that could be matched.
+
+        Courses being fetched by another worker are skipped. The lock of each course is
+        held until the batch is stored, even if the caller stopped waiting for it.
+
+        :param codes: the codes of the courses, external calendars are not supported
+        :type codes: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the courses of each code that was fetched and stored
+        :rtype: Dict[str, List[crs.Course]]
+        """
+        locks = dict()
 
-                self.server.set_value(
-                    prefix + code_not_found,
-                    course_not_found,
-                    expire_in=self.ttl["courses"],
-                    notify_expire_in=self.ttl["courses_notify"],
+        try:
+            for code in codes:
+                lock = self.server.acquire_lock(
+                    f"[project_id={project_id}]{code}", timeout=LOCK_TIMEOUT
                 )
-                courses[code_not_found] = course_not_found
 
-        # Fetch from the api the courses that have expired
-        # those can have errors, we will fetch them later
-        for code_expired in [
-            key for key, expired in courses_expired.items() if expired is True
-        ]:
+                if lock is not None:
+                    locks[code] = lock
+
+            if not locks:
+                return dict()
+
             try:
-                course_expired = _fetch_code(code_expired)
+                courses = self.fetch_courses(*locks.keys(), project_id=project_id)
+            except lxml.etree.XMLSyntaxError:
+                return dict()  # Each course will be fetched again, one by one
+
+            for code, course in courses.items():
+                self.store_course(code, course, project_id=project_id)
+
+            return courses
+        finally:
+            for lock in locks.values():
+                self.server.release_lock(lock)
+
+    @staticmethod
+    def run_concurrently(
+        tasks: Dict[Any, Tuple], deadline: float, **kwargs: Any
+    ) -> Dict[Any, Future]:
+        """
+        Runs tasks concurrently on the process-wide fetch pool (see :func:`submit_fetch`)
+        and waits for them until a deadline. Tasks still running at the deadline are not
+        cancelled, they keep running in the background.
+
+        :param tasks: for each key, a tuple (function, positional arguments) or
+            (function, positional arguments, keyword arguments)
+        :type tasks: Dict[Any, Tuple]
+        :param deadline: the deadline, relative to :func:`time.monotonic`
+        :type deadline: float
+        :param kwargs: keyword arguments passed to every function
+        :type kwargs: Any
+        :return: the future result of each task, possibly not done if the deadline was reached
+        :rtype: Dict[Any, Future]
+        """
+        futures = dict()
 
-                if course_expired is None:
-                    codes.remove(code_expired)
-                    continue
+        for key, (func, args, *task_kwargs) in tasks.items():
+            task_kwargs = dict(kwargs, **task_kwargs[0]) if task_kwargs else kwargs
+            futures[key] = submit_fetch(func, *args, **task_kwargs)
 
-                courses[code_expired] = course_expired
-                self.server.set_value(
-                    prefix + code_expired,
-                    course_expired,
-                    expire_in=self.ttl["courses"],
-                    notify_expire_in=self.ttl["courses_notify"],
-                )
-            except lxml.etree.XMLSyntaxError as e:
-                self.server.set_value(
-                    prefix + code_expired,
-                    courses[code_expired],  # this already exists
-                    expire_in=self.ttl["courses"],
-                    notify_expire_in=self.ttl["courses_renotify"],
-                )
+        wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
 
-        ret = list()
+        return futures
 
-        for code in codes:
-            course = courses[code]
-            if isinstance(course, list):  # Happens if course is a course combo
-                ret.extend(course)
+    def fetch_missing_course(
+        self, code: str, project_id: str
+    ) -> Union[List[crs.Course], crs.Course, None]:
+        """
+        Fetches a course missing from the server and stores it.
+
+        Concurrent calls for the same course are coalesced: only one worker fetches the
+        course while the others wait for it to be stored (at most `LOCK_WAIT` seconds,
+        after which they fetch it themselves).
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the course(s) matching this code, None if an external calendar does not exist anymore
+        :rtype: Union[List[crs.Course], crs.Course, None]
+        """
+        key = f"[project_id={project_id}]{code}"
+        lock = self.server.acquire_lock(key, timeout=LOCK_TIMEOUT)
+
+        if lock is None:
+            course = self.server.wait_for_value(key, timeout=LOCK_WAIT)
+
+            if course is not None:
+                return course
+
+        try:
+            course = self.fetch_course(code, project_id=project_id)
+
+            if course is not None:
+                self.store_course(code, course, project_id=project_id)
+
+            return course
+        finally:
+            self.server.release_lock(lock)
+
+    def refresh_course(
+        self,
+        code: str,
+        project_id: str,
+        stale: Union[List[crs.Course], crs.Course, None] = None,
+    ) -> Union[List[crs.Course], crs.Course, None]:
+        """
+        Fetches a course again and stores it in the server.
+
+        ADE sometimes returns empty (thus unparsable) responses: in that case, the stale
+        course is kept and will be considered expired again after the `courses_renotify` ttl.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :param stale: the course currently stored, read from the server if None
+        :type stale: Union[List[crs.Course], crs.Course, None]
+        :return: the refreshed course, the stale course if the refresh failed or is
+            already being done by another worker, or None if the course does not exist anymore
+        :rtype: Union[List[crs.Course], crs.Course, None]
+        """
+        key = f"[project_id={project_id}]{code}"
+        lock = self.server.acquire_lock(key, timeout=LOCK_TIMEOUT)
+
+        if stale is None:
+            stale = self.server.get_value(key)
+
+        if lock is None and stale is not None:
+            # Another worker is refreshing this course
+            return stale
+
+        try:
+            course = self.fetch_course(code, project_id=project_id)
+
+            if course is None:
+                self.server.delete(key)
+                self.server.delete(f"[COURSE_DIGEST,project_id={project_id}]{code}")
+                self.bump_course_version(code, project_id=project_id)
             else:
-                ret.append(course)
+                self.store_course(code, course, project_id=project_id)
+
+            return course
+        except lxml.etree.XMLSyntaxError:
+            if stale is None:
+                raise
+
+            self.store_course(
+                code,
+                stale,
+                project_id=project_id,
+                notify_expire_in=self.ttl["courses_renotify"],
+            )
+            return stale
+        finally:
+            self.server.release_lock(lock)
 
-        return ret
+    def queue_course_refresh(self, code: str, project_id: str) -> bool:
+        """
+        Queues the refresh of a course, to be processed by a background worker
+        (see :func:`Manager.process_course_refresh`).
+        A course cannot be queued twice until its refresh is processed, or until the
+        `courses_renotify` ttl is over if no worker processed it.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: True if the refresh was queued, False if it was already pending
+        :rtype: bool
+        """
+        return self.server.enqueue(
+            REFRESH_QUEUE,
+            (code, project_id),
+            unique_key=f"[REFRESH_PENDING,project_id={project_id}]{code}",
+            expire_in=self.ttl["courses_renotify"],
+        )
+
+    def process_course_refresh(self, timeout: int = 0) -> Optional[str]:
+        """
+        Waits for a queued course refresh (see :func:`Manager.queue_course_refresh`) and
+        processes it.
+
+        :param timeout: the maximum time to wait for a refresh, in seconds, 0 to wait forever
+        :type timeout: int
+        :return: the code of the course refreshed, None if no refresh was queued
+        :rtype: Optional[str]
+        """
+        job = self.server.dequeue(REFRESH_QUEUE, timeout=timeout)
+
+        if job is None:
+            return None
+
+        code, project_id = job
+
+        try:
+            self.refresh_course(code, project_id=project_id)
+        finally:
+            self.server.delete(f"[REFRESH_PENDING,project_id={project_id}]{code}")
+
+        return code
+
+    def submit_best_schedules(self, schedule: schd.Schedule, n_best: int = 5) -> str:
+        """
+        Submits the computation of the best schedules of a schedule (see
+        :func:`backend.schedules.Schedule.compute_best`), either to a background worker
+        (see :func:`Manager.process_best_schedules`) or, as a fallback, right away.
+
+        The state of the job is then returned by :func:`Manager.get_best_schedules_job`.
+
+        :param schedule: the schedule, of which a copy is sent to the job
+        :type schedule: schd.Schedule
+        :param n_best: the number of best schedules to compute
+        :type n_best: int
+        :return: the id of the job
+        :rtype: str
+        """
+        job_id = uuid.uuid4().hex
+        self.set_best_schedules_job(job_id, status="queued")
+
+        if self.background_best_schedules:
+            self.server.enqueue(BEST_SCHEDULES_QUEUE, (job_id, schedule, n_best))
+        else:
+            self.run_best_schedules(job_id, schedule, n_best)
+
+        return job_id
+
+    def set_best_schedules_job(self, job_id: str, status: str, **kwargs: Any):
+        """
+        Stores the state of a best schedules job.
+
+        :param job_id: the id of the job
+        :type job_id: str
+        :param status: the status of the job: queued, running, done or failed
+        :type status: str
+        :param kwargs: additional fields: the progress (`done` and `total` weeks), the
+            number of best schedules found so far (`n_schedules`) and, once done, the
+            best schedules (`best_schedules`)
+        :type kwargs: Any
+        """
+        self.server.set_value(
+            f"[BEST_SCHEDULES_JOB]{job_id}",
+            dict(status=status, **kwargs),
+            expire_in=self.ttl["best_schedules"],
+        )
+
+    def get_best_schedules_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the state of a best schedules job (see
+        :func:`Manager.set_best_schedules_job`).
+
+        :param job_id: the id of the job
+        :type job_id: str
+        :return: the state of the job, None if it does not exist or expired
+        :rtype: Optional[Dict[str, Any]]
+        """
+        return self.server.get_value(f"[BEST_SCHEDULES_JOB]{job_id}")
+
+    def run_best_schedules(self, job_id: str, schedule: schd.Schedule, n_best: int):
+        """
+        Computes the best schedules of a job, reporting its progress after each week.
+
+        Best schedules are computed with a deterministic seed and cached under a key of
+        the schedule content (see :func:`backend.schedules.Schedule.best_schedules_key`),
+        so that jobs of schedules with the same content are only computed once, until
+        one of their courses changes. The courses are fetched, and refreshed if expired,
+        before their versions are read, so that the key matches the courses computed on.
+
+        If no best schedule could be computed (e.g., the schedule has no course), the job
+        is done with `best_schedules` set to None.
+
+        :param job_id: the id of the job
+        :type job_id: str
+        :param schedule: the schedule
+        :type schedule: schd.Schedule
+        :param n_best: the number of best schedules to compute
+        :type n_best: int
+        """
+        self.get_courses(*schedule.codes, project_id=schedule.project_id)
+        versions = self.get_course_versions(
+            *schedule.codes, project_id=schedule.project_id
+        )
+        key = schedule.best_schedules_key(versions=versions, n_best=n_best)
+        result = self.server.get_value(key)
+
+        if result is not None:
+            self.set_best_schedules_job(job_id, status="done", **result)
+            return
+
+        self.set_best_schedules_job(job_id, status="running", done=0, total=None)
+
+        def progress(done: int, total: int, n_schedules: int):
+            self.set_best_schedules_job(
+                job_id,
+                status="running",
+                done=done,
+                total=total,
+                n_schedules=n_schedules,
+            )
+
+        try:
+            bests = schedule.compute_best(
+                n_best=n_best, progress=progress, seed=schd.DETERMINISTIC_SEED
+            )
+        except Exception:
+            self.set_best_schedules_job(job_id, status="failed")
+            raise
+
+        result = dict(
+            n_schedules=len(schedule.best_schedules) if bests is not None else 0,
+            best_schedules=schedule.best_schedules if bests is not None else None,
+        )
+        self.server.set_value(key, result, expire_in=self.ttl["best_schedules_cache"])
+        self.set_best_schedules_job(job_id, status="done", **result)
+
+    def process_best_schedules(self, timeout: int = 0) -> Optional[str]:
+        """
+        Waits for a queued best schedules job (see :func:`Manager.submit_best_schedules`)
+        and processes it.
+
+        :param timeout: the maximum time to wait for a job, in seconds, 0 to wait forever
+        :type timeout: int
+        :return: the id of the job processed, None if no job was queued
+        :rtype: Optional[str]
+        """
+        job = self.server.dequeue(BEST_SCHEDULES_QUEUE, timeout=timeout)
+
+        if job is None:
+            return None
+
+        job_id, schedule, n_best = job
+        self.run_best_schedules(job_id, schedule, n_best)
+
+        return job_id
+
+    def update_if_missing(self, key: str, update: Callable[[], None]):
+        """
+        Calls an update function if a key is missing from the server.
+
+        Concurrent calls for the same key are coalesced: only one worker updates the
+        server while the others wait for it to be done (at most `LOCK_TIMEOUT` seconds,
+        after which they update it themselves).
+
+        :param key: the key
+        :type key: str
+        :param update: the function updating the server, creating the key
+        :type update: Callable[[], None]
+        """
+        if self.server.exists(key):
+            return
+
+        lock = self.server.acquire_lock(key, timeout=LOCK_TIMEOUT)
+
+        if lock is None:
+            self.server.wait_for_release(key, timeout=LOCK_TIMEOUT)
+
+        try:
+            # Another worker may have updated the server meanwhile
+            if not self.server.exists(key):
+                update()
+        finally:
+            self.server.release_lock(lock)
 
     def get_events_in_classroom(
         self, classroom_id: str, project_id: str = None
-    ) -> List[evt.AcademicalEvent]:
+    ) -> List[evt.EventRecord]:
         if project_id is None:
             project_id = self.get_default_project_id()
 
@@ -185,11 +876,8 @@ class Manager:
         if events is not None:
             return events
 
-        def filter_func(event: evt.AcademicalEvent):
-            for classroom in event.classrooms:
-                if classroom_id == classroom.infos["id"]:
-                    return True
-            return False
+        def filter_func(event: evt.EventRecord):
+            return classroom_id in event.classroom_ids
 
         events = ade.response_to_events(
             self.client.get_activities([classroom_id], project_id), filter_func
@@ -211,8 +899,7 @@ class Manager:
 
         key = f"[RESOURCES,project_id={project_id}]"
 
-        if not self.server.exists(key):
-            self.update_resources()
+        self.update_if_missing(key, self.update_resources)
 
         return self.server.get_value(key)
 
@@ -221,8 +908,7 @@ class Manager:
         Updates the resources contained in the server for all project ids.
         """
         key = "[PROJECT_IDs]"
-        if not self.server.exists(key):
-            self.update_project_ids()
+        self.update_if_missing(key, self.update_project_ids)
 
         for value in self.server.hgetall(key).values():
             value = value.decode()
@@ -245,18 +931,19 @@ class Manager:
 
         key = f"[COURSE_RESOURCES,project_id={project_id}]"
 
-        if not self.server.exists(key):
-            self.update_course_resources()
+        def load():
+            self.update_if_missing(key, self.update_course_resources)
 
-        return self.server.get_value(key)
+            return self.server.get_value(key)
+
+        return self.cache.get_or_set(key, load)
 
     def update_course_resources(self):
         """
         Updates the course resources contained in the server for all project ids.
         """
         key = "[PROJECT_IDs]"
-        if not self.server.exists(key):
-            self.update_project_ids()
+        self.update_if_missing(key, self.update_project_ids)
 
         for value in self.server.hgetall(key).values():
             value = value.decode()
@@ -276,6 +963,8 @@ class Manager:
                 key, course_resources, expire_in=self.ttl["course_resources"]
             )
 
+        self.server.bump_cache_version()
+
     def get_codes_matching(self, pattern: str, project_id: str = None) -> List[str]:
         # Actually returns names matchings :)
         course_resources = self.get_course_resources(project_id)
@@ -304,10 +993,12 @@ class Manager:
 
         key = f"[CLASSROOMS,project_id={project_id}]"
 
-        if not self.server.exists(key):
-            self.update_classrooms()
+        def load():
+            self.update_if_missing(key, self.update_classrooms)
+
+            return self.server.get_value(key)
 
-        classrooms = self.server.get_value(key)
+        classrooms = self.cache.get_or_set(key, load)
 
         if search_dict is not None:
             for index, search in search_dict.items():
@@ -326,8 +1017,7 @@ class Manager:
         Updates the classrooms contained in the server for all project ids.
         """
         key = "[PROJECT_IDs]"
-        if not self.server.exists(key):
-            self.update_project_ids()
+        self.update_if_missing(key, self.update_project_ids)
 
         for value in self.server.hgetall(key).values():
             value = value.decode()
@@ -346,6 +1036,8 @@ class Manager:
 
             self.server.set_value(key, classrooms, expire_in=self.ttl["classrooms"])
 
+        self.server.bump_cache_version()
+
     def get_resource_ids(self, *codes: str, project_id: str = None) -> Iterator[str]:
         """
         Returns the resource ids of each code.
@@ -360,18 +1052,39 @@ class Manager:
         if project_id is None:
             project_id = self.get_default_project_id()
 
+        resource_ids = self.get_resource_ids_map(project_id=project_id)
+        return filter(None, map(resource_ids.get, codes))
+
+    def get_resource_ids_map(self, project_id: str = None) -> Dict[str, str]:
+        """
+        Returns the mapping of every code (name) to its resource ids.
+
+        :param project_id: the project id
+        :type project_id: str
+        :return: the resource ids of each code
+        :rtype: Dict[str, str]
+        """
+        if project_id is None:
+            project_id = self.get_default_project_id()
+
         key = f"[RESOURCE_IDs,project_id={project_id}]"
-        if not self.server.exists(key):
-            self.update_resource_ids()
-        return map(lambda x: x.decode(), filter(None, self.server.hmget(key, codes)))
+
+        def load():
+            self.update_if_missing(key, self.update_resource_ids)
+
+            return {
+                code.decode(): ids.decode()
+                for code, ids in self.server.hgetall(key).items()
+            }
+
+        return self.cache.get_or_set(key, load)
 
     def update_resource_ids(self):
         """
         Updates the resource ids contained in the server for all project ids.
         """
         key = "[PROJECT_IDs]"
-        if not self.server.exists(key):
-            self.update_project_ids()
+        self.update_if_missing(key, self.update_project_ids)
 
         for value in self.server.hgetall(key).values():
             value = value.decode()
@@ -383,6 +1096,8 @@ class Manager:
                 key, resource_ids, expire_in=self.ttl["resource_ids"], hmap=True
             )
 
+        self.server.bump_cache_version()
+
     def code_exists(self, code, project_id: str = None) -> bool:
         """
         Checks if a given code exists in the database for a given project id
@@ -394,14 +1109,7 @@ class Manager:
                 .first()
                 is not None
             )
-        if project_id is None:
-            project_id = self.get_default_project_id()
-
-        hmap = f"[RESOURCE_IDs,project_id={project_id}]"
-        if not self.server.contains(hmap):
-            self.update_resource_ids()
-
-        return self.server.hexists(hmap, code)
+        return code in self.get_resource_ids_map(project_id=project_id)
 
     def get_project_ids(
         self, year: Optional[str] = None
@@ -415,18 +1123,21 @@ class Manager:
         :rtype: Union[List[Dict[str, str]], str, None]
         """
         hmap = "[PROJECT_IDs]"
-        if not self.server.exists(hmap):
-            self.update_project_ids()
-        if year is None:
-            return [
-                {"id": value.decode(), "year": key.decode()}
+
+        def load():
+            self.update_if_missing(hmap, self.update_project_ids)
+
+            return {
+                key.decode(): value.decode()
                 for key, value in self.server.hgetall(hmap).items()
-            ]
-        value = self.server.get_value(year, hmap=hmap)
-        if value[-1] is not None:
-            return value[-1].decode()
-        else:
-            return None
+            }
+
+        project_ids = self.cache.get_or_set(hmap, load)
+
+        if year is None:
+            return [{"id": value, "year": key} for key, value in project_ids.items()]
+
+        return project_ids.get(year)
 
     def update_project_ids(self):
         """
@@ -437,6 +1148,7 @@ class Manager:
         self.server.set_value(
             key, project_ids, expire_in=self.ttl["project_ids"], hmap=True
         )
+        self.server.bump_cache_version()
 
     def get_default_project_id(self) -> str:
         """
@@ -480,6 +1192,7 @@ class Manager:
 
         # Update the last person to modify the schedule
         schd.update_last_modified_by(uuid)
+        self.bump_schedule_version(schd.id)
         return schd.data
 
     def get_schedule(self, link):
@@ -496,6 +1209,305 @@ class Manager:
         else:
             return None
 
+    def bump_schedule_version(self, schedule_id: int):
+        """
+        Renews the version of a saved schedule, each time it is modified, which
+        invalidates the ICS feeds rendered from it. As for courses (see
+        :func:`Manager.bump_course_version`), it expires, with the feeds.
+
+        :param schedule_id: the id of the schedule
+        :type schedule_id: int
+        """
+        self.server.set(
+            f"[SCHEDULE_VERSION]{schedule_id}",
+            time.time_ns(),
+            ex=timedelta(**self.ttl["ics_feeds"]),
+        )
+
+    def get_ics_feed(self, link: str, choice: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns the ICS feed of a shared link, as rendered by
+        :func:`Manager.render_ics_feed`, if it is still up to date, without reading the
+        schedule nor its courses.
+
+        The body of the feed is not included, see :func:`Manager.get_ics_feed_body`.
+
+        :param link: the link
+        :type link: str
+        :param choice: the # of the schedule, 0 for main and 1 for best one, etc.
+        :type choice: int
+        :return: the feed (its ETag, last modification date and the schedule it was
+            rendered from), None if it is not cached or outdated
+        :rtype: Optional[Dict[str, Any]]
+        """
+        feed = self.server.get_value(f"[ICS_FEED,link={link},choice={choice}]")
+
+        if feed is None:
+            return None
+
+        versions = self.server.mget(
+            [f"[SCHEDULE_VERSION]{feed['schedule_id']}"]
+            + [
+                f"[COURSE_VERSION,project_id={feed['project_id']}]{code}"
+                for code in feed["codes"]
+            ]
+        )
+
+        if [int(version or 0) for version in versions] != feed["versions"]:
+            return None
+
+        return feed
+
+    def get_ics_feed_body(self, link: str, choice: int) -> Optional[str]:
+        """
+        Returns the body of the ICS feed of a shared link, as rendered by
+        :func:`Manager.render_ics_feed`.
+
+        :param link: the link
+        :type link: str
+        :param choice: the # of the schedule, 0 for main and 1 for best one, etc.
+        :type choice: int
+        :return: the body, None if it is not cached
+        :rtype: Optional[str]
+        """
+        return self.server.get_value(f"[ICS_FEED_BODY,link={link},choice={choice}]")
+
+    def get_schedules(self, *links: str) -> Dict[str, schd.Schedule]:
+        """
+        Returns the schedules of multiple links, with a single query.
+
+        :param links: the links
+        :type links: str
+        :return: the schedule of each link, missing if the link does not exist
+        :rtype: Dict[str, schd.Schedule]
+        """
+        query = md.Link.query.filter(md.Link.link.in_(links)).all()
+        return {link.link: link.schedule.data for link in query}
+
+    def render_ics_feed(
+        self,
+        link: str,
+        choice: int,
+        schedule: Optional[schd.Schedule] = None,
+        expire_in: Optional[Dict[str, int]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Renders the ICS feed of a shared link and caches it until the schedule is saved
+        again or one of its courses changes (see :func:`Manager.get_ics_feed`).
+
+        The feed is indexed under each of its courses, so that it can be re-rendered
+        when they change (see :func:`Manager.render_ics_feeds`).
+
+        :param link: the link
+        :type link: str
+        :param choice: the # of the schedule, 0 for main and 1 for best one, etc.
+        :type choice: int
+        :param schedule: the schedule of the link, read from the database if None
+        :type schedule: Optional[schd.Schedule]
+        :param expire_in: the life of the feed, default is the `ics_feeds` ttl
+        :type expire_in: Optional[Dict[str, int]]
+        :return: the feed, with its body, None if the link does not exist
+        :rtype: Optional[Dict[str, Any]]
+        """
+        if schedule is None:
+            schedule = self.get_schedule(link)[0]
+
+        if schedule is None:
+            return None
+
+        project_ids = [int(year["id"]) for year in self.get_project_ids()]
+        if int(schedule.project_id) not in project_ids:
+            schedule.project_id = self.get_default_project_id()
+
+        # Versions are read first, so that a concurrent change invalidates the feed
+        versions = self.server.mget(
+            [f"[SCHEDULE_VERSION]{schedule.id}"]
+            + [
+                f"[COURSE_VERSION,project_id={schedule.project_id}]{code}"
+                for code in schedule.codes
+            ]
+        )
+
+        # Events whose content changed since the last rendering get a new SEQUENCE
+        revisions_key = f"[ICS_REVISIONS,link={link},choice={choice}]"
+        revisions = self.server.get_value(revisions_key) or dict()
+        body = schedule.get_ics_file(schedule_number=choice, revisions=revisions)
+        self.server.set_value(
+            revisions_key, revisions, expire_in=self.ttl["ics_revisions"]
+        )
+
+        feed = dict(
+            schedule_id=schedule.id,
+            label=schedule.label,
+            project_id=schedule.project_id,
+            codes=list(schedule.codes),
+            versions=[int(version or 0) for version in versions],
+            etag=hashlib.sha256(body.encode()).hexdigest(),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+        )
+
+        if expire_in is None:
+            expire_in = self.ttl["ics_feeds"]
+
+        # The body is stored first, so that a feed whose metadata is found has a body
+        self.server.set_value(
+            f"[ICS_FEED_BODY,link={link},choice={choice}]", body, expire_in=expire_in
+        )
+        self.server.set_value(
+            f"[ICS_FEED,link={link},choice={choice}]", feed, expire_in=expire_in
+        )
+
+        pipe = self.server.pipeline(transaction=False)
+        for code in schedule.codes:
+            key = f"[ICS_FEEDS,project_id={schedule.project_id}]{code}"
+            pipe.sadd(key, f"{choice}:{link}")
+            pipe.expire(key, timedelta(**self.ttl["ics_feeds"]))
+        pipe.execute()
+
+        return dict(feed, body=body)
+
+    def get_indexed_ics_feeds(
+        self, code: str, project_id: str
+    ) -> List[Tuple[str, int]]:
+        """
+        Returns the ICS feeds rendered with a given course (see
+        :func:`Manager.render_ics_feed`), some of which may have expired since.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: the (link, choice) of each feed, sorted
+        :rtype: List[Tuple[str, int]]
+        """
+        members = self.server.smembers(f"[ICS_FEEDS,project_id={project_id}]{code}")
+        feeds = list()
+
+        for member in members:
+            choice, link = member.decode().split(":", 1)
+            feeds.append((link, int(choice)))
+
+        return sorted(feeds)
+
+    def queue_ics_feeds_render(self, code: str, project_id: str) -> bool:
+        """
+        Queues the rendering of the ICS feeds including a course, to be processed by a
+        background worker (see :func:`Manager.process_ics_feeds_render`).
+        A course cannot be queued twice until its feeds start being rendered.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :return: True if the rendering was queued, False if it was already pending or
+            if no feed includes this course
+        :rtype: bool
+        """
+        if not self.server.exists(f"[ICS_FEEDS,project_id={project_id}]{code}"):
+            return False
+
+        return self.server.enqueue(
+            ICS_FEEDS_QUEUE,
+            (code, project_id),
+            unique_key=f"[ICS_FEEDS_PENDING,project_id={project_id}]{code}",
+            expire_in=self.ttl["ics_feeds"],
+        )
+
+    def render_ics_feeds(
+        self,
+        code: str,
+        project_id: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        Renders again the ICS feeds including a course, so that the next polls of their
+        links are served from cache.
+
+        Schedules are read from the database by batches of `FEEDS_BATCH_SIZE`. Feeds
+        that are already being rendered by another worker are skipped, and feeds that
+        expired because their link was not polled anymore are removed from the index:
+        rendering a feed does not extend its life.
+
+        :param code: the code of the course
+        :type code: str
+        :param project_id: the project id
+        :type project_id: str
+        :param progress: if present, called with the number of feeds processed and the
+            total number of feeds, after each batch
+        :type progress: Optional[Callable[[int, int], None]]
+        :return: the number of feeds rendered
+        :rtype: int
+        """
+        index = f"[ICS_FEEDS,project_id={project_id}]{code}"
+        feeds = self.get_indexed_ics_feeds(code, project_id=project_id)
+        n_rendered = 0
+
+        for i in range(0, len(feeds), FEEDS_BATCH_SIZE):
+            batch = feeds[i : i + FEEDS_BATCH_SIZE]
+            schedules = self.get_schedules(*{link for link, _ in batch})
+
+            for link, choice in batch:
+                key = f"[ICS_FEED,link={link},choice={choice}]"
+                remaining = self.server.ttl(key)
+
+                if remaining <= 0 or link not in schedules:
+                    self.server.srem(index, f"{choice}:{link}")
+                    continue
+
+                lock = self.server.acquire_lock(key, timeout=LOCK_TIMEOUT)
+
+                if lock is None:
+                    continue
+
+                try:
+                    feed = self.render_ics_feed(
+                        link,
+                        choice,
+                        schedule=schedules[link],
+                        expire_in=dict(seconds=remaining),
+                    )
+                finally:
+                    self.server.release_lock(lock)
+
+                if feed is None:  # The link was deleted meanwhile
+                    self.server.srem(index, f"{choice}:{link}")
+                else:
+                    n_rendered += 1
+
+            if progress is not None:
+                progress(i + len(batch), len(feeds))
+
+        return n_rendered
+
+    def process_ics_feeds_render(
+        self, timeout: int = 0, progress: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Waits for a queued rendering of ICS feeds (see
+        :func:`Manager.queue_ics_feeds_render`) and processes it.
+
+        :param timeout: the maximum time to wait for a rendering, in seconds, 0 to wait forever
+        :type timeout: int
+        :param progress: see :func:`Manager.render_ics_feeds`
+        :type progress: Optional[Callable[[int, int], None]]
+        :return: the code of the course and the number of feeds rendered, None if no
+            rendering was queued
+        :rtype: Optional[Tuple[str, int]]
+        """
+        job = self.server.dequeue(ICS_FEEDS_QUEUE, timeout=timeout)
+
+        if job is None:
+            return None
+
+        code, project_id = job
+
+        # Changes made while rendering must queue the feeds again
+        self.server.delete(f"[ICS_FEEDS_PENDING,project_id={project_id}]{code}")
+
+        return code, self.render_ics_feeds(
+            code, project_id=project_id, progress=progress
+        )
+
     def get_plots(self) -> List[Tuple[str, dict]]:
         """
         Returns all the (key, plot) pairs stored in the server.
@@ -1,19 +1,55 @@
+import hashlib
+import json
 import operator
+import sys
 from collections import defaultdict, deque
-from datetime import timedelta
-from heapq import nsmallest
-from itertools import chain, product, repeat, starmap
+from datetime import datetime, timedelta
+from itertools import chain, repeat, starmap
 from random import randint
-from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
-
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from dateutil.tz import gettz
 from flask import current_app as app
 from flask_babel import lazy_gettext as _l
-from ics import Calendar
 
 import backend.events as evt
-from backend.courses import Course, merge_courses
+import backend.icalendar as ical
+import backend.solvers as slv
+from backend.courses import Course, canonical_view, merge_courses
 
 DEFAULT_SCHEDULE_NAME = _l("New schedule")
+
+# Seed used to compute the best schedules in a reproducible way, e.g., to cache them
+DETERMINISTIC_SEED = 1
+
+# Version of the compact state of schedules, as pickled in sessions (see
+# Schedule.to_state and backend.serializers.SessionSerializer)
+STATE_VERSION = 2
+# Attributes of schedules encoded in their compact state, the others are kept as is
+STATE_ATTRIBUTES = (
+    "id",
+    "project_id",
+    "label",
+    "codes",
+    "filtered_subcodes",
+    "best_schedules",
+    "custom_events",
+    "priorities",
+    "color_palette",
+    "options",
+)
+
 COLOR_PALETTE = [
     "#bf616a",
     "#2e3440",
@@ -53,6 +89,115 @@ def default_options() -> defaultdict:
     return defaultdict(false)
 
 
+def to_bitset(ids: Iterable[str], index: Dict[str, int]) -> int:
+    """
+    Returns the bitset of some ids, as an integer whose bit i is set if the id at index
+    i is present.
+
+    :param ids: the ids
+    :type ids: Iterable[str]
+    :param index: the index of each id
+    :type index: Dict[str, int]
+    :return: the bitset
+    :rtype: int
+    """
+    bitset = 0
+    for id in ids:
+        bitset |= 1 << index[id]
+    return bitset
+
+
+def from_bitset(bitset: int, ids: Tuple[str, ...]) -> Set[str]:
+    """
+    Returns the ids present in a bitset, see :func:`to_bitset`.
+
+    :param bitset: the bitset
+    :type bitset: int
+    :param ids: the ids, by index
+    :type ids: Tuple[str, ...]
+    :return: the ids
+    :rtype: Set[str]
+    """
+    return {ids[i] for i in range(bitset.bit_length()) if bitset >> i & 1}
+
+
+def encode_custom_event(event: evt.CustomEvent) -> Any:
+    """
+    Returns a custom event as a plain tuple, see :func:`decode_custom_event`. Events of
+    other types are returned as is.
+
+    Times are stored as timestamps, along with their time zone unless it is
+    :data:`backend.events.TZ`.
+
+    :param event: the event
+    :type event: evt.CustomEvent
+    :return: the tuple
+    :rtype: Any
+    """
+    if type(event) not in (evt.CustomEvent, evt.RecurringCustomEvent):
+        return event
+
+    tz = event.begin.tzinfo
+
+    fields = (
+        event.uid,
+        event.name,
+        event.begin.datetime.timestamp(),
+        event.end.datetime.timestamp(),
+        event.description,
+        event.location,
+        event.weight,
+        event.color,
+        None if tz == gettz(evt.TZ.zone) else tz,
+    )
+
+    if isinstance(event, evt.RecurringCustomEvent):
+        return fields + (
+            event.end_recurrence.datetime.timestamp(),
+            tuple(event.freq),
+        )
+
+    return fields
+
+
+def decode_custom_event(fields: Any) -> evt.CustomEvent:
+    """
+    Returns the custom event encoded by :func:`encode_custom_event`.
+
+    :param fields: the tuple
+    :type fields: Any
+    :return: the event
+    :rtype: evt.CustomEvent
+    """
+    if not isinstance(fields, tuple):
+        return fields
+
+    uid, name, begin, end, description, location, weight, color, tz = fields[:9]
+    tz = tz or evt.TZ
+    kwargs = dict(
+        uid=uid,
+        name=name,
+        begin=datetime.fromtimestamp(begin, tz),
+        end=datetime.fromtimestamp(end, tz),
+        description=description,
+        location=location,
+        weight=weight,
+    )
+
+    if len(fields) > 9:
+        end_recurrence, freq = fields[9:]
+        event = evt.RecurringCustomEvent(
+            end_recurrence=datetime.fromtimestamp(end_recurrence, tz),
+            freq=list(freq),
+            **kwargs,
+        )
+    else:
+        event = evt.CustomEvent(**kwargs)
+
+    event.color = color
+    return event
+
+
 class Schedule:
     """
     A schedule is essentially a combination of courses stored as a master course, from which some events can be removed.
@@ -78,6 +223,152 @@ class Schedule:
         self.color_palette = list(COLOR_PALETTE)
         self.options = dict()
 
+    def to_state(self) -> tuple:
+        """
+        Returns the compact state of this schedule, as pickled in sessions (see
+        :class:`backend.serializers.SessionSerializer`): ids are stored once per course,
+        views as bitsets of these ids (per week for the best schedules) and custom
+        events as plain tuples. Elsewhere, e.g., in the database, schedules are pickled
+        with their full state.
+
+        :return: the state, starting with :data:`STATE_VERSION`
+        :rtype: tuple
+        """
+        views = [self.filtered_subcodes, *self.best_schedules]
+        ids = dict()
+
+        for code in {code for view in views for code in view}:
+            code_ids = set()
+            for view in views:
+                if isinstance(view.get(code), dict):
+                    code_ids.update(*view[code].values())
+                else:
+                    code_ids.update(view.get(code, ()))
+            ids[code] = tuple(sorted(code_ids))
+
+        index = {
+            code: {id: i for i, id in enumerate(code_ids)}
+            for code, code_ids in ids.items()
+        }
+
+        def encode_view(code, view):
+            if isinstance(view, dict):
+                return tuple(
+                    (week, to_bitset(week_ids, index[code]))
+                    for week, week_ids in view.items()
+                )
+            return to_bitset(view, index[code])
+
+        return (
+            STATE_VERSION,
+            self.id,
+            self.project_id,
+            self.label,
+            self.codes,
+            ids,
+            {
+                code: encode_view(code, view)
+                for code, view in self.filtered_subcodes.items()
+            },
+            [
+                {code: encode_view(code, view) for code, view in best.items()}
+                for best in self.best_schedules
+            ],
+            [encode_custom_event(event) for event in self.custom_events],
+            self.priorities,
+            None if self.color_palette == COLOR_PALETTE else self.color_palette,
+            self.options,
+            {
+                attribute: value
+                for attribute, value in self.__dict__.items()
+                if attribute not in STATE_ATTRIBUTES
+            },
+        )
+
+    @classmethod
+    def from_state(cls, state: Union[tuple, Dict[str, Any]]) -> "Schedule":
+        """
+        Returns the schedule of a state, either compact (see :func:`Schedule.to_state`)
+        or full.
+
+        :param state: the state
+        :type state: Union[tuple, Dict[str, Any]]
+        :return: the schedule
+        :rtype: Schedule
+        """
+        schedule = cls.__new__(cls)
+        schedule.__setstate__(state)
+        return schedule
+
+    def __setstate__(self, state: Union[tuple, Dict[str, Any]]):
+        # Full states, as pickled in the database
+        if isinstance(state, dict):
+            self.__dict__.update(state)
+            return
+
+        version = state[0]
+
+        # Compact states of a newer release cannot be guessed
+        if version > STATE_VERSION:
+            raise ValueError(
+                f"Unknown schedule state version `{version}`, this release only reads "
+                f"versions up to `{STATE_VERSION}` and full states"
+            )
+
+        # Version 1 did not store the time zone of custom events
+        if version == 1:
+            custom_events = [
+                fields[:8] + (None,) + fields[8:]
+                if isinstance(fields, tuple)
+                else fields
+                for fields in state[8]
+            ]
+            state = state[:8] + (custom_events,) + state[9:]
+
+        (
+            _,
+            self.id,
+            self.project_id,
+            self.label,
+            self.codes,
+            ids,
+            filtered_subcodes,
+            best_schedules,
+            custom_events,
+            self.priorities,
+            color_palette,
+            self.options,
+            others,
+        ) = state
+
+        ids = {
+            code: tuple(sys.intern(id) for id in code_ids)
+            for code, code_ids in ids.items()
+        }
+
+        def decode_view(code, view):
+            if isinstance(view, tuple):
+                return defaultdict(
+                    set, ((week, from_bitset(bits, ids[code])) for week, bits in view)
+                )
+            return from_bitset(view, ids[code])
+
+        self.filtered_subcodes = default_dict_any_to_set()
+        for code, view in filtered_subcodes.items():
+            self.filtered_subcodes[code] = decode_view(code, view)
+
+        self.best_schedules = list()
+        for best in best_schedules:
+            self.best_schedules.append(defaultdict(default_dict_any_to_set))
+            for code, view in best.items():
+                self.best_schedules[-1][code] = decode_view(code, view)
+
+        self.custom_events = [decode_custom_event(event) for event in custom_events]
+        self.color_palette = (
+            list(COLOR_PALETTE) if color_palette is None else color_palette
+        )
+        self.__dict__.update(others)
+
     def get_min_max_time_slots(self) -> Tuple[str, str]:
         mng = app.config["MANAGER"]
         ext_cals = filter(lambda s: "EXT:" in s, self.codes)
@@ -288,15 +579,18 @@ class Schedule:
             views = self.best_schedules[schedule_number - 1]
 
         # Course Events
+        mng = app.config["MANAGER"]
         n = len(self.color_palette)
         for i, course in enumerate(courses):
-            course_events = course.get_events(view=views[course.code], reverse=True)
             if json:
+                # Rendered once per course content, view and color
                 events.extend(
-                    [e.json(self.color_palette[i % n]) for e in course_events]
+                    mng.get_events_json(
+                        course, views[course.code], self.color_palette[i % n]
+                    )
                 )
             else:
-                events.extend(course_events)
+                events.extend(course.get_events(view=views[course.code], reverse=True))
 
         # Custom user events
         if json:
@@ -319,19 +613,130 @@ class Schedule:
             summary[course.code] = course.get_summary()
         return summary
 
-    def get_ics_file(self, schedule_number: int = 0):
+    def get_ics_file(
+        self, schedule_number: int = 0, revisions: Optional[ical.Revisions] = None
+    ) -> str:
         """
         Returns the .ics (iCalendar) representation of this Schedule.
 
         :param schedule_number: the # of the schedule, 0 for main and 1 for best one, 2 for second best, etc.
         :type schedule_number: int
+        :param revisions: the revisions of the events previously exported, see
+            :func:`backend.icalendar.iter_calendar`
+        :type revisions: Optional[ical.Revisions]
         :return: iCalendar-formatted schedule
         :rtype: str
         """
-        return str(Calendar(events=self.get_events(schedule_number=schedule_number)))
+        return "".join(
+            self.iter_ics_file(schedule_number=schedule_number, revisions=revisions)
+        )
+
+    def iter_ics_file(
+        self, schedule_number: int = 0, revisions: Optional[ical.Revisions] = None
+    ) -> Iterator[str]:
+        """
+        Returns the .ics (iCalendar) representation of this Schedule, chunk by chunk, to
+        be streamed. The events are read when called, and serialized lazily.
+
+        :param schedule_number: the # of the schedule, 0 for main and 1 for best one, 2 for second best, etc.
+        :type schedule_number: int
+        :param revisions: the revisions of the events previously exported, see
+            :func:`backend.icalendar.iter_calendar`
+        :type revisions: Optional[ical.Revisions]
+        :return: the chunks of the iCalendar-formatted schedule
+        :rtype: Iterator[str]
+        """
+        events = self.get_events(schedule_number=schedule_number)
+        return ical.iter_calendar(events, revisions=revisions)
+
+    def get_etag(
+        self,
+        versions: Iterable[int],
+        schedule_number: int = 0,
+        locale: Optional[str] = None,
+    ) -> str:
+        """
+        Returns a weak ETag of the events of this schedule, as returned by
+        :func:`Schedule.get_events`, without building them: the same ETag always
+        stands for the same events, but not necessarily for the same serialization.
+        As the events are rendered with translated texts, the locale is part of it.
+
+        :param versions: the version of each course of this schedule, in the order of the
+            codes (see :func:`backend.manager.Manager.get_course_versions`)
+        :type versions: Iterable[int]
+        :param schedule_number: the # of the schedule, 0 for main and 1 for best one, 2 for second best, etc.
+        :type schedule_number: int
+        :param locale: the locale the events are rendered in
+        :type locale: Optional[str]
+        :return: the ETag
+        :rtype: str
+        """
+        if schedule_number == 0 or schedule_number > len(self.best_schedules):
+            views = self.filtered_subcodes
+        else:
+            views = self.best_schedules[schedule_number - 1]
+
+        content = [
+            str(self.project_id),
+            str(self.label),
+            list(zip(self.codes, versions)),
+            sorted((code, canonical_view(view)) for code, view in views.items()),
+            [event.json() for event in self.custom_events],
+            self.color_palette,
+            locale,
+        ]
+        return hashlib.sha256(json.dumps(content, default=str).encode()).hexdigest()
+
+    def best_schedules_key(
+        self,
+        versions: Optional[Iterable[int]] = None,
+        n_best: int = 5,
+        safe_compute: bool = True,
+        seed: int = DETERMINISTIC_SEED,
+    ) -> str:
+        """
+        Returns a canonical key of everything the best schedules of this schedule depend
+        on (see :func:`Schedule.compute_best`), so that schedules with the same content
+        share the same key.
+
+        :param versions: the version of each course of this schedule, in the order of the
+            codes, to invalidate the key when a course changes; if None, the key only
+            depends on the content of this schedule
+        :type versions: Optional[Iterable[int]]
+        :param n_best: number of best schedules to produce
+        :type n_best: int
+        :param safe_compute: if True, ignore all redundant events at same time period
+        :type safe_compute: bool
+        :param seed: the seed used to shuffle the events of each course
+        :type seed: int
+        :return: the key
+        :rtype: str
+        """
+        begins, ends, weights = slv.to_intervals(self.custom_events)
+        content = [
+            str(self.project_id),
+            sorted(zip(self.codes, versions))
+            if versions is not None
+            else sorted(self.codes),
+            sorted(
+                (code, sorted(ids))
+                for code, ids in self.filtered_subcodes.items()
+                if ids
+            ),
+            sorted(zip(begins.tolist(), ends.tolist(), weights.tolist())),
+            n_best,
+            safe_compute,
+            seed,
+        ]
+        digest = hashlib.sha256(json.dumps(content).encode()).hexdigest()
+        return f"[BEST_SCHEDULES]{digest}"
 
     def compute_best(
-        self, n_best: int = 5, safe_compute: bool = True
+        self,
+        n_best: int = 5,
+        safe_compute: bool = True,
+        progress: Optional[Callable[[int, int, int], None]] = None,
+        seed: Optional[int] = None,
     ) -> List[Iterable[evt.CustomEvent]]:
         """
         Computes best schedules trying to minimize conflicts selecting, for each type of event, one event.
@@ -340,12 +745,19 @@ class Schedule:
         :type n_best: int
         :param safe_compute: if True, ignore all redundant events at same time period
         :type safe_compute: bool
+        :param progress: if present, called after each week with the number of weeks
+            done, the total number of weeks and the number of best schedules found so far
+        :type progress: Optional[Callable[[int, int, int], None]]
+        :param seed: the seed used to shuffle the events of each course, a random one if
+            None (see :data:`DETERMINISTIC_SEED`)
+        :type seed: Optional[int]
         :return: the n_best schedules, but maybe less if cannot find n_best different schedules
         :rtype: List[Iterable[evt.CustomEvent]]
         """
         courses = self.get_courses()
 
-        seed = randint(1, 9999)
+        if seed is None:
+            seed = randint(1, 9999)
 
         if len(courses) == 0:
             return None
@@ -360,8 +772,8 @@ class Schedule:
         ]  # We create an empty list which will contain best schedules
 
         # Forbidden time slots = events that we cannot move and that we want to
-        # minimize conflicts with them
-        fts = self.custom_events
+        # minimize conflicts with them, as arrays to be filtered in each week
+        fts = slv.to_intervals(self.custom_events)
 
         # Merge courses applying reverse view on all of them, then get all the
         # activities
@@ -378,6 +790,9 @@ class Schedule:
         )
         # weeks)
 
+        weeks = []  # The week number and the events of each alternative, by week
+        problems = []
+
         for week, week_data in df_main.groupby("week"):
             if (
                 safe_compute
@@ -419,12 +834,18 @@ class Schedule:
                 ]
             ]
 
-            # Generate all possible schedules for a given week
-            permutations = product(*events)
+            # Search the best schedules for a given week, without generating all of
+            # them, once the problems of all the weeks are known
+            weeks.append((week, events))
+            problems.append(slv.week_costs(events, fts))
 
-            best_weeks = nsmallest(
-                n_best, permutations, key=lambda f: evaluate_week(f, fts)
-            )
+        solved = zip(weeks, slv.solve_weeks(problems, n_best))
+
+        for done, ((week, events), solutions) in enumerate(solved, start=1):
+            best_weeks = [
+                [events[g][a] for g, a in enumerate(assignment)]
+                for _, assignment in solutions
+            ]
 
             n = len(best_weeks)  # Sometimes n < n_best
 
@@ -444,6 +865,9 @@ class Schedule:
                 for event in events:
                     self.best_schedules[i][event.code][week].discard(event.id)
 
+            if progress is not None:
+                progress(done, len(weeks), max_bests_found)
+
         # Will delete all redundant schedules
         del best[max_bests_found:]
         del self.best_schedules[max_bests_found:]
@@ -459,7 +883,11 @@ def evaluate_week(
     week: Iterable[Iterable[evt.CustomEvent]], fts: Iterable[evt.CustomEvent] = None
 ) -> float:
     """
-    Evaluates how much a given week contains conflicts.
+    Evaluates how much a given week contains conflicts, that is the sum of the overlaps
+    between each pair of events, the additional events included.
+
+    :func:`Schedule.compute_best` minimizes this score without evaluating each week,
+    see :func:`backend.solvers.k_best`.
 
     :param week: events in a week as provided by :func:`Schedule.compute_best`
     :type week: Iterable[Iterable[evt.CustomEvent]]
@@ -468,10 +896,12 @@ def evaluate_week(
     :return: the sum of all the conflicts
     :rtype: float
     """
-    week = sorted(chain.from_iterable(week))  # We sort all the events
+    week = list(chain.from_iterable(week))
+
+    # Overlaps between the events of the week, then with the fts
+    score = slv.internal_cost(week)
 
     if fts is not None:
-        week = sorted(week + fts)  # We additionally sort the fts, within the week
-    return sum(
-        starmap(operator.mul, zip(week[:-1], week[1:]))
-    )  # We sum all the overlaps
+        score += slv.overlap_cost(week, fts)
+
+    return score
@@ -0,0 +1,343 @@
+import copyreg
+import io
+import pickle
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.courses import Course
+from backend.schedules import Schedule
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # Optional dependency
+    lz4 = None
+
+# Every value encoded by this module starts with this header, followed by one byte
+# for the codec id and one byte for the compression id.
+# Values stored before the codecs were introduced are plain pickles, which always start
+# with the b"\x80" PROTO opcode, so they can never be mistaken for encoded values.
+MAGIC = b"ADE"
+HEADER_SIZE = len(MAGIC) + 2
+
+PICKLE_PROTOCOL = 5
+
+
+class Codec:
+    """
+    A codec turns any value into bytes, and back.
+    Each codec is identified by a unique id, stored in the header of the encoded values.
+    """
+
+    ID = 0
+    NAME = ""
+
+    def can_encode(self, value: Any) -> bool:
+        """
+        Returns whether this codec is able to encode a given value.
+
+        :param value: the value
+        :type value: Any
+        :return: True if the value can be encoded
+        :rtype: bool
+        """
+        return True
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """
+    Default codec, using pickle's protocol 5.
+    """
+
+    ID = 1
+    NAME = "pickle"
+
+    def encode(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class CourseCodec(PickleCodec):
+    """
+    Codec for courses (or lists of courses, e.g. for course combos), storing them in
+    their columnar representation (see :func:`backend.courses.Course.to_columns`)
+    rather than pickling the objects themselves.
+    """
+
+    ID = 2
+    NAME = "course"
+
+    def can_encode(self, value: Any) -> bool:
+        if isinstance(value, list):
+            return all(isinstance(course, Course) for course in value)
+        return isinstance(value, Course)
+
+    def encode(self, value: Any) -> bytes:
+        if isinstance(value, list):
+            columns = [course.to_columns() for course in value]
+        else:
+            columns = value.to_columns()
+
+        return super().encode(columns)
+
+    def decode(self, data: bytes) -> Any:
+        columns = super().decode(data)
+
+        if isinstance(columns, list):
+            return [Course.from_columns(course) for course in columns]
+        return Course.from_columns(columns)
+
+
+class Compression:
+    """
+    A compression algorithm, identified by a unique id stored in the header of the
+    encoded values.
+    """
+
+    ID = 0
+    NAME = "none"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompression(Compression):
+    ID = 1
+    NAME = "zlib"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCompression(Compression):
+    ID = 2
+    NAME = "zstd"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return zstandard is not None
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class LZ4Compression(Compression):
+    ID = 3
+    NAME = "lz4"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return lz4 is not None
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4.frame.decompress(data)
+
+
+CODECS: Dict[int, Codec] = {codec.ID: codec for codec in (PickleCodec(), CourseCodec())}
+COMPRESSIONS: Dict[int, Compression] = {
+    compression.ID: compression
+    for compression in (
+        Compression(),
+        ZlibCompression(),
+        ZstdCompression(),
+        LZ4Compression(),
+    )
+}
+
+# Key families (identified by the prefix of their key) using a specific codec,
+# all the other keys use the pickle codec
+KEY_FAMILIES: List[Tuple[str, Codec]] = [
+    ("[project_id=", CODECS[CourseCodec.ID]),
+]
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the codec matching a given name.
+
+    :param name: the name of the codec
+    :type name: str
+    :return: the codec
+    :rtype: Codec
+    :raises ValueError: if no codec matches this name
+    """
+    for codec in CODECS.values():
+        if codec.NAME == name:
+            return codec
+
+    raise ValueError(
+        f"Unknown codec `{name}`, make sure it is in this list "
+        f"{[codec.NAME for codec in CODECS.values()]}"
+    )
+
+
+def get_compression(name: Optional[str]) -> Compression:
+    """
+    Returns the compression matching a given name, None meaning no compression.
+
+    :param name: the name of the compression
+    :type name: Optional[str]
+    :return: the compression
+    :rtype: Compression
+    :raises ValueError: if no compression matches this name, or if it requires a
+        package which is not installed
+    """
+    if name is None:
+        name = Compression.NAME
+
+    for compression in COMPRESSIONS.values():
+        if compression.NAME == name.lower():
+            if not compression.is_available():
+                raise ValueError(
+                    f"Compression `{name}` requires an optional package that is not installed"
+                )
+            return compression
+
+    raise ValueError(
+        f"Unknown compression `{name}`, make sure it is in this list "
+        f"{[compression.NAME for compression in COMPRESSIONS.values()]}"
+    )
+
+
+def codec_for_key(key: str) -> Codec:
+    """
+    Returns the codec used for the family of a given key.
+
+    :param key: the key
+    :type key: str
+    :return: the codec
+    :rtype: Codec
+    """
+    for prefix, codec in KEY_FAMILIES:
+        if key.startswith(prefix):
+            return codec
+
+    return CODECS[PickleCodec.ID]
+
+
+def is_encoded(data: bytes) -> bool:
+    """
+    Returns whether some data was encoded with :func:`encode`, or is a legacy pickle.
+
+    :param data: the data
+    :type data: bytes
+    :return: True if the data has a codec header
+    :rtype: bool
+    """
+    return data[: len(MAGIC)] == MAGIC
+
+
+def encode(
+    value: Any,
+    codec: Optional[Codec] = None,
+    compression: Optional[Compression] = None,
+    threshold: int = 1024,
+) -> bytes:
+    """
+    Encodes a value, prefixed by a header identifying the codec and the compression.
+
+    :param value: the value
+    :type value: Any
+    :param codec: the codec, pickle codec if None or if it cannot encode this value
+    :type codec: Optional[Codec]
+    :param compression: the compression, only applied if the encoded value is larger than the threshold
+    :type compression: Optional[Compression]
+    :param threshold: size, in bytes, above which the encoded value is compressed
+    :type threshold: int
+    :return: the encoded value
+    :rtype: bytes
+
+    :Example:
+
+    >>> data = encode(course, codec=CODECS[CourseCodec.ID], compression=get_compression('zlib'))
+    >>> course = decode(data)
+    """
+    if codec is None or not codec.can_encode(value):
+        codec = CODECS[PickleCodec.ID]
+
+    data = codec.encode(value)
+
+    if compression is None or len(data) <= threshold:
+        compression = COMPRESSIONS[Compression.ID]
+    else:
+        data = compression.compress(data)
+
+    return MAGIC + bytes((codec.ID, compression.ID)) + data
+
+
+def decode(data: bytes) -> Any:
+    """
+    Decodes a value encoded with :func:`encode`.
+    Data without header is considered to be a legacy pickled value.
+
+    :param data: the encoded value
+    :type data: bytes
+    :return: the value
+    :rtype: Any
+    """
+    if not is_encoded(data):
+        return pickle.loads(data)
+
+    codec_id, compression_id = data[len(MAGIC)], data[len(MAGIC) + 1]
+    data = COMPRESSIONS[compression_id].decompress(data[HEADER_SIZE:])
+
+    return CODECS[codec_id].decode(data)
+
+
+class SessionPickler(pickle.Pickler):
+    """
+    Pickler of sessions, which pickles schedules in their compact state (see
+    :func:`backend.schedules.Schedule.to_state`).
+    """
+
+    def reducer_override(self, obj: Any) -> Any:
+        if type(obj) is Schedule:
+            return copyreg.__newobj__, (Schedule,), obj.to_state()
+        return NotImplemented
+
+
+class SessionSerializer:
+    """
+    Serializer of the sessions stored by Flask-Session, as large as the schedule they
+    contain and written on every request: schedules are pickled in their compact state
+    (see :class:`SessionPickler`). Anywhere else, e.g., in the database, schedules are
+    pickled with their full state.
+    """
+
+    @staticmethod
+    def dumps(session: Dict[str, Any]) -> bytes:
+        buffer = io.BytesIO()
+        SessionPickler(buffer, protocol=PICKLE_PROTOCOL).dump(session)
+        return buffer.getvalue()
+
+    @staticmethod
+    def loads(data: bytes) -> Dict[str, Any]:
+        return pickle.loads(data)
@@ -1,9 +1,14 @@
+import time
+from collections import OrderedDict
 from datetime import timedelta
-from pickle import dumps, loads
-from typing import Any, Dict, List, Mapping, Optional, Tuple
+from threading import RLock
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from redis import Redis
-from redis.exceptions import ConnectionError
+from redis.exceptions import ConnectionError, LockError
+from redis.lock import Lock
+
+import backend.serializers as srlz
 
 VALID_TTL_KEYS = [
     "days",
@@ -17,18 +22,24 @@ VALID_TTL_KEYS = [
 ]
 
 REQUIRED_CONFIG_KEYS = [
+    "best_schedules",
+    "best_schedules_cache",
     "classrooms",
     "course_resources",
     "courses",
     "courses_notify",
     "courses_renotify",
     "events_in_classroom",
+    "ics_feeds",
+    "ics_revisions",
     "project_ids",
     "resource_ids",
     "resources",
     "user_session",
 ]
 
+CACHE_VERSION_KEY = "[CACHE_VERSION]"
+
 
 def parse_redis_ttl_config(conf: Mapping[str, str]) -> Dict[str, Dict[str, int]]:
     """
@@ -70,18 +81,51 @@ class Server(Redis):
     """
     Subclass of Redis object, aiming to simplify the use of the server to few basic commands.
 
+    Values are encoded with a codec chosen per key family (see :mod:`backend.serializers`),
+    and optionally compressed when larger than a threshold.
+
     :param args: arguments passed to parent constructor
     :type arg: Any
+    :param compression: the name of the compression applied to large values, None for no compression
+    :type compression: Optional[str]
+    :param compression_threshold: size, in bytes, above which values are compressed
+    :type compression_threshold: int
     :param kwargs: keyword arguments passed to parent constructor
     :type kwarg: Any
 
     :Example:
 
-    >>> s = Server(host='localhost', port=6379)
+    >>> s = Server(host='localhost', port=6379, compression='zstd')
     """
 
-    def __init__(self, *arg, **kwargs):
+    def __init__(
+        self,
+        *arg,
+        compression: Optional[str] = None,
+        compression_threshold: int = 1024,
+        **kwargs,
+    ):
         super().__init__(*arg, **kwargs)
+        self.compression = srlz.get_compression(compression)
+        self.compression_threshold = compression_threshold
+
+    def encode_value(self, key: str, value: Any) -> bytes:
+        """
+        Encodes a value with the codec of the family of a given key.
+
+        :param key: the key
+        :type key: str
+        :param value: the value
+        :type value: Any
+        :return: the encoded value
+        :rtype: bytes
+        """
+        return srlz.encode(
+            value,
+            codec=srlz.codec_for_key(key),
+            compression=self.compression,
+            threshold=self.compression_threshold,
+        )
 
     def is_running(self) -> bool:
         """
@@ -123,33 +167,40 @@ class Server(Redis):
 
         :param key: the key
         :type key: str
-        :param value: any object that can be dumped (see pickle.dumps)
+        :param value: any object that can be encoded (see :func:`backend.serializers.encode`)
         :type value: Any
         :param expire_in: dictionary of keyword arguments passed used to create a datetime.timedelta object
         :type expire_in: Optional[Dict[str, int]]
+        :param notify_expire_in: if present, also sets a `{key}_is_alive` notification key expiring after this duration
+        :type notify_expire_in: Optional[Dict[str, int]]
         :param hmap: True if the value passed is a hash-map
         :type hmap: bool
 
+        All the commands are sent in one pipelined round-trip.
+
         :Example:
 
         >>> s.set_value('apple', {'weight': 400, 'unit': 'g'}, expire_in={'hours': 10})
         """
+        pipe = self.pipeline(transaction=False)
+
         if hmap:
-            self.hset(key, mapping=value)
+            pipe.hset(key, mapping=value)
 
             if expire_in:
-                self.expire(key, timedelta(**expire_in))
+                pipe.expire(key, timedelta(**expire_in))
 
         else:
-            dumped_value = dumps(value)
+            dumped_value = self.encode_value(key, value)
             if expire_in:
-                self.setex(key, timedelta(**expire_in), dumped_value)
+                pipe.setex(key, timedelta(**expire_in), dumped_value)
             else:
-                self.set(key, dumped_value)
+                pipe.set(key, dumped_value)
 
         if notify_expire_in:
-            key = f"{key}_is_alive"
-            self.setex(key, timedelta(**notify_expire_in), "")
+            pipe.setex(f"{key}_is_alive", timedelta(**notify_expire_in), "")
+
+        pipe.execute()
 
     def contains(self, *keys: str) -> int:
         """
@@ -184,7 +235,7 @@ class Server(Redis):
             value = self.get(key)
 
             if value:
-                return loads(value)
+                return srlz.decode(value)
             else:
                 return None
 
@@ -202,16 +253,22 @@ class Server(Redis):
         :return: a tuple containing all values found and all keys which did not match
         :rtype: Tuple[Dict[str, Any], List[str]]
         """
-        values = dict()
-        keys_not_found = []
+        if kwargs.get("hmap"):
+            values = dict()
+            keys_not_found = []
 
-        for key in keys:
-            value = self.get_value(prefix + key, **kwargs)
-            if value:
-                # For course combo, a list of courses will be returned
-                values[key] = value
-            else:
-                keys_not_found.append(key)
+            for key in keys:
+                value = self.get_value(prefix + key, **kwargs)
+                if value:
+                    values[key] = value
+                else:
+                    keys_not_found.append(key)
+
+            return values, keys_not_found
+
+        values, keys_not_found, _ = self.get_multiple_values_and_expired(
+            *keys, prefix=prefix, expired=False
+        )
 
         return values, keys_not_found
 
@@ -229,13 +286,389 @@ class Server(Redis):
         :return: a tuple containing all values found and all keys which did not match
         :rtype: Tuple[Dict[str, Optional[bool]]]
         """
-        values = dict()
+        pipe = self.pipeline(transaction=False)
 
         for key in keys:
-            if self.contains(f"{prefix}{key}"):
-                value = not self.contains(f"{prefix}{key}_is_alive")
-            else:
-                value = None
-            values[key] = value
+            pipe.exists(f"{prefix}{key}")
+            pipe.exists(f"{prefix}{key}_is_alive")
+
+        results = pipe.execute()
+        values = dict()
+
+        for i, key in enumerate(keys):
+            exists, alive = results[2 * i], results[2 * i + 1]
+            values[key] = not alive if exists else None
 
         return values
+
+    def get_multiple_values_and_expired(
+        self, *keys: str, prefix: str = "", expired: bool = True
+    ) -> Tuple[Dict[str, Any], List[str], Dict[str, Optional[bool]]]:
+        """
+        Returns, in one pipelined round-trip, all the values corresponding the given keys,
+        the keys which did not match any value and, for each key, whether an expire
+        notification was issued or not (None if the key does not exist).
+        An optional prefix can be added to every key.
+
+        :param keys: the keys
+        :type keys: str
+        :param prefix: the prefix to be added to each key
+        :type prefix: str
+        :param expired: if False, the `{key}_is_alive` notification keys are not checked
+            and the expiry flags are all None
+        :type expired: bool
+        :return: a tuple containing all values found, all keys which did not match and the expiry flags
+        :rtype: Tuple[Dict[str, Any], List[str], Dict[str, Optional[bool]]]
+
+        :Example:
+
+        >>> values, not_found, expired = s.get_multiple_values_and_expired('LEPL1104', prefix='[project_id=9]')
+        """
+        values = dict()
+        keys_not_found = []
+        keys_expired = dict()
+
+        if not keys:
+            return values, keys_not_found, keys_expired
+
+        pipe = self.pipeline(transaction=False)
+        pipe.mget([prefix + key for key in keys])
+
+        if expired:
+            for key in keys:
+                pipe.exists(f"{prefix}{key}_is_alive")
+
+        results = pipe.execute()
+        dumped_values, alive = results[0], results[1:]
+
+        for i, (key, dumped_value) in enumerate(zip(keys, dumped_values)):
+            value = srlz.decode(dumped_value) if dumped_value else None
+
+            # Some values, such as courses without events, are falsy
+            if value is not None:
+                # For course combo, a list of courses will be returned
+                values[key] = value
+            else:
+                keys_not_found.append(key)
+
+            if dumped_value is None or not expired:
+                keys_expired[key] = None
+            else:
+                keys_expired[key] = not alive[i]
+
+        return values, keys_not_found, keys_expired
+
+    def migrate_value(self, key: str) -> bool:
+        """
+        Re-encodes a value stored before the codecs were introduced (plain pickle),
+        keeping its time-to-live.
+
+        :param key: the key
+        :type key: str
+        :return: True if the value was migrated, False if it was already encoded or
+            is not a value stored by :func:`Server.set_value`
+        :rtype: bool
+        """
+        if isinstance(key, bytes):
+            key = key.decode()
+
+        if self.type(key) != b"string":
+            return False
+
+        data = self.get(key)
+
+        if not data or srlz.is_encoded(data):
+            return False
+
+        try:
+            value = srlz.decode(data)
+        except Exception:  # Not a pickled value
+            return False
+
+        ttl = self.pttl(key)
+        self.set(key, self.encode_value(key, value), px=ttl if ttl > 0 else None)
+        return True
+
+    def enqueue(
+        self,
+        queue: str,
+        job: Any,
+        unique_key: Optional[str] = None,
+        expire_in: Optional[Dict[str, int]] = None,
+    ) -> bool:
+        """
+        Appends a job to a queue (a Redis list), to be processed by a worker.
+
+        :param queue: the name of the queue
+        :type queue: str
+        :param job: any object that can be encoded (see :func:`backend.serializers.encode`)
+        :type job: Any
+        :param unique_key: if present, the job is only queued if this key does not exist,
+            and the key is created; the worker is in charge of deleting it
+        :type unique_key: Optional[str]
+        :param expire_in: dictionary of keyword arguments used to create a datetime.timedelta
+            object, after which the unique key expires (in case no worker deletes it)
+        :type expire_in: Optional[Dict[str, int]]
+        :return: True if the job was queued
+        :rtype: bool
+        """
+        if unique_key is not None:
+            ex = timedelta(**expire_in) if expire_in else None
+            if not self.set(unique_key, "", nx=True, ex=ex):
+                return False
+
+        self.rpush(queue, self.encode_value(queue, job))
+        return True
+
+    def dequeue(self, queue: str, timeout: int = 0) -> Any:
+        """
+        Pops the oldest job of a queue, waiting for one if the queue is empty.
+
+        :param queue: the name of the queue
+        :type queue: str
+        :param timeout: the maximum time to wait for a job, in seconds, 0 to wait forever
+        :type timeout: int
+        :return: the job, None if the timeout was reached
+        :rtype: Any
+        """
+        item = self.blpop(queue, timeout=timeout)
+
+        if item is None:
+            return None
+
+        return srlz.decode(item[1])
+
+    def acquire_lock(self, key: str, timeout: float = 60) -> Optional[Lock]:
+        """
+        Tries to acquire, without blocking, the lock associated to a key.
+        This is used to make sure that only one worker computes a given value at a time.
+
+        :param key: the key
+        :type key: str
+        :param timeout: the maximum life of the lock, in seconds, in case it is never released
+        :type timeout: float
+        :return: the lock if it was acquired, None if it is already held
+        :rtype: Optional[Lock]
+        """
+        lock = self.lock(f"[LOCK]{key}", timeout=timeout)
+
+        if lock.acquire(blocking=False):
+            return lock
+        return None
+
+    def release_lock(self, lock: Optional[Lock]):
+        """
+        Releases a lock acquired with :func:`Server.acquire_lock`.
+        Does nothing if the lock is None or already expired.
+
+        :param lock: the lock
+        :type lock: Optional[Lock]
+        """
+        if lock is None:
+            return
+        try:
+            lock.release()
+        except LockError:  # The lock expired meanwhile
+            pass
+
+    def wait_for_value(self, key: str, timeout: float, interval: float = 0.05) -> Any:
+        """
+        Waits for a value to be stored, e.g. by a worker holding the lock of this key.
+
+        :param key: the key
+        :type key: str
+        :param timeout: the maximum time to wait, in seconds
+        :type timeout: float
+        :param interval: the time between two checks, in seconds
+        :type interval: float
+        :return: the value, None if the timeout was reached
+        :rtype: Any
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            value = self.get_value(key)
+
+            if value is not None or time.monotonic() >= deadline:
+                return value
+
+            time.sleep(interval)
+
+    def wait_for_release(
+        self, key: str, timeout: float, interval: float = 0.05
+    ) -> bool:
+        """
+        Waits for the lock associated to a key to be released.
+
+        :param key: the key
+        :type key: str
+        :param timeout: the maximum time to wait, in seconds
+        :type timeout: float
+        :param interval: the time between two checks, in seconds
+        :type interval: float
+        :return: True if the lock was released, False if the timeout was reached
+        :rtype: bool
+        """
+        deadline = time.monotonic() + timeout
+
+        while self.exists(f"[LOCK]{key}"):
+            if time.monotonic() >= deadline:
+                return False
+
+            time.sleep(interval)
+
+        return True
+
+    def get_cache_version(self) -> Optional[bytes]:
+        """
+        Returns the current version stamp of the data cached locally by the workers.
+
+        :return: the version stamp, None if it was never set
+        :rtype: Optional[bytes]
+        """
+        return self.get(CACHE_VERSION_KEY)
+
+    def bump_cache_version(self) -> int:
+        """
+        Increments the version stamp of the data cached locally by the workers, so that
+        every :class:`LocalCache` drops its entries on its next version check.
+
+        :return: the new version stamp
+        :rtype: int
+        """
+        return self.incr(CACHE_VERSION_KEY)
+
+
+class LocalCache:
+    """
+    In-process (per-worker) least-recently-used cache, placed in front of the server
+    for slow-changing data.
+
+    Entries are invalidated all at once when the version stamp stored in the server
+    (see :func:`Server.bump_cache_version`) changes. The stamp is checked at most once
+    every `check_interval` seconds, and each entry is dropped after `expire_in` seconds.
+
+    :param server: the server holding the version stamp
+    :type server: Server
+    :param maxsize: the maximum number of entries
+    :type maxsize: int
+    :param check_interval: minimum delay, in seconds, between two version checks
+    :type check_interval: float
+    :param expire_in: maximum age, in seconds, of an entry
+    :type expire_in: float
+
+    :Example:
+
+    >>> cache = LocalCache(s, maxsize=32)
+    >>> cache.get_or_set('[PROJECT_IDs]', lambda: s.hgetall('[PROJECT_IDs]'))
+    """
+
+    def __init__(
+        self,
+        server: Server,
+        maxsize: int = 64,
+        check_interval: float = 5,
+        expire_in: float = 3600,
+    ):
+        self.server = server
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.expire_in = expire_in
+        self.entries = OrderedDict()
+        self.version = None
+        self.last_check = None
+        self.lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def clear(self):
+        """
+        Drops all the entries.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def check_version(self):
+        """
+        Drops all the entries if the version stamp in the server has changed since
+        the last check. The server is queried at most once every `check_interval` seconds.
+        """
+        now = time.monotonic()
+
+        if self.last_check is not None and now - self.last_check < self.check_interval:
+            return
+
+        version = self.server.get_cache_version()
+
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            self.last_check = now
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the value cached for this key.
+
+        :param key: the key
+        :type key: str
+        :param default: the value returned if the key is not cached
+        :type default: Any
+        :return: the cached value or the default value
+        :rtype: Any
+        """
+        self.check_version()
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return default
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        """
+        Caches a value for this key, evicting the least recently used entry if needed.
+
+        :param key: the key
+        :type key: str
+        :param value: the value
+        :type value: Any
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.expire_in, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_set(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        Returns the value cached for this key or, if missing, computes it with `func`,
+        caches it and returns it. None values are never cached.
+
+        :param key: the key
+        :type key: str
+        :param func: function computing the value
+        :type func: Callable[[], Any]
+        :return: the value
+        :rtype: Any
+        """
+        value = self.get(key)
+
+        if value is None:
+            value = func()
+
+            if value is not None:
+                self.set(key, value)
+
+        return value
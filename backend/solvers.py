@@ -0,0 +1,319 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heapreplace, nsmallest
+from itertools import chain, combinations, product, repeat
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import backend.events as evt
+from backend.courses import to_timestamp
+
+# Begins and ends, as timestamps, and weights of events
+Intervals = Tuple[np.ndarray, np.ndarray, np.ndarray]
+# For each group, the cost of each of its alternatives
+Unary = List[np.ndarray]
+# For each group g and each previous group h < g, the cost of each pair of
+# alternatives: pairwise[g][h][a_g, a_h]
+Pairwise = List[List[np.ndarray]]
+# The problem of a week, compact and picklable to be solved by another process
+Problem = Tuple[Unary, Pairwise]
+# A solution: its cost and the alternative chosen in each group
+Solution = Tuple[float, Tuple[int, ...]]
+
+# Default number of processes solving the weeks of a schedule in parallel, 0 meaning
+# that they are solved by the calling process
+WORKERS = 0
+
+_workers = WORKERS
+_executor = None
+
+
+def overlap_cost(
+    events: Iterable[evt.CustomEvent], others: Iterable[evt.CustomEvent]
+) -> float:
+    """
+    Returns the sum of the overlaps between events and other events.
+
+    :param events: the events
+    :type events: Iterable[evt.CustomEvent]
+    :param others: the other events
+    :type others: Iterable[evt.CustomEvent]
+    :return: the sum of all the overlaps
+    :rtype: float
+    """
+    others = list(others)
+    return sum(event * other for event in events for other in others)
+
+
+def internal_cost(events: Iterable[evt.CustomEvent]) -> float:
+    """
+    Returns the sum of the overlaps between each pair of events.
+
+    :param events: the events
+    :type events: Iterable[evt.CustomEvent]
+    :return: the sum of all the overlaps
+    :rtype: float
+    """
+    return sum(a * b for a, b in combinations(events, 2))
+
+
+def to_intervals(events: Iterable[evt.CustomEvent]) -> Intervals:
+    """
+    Returns the begins, ends and weights of events, as arrays.
+
+    :param events: the events
+    :type events: Iterable[evt.CustomEvent]
+    :return: the begins and ends, as timestamps, and the weights
+    :rtype: Intervals
+    """
+    events = list(events)
+    return (
+        np.array([to_timestamp(event.begin) for event in events], dtype=np.float64),
+        np.array([to_timestamp(event.end) for event in events], dtype=np.float64),
+        np.array([event.weight for event in events], dtype=np.float64),
+    )
+
+
+def overlap_matrix(intervals: Intervals, others: Intervals) -> np.ndarray:
+    """
+    Returns the overlap between each interval and each other interval, as
+    :func:`backend.events.CustomEvent.overlap` does.
+
+    :param intervals: the intervals
+    :type intervals: Intervals
+    :param others: the other intervals
+    :type others: Intervals
+    :return: the matrix of the overlaps, one row per interval
+    :rtype: np.ndarray
+    """
+    begins, ends, weights = (array[:, None] for array in intervals)
+    other_begins, other_ends, other_weights = others
+    intersects = (ends > other_begins) & (other_ends > begins)
+    return weights * other_weights * intersects
+
+
+def week_costs(
+    groups: Sequence[Sequence[Sequence[evt.CustomEvent]]],
+    fts: Optional[Intervals] = None,
+) -> Problem:
+    """
+    Computes the costs of all the alternatives of a week, alone and by pair.
+
+    The cost of an alternative alone is the sum of the overlaps between its own events,
+    and with the forbidden time slots. All the overlaps are computed at once, in a
+    matrix, and only the forbidden time slots that fall in the week are considered.
+
+    :param groups: for each group (course and type), the events of each alternative
+        (id)
+    :type groups: Sequence[Sequence[Sequence[evt.CustomEvent]]]
+    :param fts: the forbidden time slots, see :func:`to_intervals`
+    :type fts: Optional[Intervals]
+    :return: the unary and pairwise costs
+    :rtype: Problem
+    """
+    alternatives = [events for group in groups for events in group]
+    owners = np.repeat(
+        np.arange(len(alternatives)), [len(events) for events in alternatives]
+    )
+    intervals = to_intervals(chain.from_iterable(alternatives))
+
+    # indicator[i, a] = 1 if event i belongs to alternative a
+    indicator = np.zeros((len(owners), len(alternatives)))
+    indicator[np.arange(len(owners)), owners] = 1
+
+    overlaps = overlap_matrix(intervals, intervals)
+    np.fill_diagonal(overlaps, 0)
+    costs = indicator.T @ overlaps @ indicator
+
+    # Each pair of events of a same alternative is counted twice
+    unary = costs.diagonal() / 2
+
+    if fts is not None and len(owners) > 0:
+        begins, ends, _ = intervals
+        in_week = (fts[1] > begins.min()) & (fts[0] < ends.max())
+        fts = tuple(array[in_week] for array in fts)
+        unary = unary + overlap_matrix(intervals, fts).sum(axis=1) @ indicator
+
+    bounds = np.cumsum([0] + [len(group) for group in groups])
+    slices = [slice(begin, end) for begin, end in zip(bounds[:-1], bounds[1:])]
+
+    return (
+        [unary[s] for s in slices],
+        [[costs[s, slices[h]] for h in range(g)] for g, s in enumerate(slices)],
+    )
+
+
+def solution_cost(unary: Unary, pairwise: Pairwise, assignment: Sequence[int]) -> float:
+    """
+    Returns the cost of a complete assignment.
+
+    :param unary: the unary costs
+    :type unary: Unary
+    :param pairwise: the pairwise costs
+    :type pairwise: Pairwise
+    :param assignment: the alternative chosen in each group
+    :type assignment: Sequence[int]
+    :return: the cost
+    :rtype: float
+    """
+    cost = 0
+    for g, a in enumerate(assignment):
+        # Summed in the same order as in k_best, for identical rounding
+        step = unary[g][a]
+        for h in range(g):
+            step += pairwise[g][h][a][assignment[h]]
+        cost += step
+    return cost
+
+
+def exhaustive_k_best(unary: Unary, pairwise: Pairwise, k: int) -> List[Solution]:
+    """
+    Returns the k assignments of lowest cost, enumerating all of them.
+
+    Only meant as a reference for :func:`k_best`.
+
+    :param unary: the unary costs
+    :type unary: Unary
+    :param pairwise: the pairwise costs
+    :type pairwise: Pairwise
+    :param k: the number of assignments
+    :type k: int
+    :return: the k best solutions, by increasing cost
+    :rtype: List[Solution]
+    """
+    assignments = product(*(range(len(costs)) for costs in unary))
+    solutions = (
+        (solution_cost(unary, pairwise, assignment), assignment)
+        for assignment in assignments
+    )
+    return nsmallest(k, solutions, key=lambda solution: solution[0])
+
+
+def k_best(unary: Unary, pairwise: Pairwise, k: int) -> List[Solution]:
+    """
+    Returns the k assignments of lowest cost, using a depth-first branch and bound.
+
+    As all costs are non-negative, the cost of a partial assignment, plus the lowest
+    cost of each remaining group given this partial assignment, is a lower bound of the
+    cost of its completions. A partial assignment is pruned as soon as this bound reaches the cost
+    of the current k-th best solution.
+
+    Assignments are explored in the order of :func:`itertools.product`, so ties are
+    broken as :func:`exhaustive_k_best` does and both return the same solutions.
+
+    :param unary: the unary costs
+    :type unary: Unary
+    :param pairwise: the pairwise costs
+    :type pairwise: Pairwise
+    :param k: the number of assignments
+    :type k: int
+    :return: the k best solutions, by increasing cost
+    :rtype: List[Solution]
+    """
+    n = len(unary)
+
+    if k <= 0 or any(len(costs) == 0 for costs in unary):
+        return []
+
+    # columns[h][g][a] is the cost of each alternative of group h > g, paired with the
+    # alternative a of group g, as lists which are faster than arrays that small
+    columns = [
+        [np.asarray(costs, dtype=np.float64).T.tolist() for costs in previous]
+        for previous in pairwise
+    ]
+
+    heap = []  # Max-heap of (-cost, -rank, assignment) of the best solutions
+    assignment = [0] * n
+    rank = 0  # Number of complete assignments found so far
+
+    def bound() -> float:
+        return -heap[0][0] if len(heap) == k else float("inf")
+
+    def search(g: int, cost: float, partial: Unary):
+        # partial[h - g][a] is the cost of choosing the alternative a of group h >= g,
+        # given the alternatives chosen in groups 0, 1, ..., g - 1
+        nonlocal rank
+
+        if g == n:
+            solution = (-cost, -rank, tuple(assignment))
+            rank += 1
+            if len(heap) < k:
+                heappush(heap, solution)
+            else:
+                heapreplace(heap, solution)
+            return
+
+        for a, step in enumerate(partial[0]):
+            new_cost = cost + step
+
+            if new_cost >= bound():
+                continue
+
+            new_partial = [
+                [c + p for c, p in zip(partial[h - g], columns[h][g][a])]
+                for h in range(g + 1, n)
+            ]
+
+            # Each remaining group costs at least its cheapest alternative
+            if new_cost + sum(map(min, new_partial)) >= bound():
+                continue
+
+            assignment[g] = a
+            search(g + 1, new_cost, new_partial)
+
+    search(0, 0, [np.asarray(costs, dtype=np.float64).tolist() for costs in unary])
+
+    return [
+        (-cost, assignment)
+        for cost, _, assignment in sorted(heap, key=lambda s: (-s[0], -s[1]))
+    ]
+
+
+def configure_workers(workers: int):
+    """
+    Sets the number of processes used by :func:`solve_weeks`.
+
+    :param workers: the number of processes, 0 or 1 to solve weeks in the calling
+        process
+    :type workers: int
+    """
+    global _workers, _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+    _workers = workers
+
+
+def solve_weeks(problems: Sequence[Problem], k: int) -> Iterator[List[Solution]]:
+    """
+    Returns the k best solutions of each week, see :func:`k_best`.
+
+    Weeks are independent, so they are solved in parallel by a process-wide pool if
+    more than one worker is configured (see :func:`configure_workers`). The solutions
+    are yielded in the order of the problems, as soon as they are known, whatever the
+    number of workers.
+
+    :param problems: the problem of each week, see :func:`week_costs`
+    :type problems: Sequence[Problem]
+    :param k: the number of solutions per week
+    :type k: int
+    :return: the k best solutions of each week
+    :rtype: Iterator[List[Solution]]
+    """
+    global _executor
+
+    if _workers <= 1 or len(problems) <= 1:
+        return (k_best(unary, pairwise, k) for unary, pairwise in problems)
+
+    if _executor is None:
+        # Forking a process running the app, with its threads and connections, is not
+        # safe
+        _executor = ProcessPoolExecutor(
+            max_workers=_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    unary, pairwise = zip(*problems)
+    return _executor.map(k_best, unary, pairwise, repeat(k))
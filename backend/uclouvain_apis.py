@@ -1,6 +1,105 @@
 import os
+from typing import Any, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default size of the connection pool (per host), (connect, read) timeouts in seconds,
+# and number of retries of the shared HTTP session
+POOL_SIZE = 10
+TIMEOUT = (3.05, 30)
+RETRIES = 3
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class Session(requests.Session):
+    """
+    Subclass of requests.Session, applying a default timeout to every request.
+
+    :param timeout: the default timeout, in seconds, as accepted by :func:`requests.request`
+    :type timeout: Timeout
+    """
+
+    def __init__(self, timeout: Timeout = TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args: Any, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+def create_session(
+    pool_size: int = POOL_SIZE, timeout: Timeout = TIMEOUT, retries: int = RETRIES
+) -> Session:
+    """
+    Creates an HTTP session keeping connections alive in a pool.
+
+    Failed connections are retried for any request, but read errors and 502, 503 or 504
+    responses are only retried for idempotent requests.
+
+    :param pool_size: the maximum number of connections kept alive per host
+    :type pool_size: int
+    :param timeout: the default timeout, in seconds, as accepted by :func:`requests.request`
+    :type timeout: Timeout
+    :param retries: the maximum number of retries
+    :type retries: int
+    :return: the session
+    :rtype: Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = Session(timeout=timeout)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session: Optional[Session] = None
+
+
+def get_session() -> Session:
+    """
+    Returns the HTTP session shared by the whole process, creating it with the default
+    parameters if needed.
+
+    :return: the session
+    :rtype: Session
+    """
+    global _session
+
+    if _session is None:
+        _session = create_session()
+
+    return _session
+
+
+def configure_session(**kwargs: Any) -> Session:
+    """
+    Replaces the HTTP session shared by the whole process.
+
+    :param kwargs: keyword arguments passed to :func:`create_session`
+    :type kwargs: Any
+    :return: the new session
+    :rtype: Session
+    """
+    global _session
+
+    if _session is not None:
+        _session.close()
+
+    _session = create_session(**kwargs)
+    return _session
 
 
 class API(object):
@@ -16,7 +115,7 @@ class API(object):
     @classmethod
     def get(cls, url, **kwargs):
         url = os.path.join(cls.url, url)
-        return requests.get(url=url, **kwargs)
+        return get_session().get(url=url, **kwargs)
 
     @classmethod
     @property
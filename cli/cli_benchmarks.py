@@ -0,0 +1,763 @@
+import multiprocessing
+import pickle
+import random
+import time
+import timeit
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Tuple
+
+import click
+import pandas as pd
+import requests
+from flask import current_app as app
+from flask.cli import with_appcontext
+from ics import Calendar
+from lxml import etree
+
+import backend.ade_api as ade
+import backend.events as evt
+import backend.icalendar as ical
+import backend.resources as rsrc
+import backend.serializers as srlz
+import backend.solvers as slv
+from backend.courses import Course
+from backend.professors import Professor, merge_professors
+
+
+def synthetic_response(content: bytes) -> requests.Response:
+    """
+    Wraps some content into a response, as returned by the API.
+
+    :param content: the content of the response
+    :type content: bytes
+    :return: the response
+    :rtype: requests.Response
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    return response
+
+
+def synthetic_activities(n_activities: int, n_events: int) -> bytes:
+    """
+    Generates the content of a response to the activities request, as returned by the
+    API with detail=17.
+
+    :param n_activities: the number of activities
+    :type n_activities: int
+    :param n_events: the number of events per activity
+    :type n_events: int
+    :return: the content
+    :rtype: bytes
+    """
+    root = etree.Element("activities")
+    start = date(2021, 9, 13)
+    types = ["Cours magistral", "TP", "Examen écrit", "Autre"]
+
+    for i in range(n_activities):
+        code = f"LSYNT{1000 + i // 8}"
+        activity = etree.SubElement(
+            root,
+            "activity",
+            id=str(i),
+            name=f"{code}-{i % 8}",
+            type=types[i % len(types)],
+            code=f"Synthetic course {i // 8}",
+        )
+        events = etree.SubElement(activity, "events")
+        for j in range(n_events):
+            day = start + timedelta(days=7 * j + i % 5)
+            event = etree.SubElement(
+                events,
+                "event",
+                id=f"{i}.{j}",
+                date=day.strftime("%d/%m/%Y"),
+                startHour=f"{8 + 2 * (i % 5):02d}:30",
+                endHour=f"{10 + 2 * (i % 5):02d}:30",
+                note="",
+            )
+            participants = etree.SubElement(event, "eventParticipants")
+            etree.SubElement(
+                participants, "eventParticipant", category="category5", name=code
+            )
+            etree.SubElement(
+                participants,
+                "eventParticipant",
+                category="instructor",
+                name=f"Professor {i % 13}",
+            )
+            etree.SubElement(
+                participants,
+                "eventParticipant",
+                category="classroom",
+                name=f"BARB {i % 20:02d}",
+                id=str(i % 20),
+                type="Auditoire",
+                size="100",
+                address1="Place Sainte Barbe 1",
+                zipCode="1348",
+                city="Louvain-la-Neuve",
+                country="Belgique",
+            )
+
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+
+def synthetic_resources(n_resources: int) -> bytes:
+    """
+    Generates the content of a response to the resources request, as returned by the
+    API with detail=13.
+
+    :param n_resources: the number of resources
+    :type n_resources: int
+    :return: the content
+    :rtype: bytes
+    """
+    root = etree.Element("resources")
+    categories = [rsrc.TYPES.COURSE, rsrc.TYPES.CLASSROOM, rsrc.TYPES.TEACHER]
+
+    for i in range(n_resources):
+        etree.SubElement(
+            root,
+            "resource",
+            id=str(i),
+            name=f"RESOURCE{i}",
+            category=categories[i % len(categories)],
+            type="",
+            path=f"Synthetic.{i // 100}",
+            email="",
+            size="0",
+            address1="",
+            zipCode="",
+            city="",
+            country="",
+            code=f"R{i}",
+        )
+
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+
+def tree_to_events(response: requests.Response) -> list:
+    """
+    Parses all the events of an activities response by building the whole tree, as
+    the API responses were parsed before the streaming parser.
+    """
+    events = []
+    for activity in ade.response_to_root(response).xpath("//activity"):
+        events.extend(ade.parse_activity(activity)[0])
+    return events
+
+
+def tree_to_resources(response: requests.Response) -> list:
+    """
+    Parses all the resources of a resources response by building the whole tree, as
+    the API responses were parsed before the streaming parser.
+    """
+    resources = ade.response_to_root(response).xpath("//resource/.")
+    index = resources[0].attrib.keys()
+    values = [resource.attrib.values() for resource in resources]
+    df = pd.DataFrame(data=values, columns=index, dtype=str)
+    return df.set_index("id").reset_index().values.tolist()
+
+
+def xpath_parse_activity(activity: etree._Element) -> tuple:
+    """
+    Parses an activity with XPath queries on each event, as activities were parsed
+    before the single-pass parser.
+    """
+    activity_id = activity.attrib["name"]
+    activity_name = activity.attrib["code"]
+    event_type = evt.extract_type(activity.attrib["type"], activity_id)
+    event_codes = activity.xpath('.//eventParticipant[@category="category5"]/@name')
+
+    if len(event_codes) == 0:
+        activity_code = evt.extract_code(activity_id)
+    else:
+        activity_code = Counter(event_codes).most_common()[0][0]
+    if activity_code == "":
+        activity_code = "Other"
+
+    events = []
+    for event in activity.xpath(".//event"):
+        rooms = event.xpath('.//eventParticipant[@category="classroom"]')
+        instructors = [
+            Professor(instructor.attrib["name"], None)
+            for instructor in event.xpath('.//eventParticipant[@category="instructor"]')
+        ]
+        t0, t1 = evt.extract_datetime(
+            event.attrib["date"], event.attrib["startHour"], event.attrib["endHour"]
+        )
+        events.append(
+            event_type(
+                name=activity_name,
+                begin=t0,
+                end=t1,
+                professor=merge_professors(instructors),
+                classrooms=[ade.room_to_classroom(room) for room in rooms],
+                id=activity_id,
+                code=activity_code,
+                note=event.attrib["note"],
+            )
+        )
+
+    return events, activity_name, activity_id, activity_code
+
+
+def xpath_to_courses(response: requests.Response) -> list:
+    courses = {}
+    for activity in ade.iterparse_response(response, "activity"):
+        events, activity_name, _, activity_code = xpath_parse_activity(activity)
+
+        if activity_code not in courses and events:
+            courses[activity_code] = Course(activity_code, activity_name)
+        if events:
+            courses[activity_code].add_activity(events)
+
+    return list(courses.values())
+
+
+def xpath_walk(root: etree._Element):
+    """
+    Runs the XPath queries of the former parser, without creating the events.
+    """
+    for activity in root.xpath("//activity"):
+        activity.xpath('.//eventParticipant[@category="category5"]/@name')
+        for event in activity.xpath(".//event"):
+            event.xpath('.//eventParticipant[@category="classroom"]')
+            event.xpath('.//eventParticipant[@category="instructor"]')
+
+
+def single_pass_walk(root: etree._Element):
+    """
+    Walks the activities as the single-pass parser does, without creating the events.
+    """
+    for activity in root.iter("activity"):
+        [ade.event_participants(event) for event in activity.iter("event")]
+
+
+def courses_to_tuples(courses: list) -> list:
+    return [
+        (course.code, course.name, *event_to_tuple(event))
+        for course in courses
+        for event in course.get_events()
+    ]
+
+
+def event_to_tuple(event: evt.AcademicalEvent) -> tuple:
+    """
+    Returns all the fields of an event parsed from the API, except its random uid.
+    """
+    return (
+        event.event_type,
+        event.id,
+        event.code,
+        event.name,
+        event.begin,
+        event.end,
+        event.location,
+        event.description,
+    )
+
+
+def stream_to_events(response: requests.Response) -> list:
+    return ade.response_to_events(response, lambda event: True)
+
+
+def stream_to_resources(response: requests.Response) -> list:
+    return ade.response_to_resources(response).reset_index().values.tolist()
+
+
+def memory_status(field: str) -> float:
+    """
+    Returns a memory usage field (e.g., VmRSS or VmHWM) of the current process.
+
+    Only available on Linux.
+
+    :param field: the field, as found in /proc/self/status
+    :type field: str
+    :return: the memory usage, in MiB
+    :rtype: float
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+
+    raise KeyError(field)
+
+
+def measure(
+    func: Callable[[requests.Response], Any], content: bytes
+) -> Tuple[float, float]:
+    """
+    Parses some content, and returns the duration and the increase of the peak memory
+    usage of the process, lxml's allocations included.
+
+    Meant to run in a fresh process, as the peak memory usage cannot be reset.
+
+    :param func: the parsing function
+    :type func: Callable[[requests.Response], Any]
+    :param content: the content to parse
+    :type content: bytes
+    :return: the duration, in seconds, and the memory increase, in MiB
+    :rtype: Tuple[float, float]
+    """
+    response = synthetic_response(content)
+    before = memory_status("VmRSS")
+    t0 = time.perf_counter()
+    func(response)
+    duration = time.perf_counter() - t0
+    return duration, memory_status("VmHWM") - before
+
+
+@click.group()
+def benchmark():
+    """Benchmarks performance-critical parts of the backend."""
+
+
+@benchmark.command()
+@click.option(
+    "-p",
+    "--pattern",
+    default="\\[project_id=*",
+    help="Pattern of the keys to sample. By default, selects the courses.",
+)
+@click.option("-n", default=50, type=int, help="Maximum number of keys to sample.")
+@click.option(
+    "-r", "--repeat", default=5, type=int, help="Number of decodings per value."
+)
+@with_appcontext
+def codecs(pattern, n, repeat):
+    """Compares the bytes stored and the decode time of the different codecs."""
+    rd = app.config["MANAGER"].server
+
+    values = []
+    for key in rd.scan_iter(match=f"{pattern}"):
+        if len(values) >= n:
+            break
+        if key.endswith(b"_is_alive") or rd.type(key) != b"string":
+            continue
+        try:
+            values.append((key.decode(), srlz.decode(rd.get(key))))
+        except Exception:  # Not a value stored by the server
+            continue
+
+    if not values:
+        click.secho(f"No value found matching {pattern}.", fg="red")
+        return
+
+    click.echo(f"Sampled {len(values)} values matching {pattern}.")
+    click.echo(
+        f"{'codec':>8s} {'compression':>12s} {'bytes':>12s} {'decode (ms)':>12s}"
+    )
+
+    # Values stored as plain pickles, before the codecs were introduced
+    legacy = [pickle.dumps(value) for _, value in values]
+    duration = min(
+        timeit.repeat(
+            lambda: [pickle.loads(data) for data in legacy], number=1, repeat=repeat
+        )
+    )
+    click.echo(
+        f"{'legacy':>8s} {'none':>12s} {sum(map(len, legacy)):12d} {1000 * duration:12.2f}"
+    )
+
+    for codec in srlz.CODECS.values():
+        for compression in srlz.COMPRESSIONS.values():
+            if not compression.is_available():
+                continue
+
+            encoded = [
+                srlz.encode(value, codec=codec, compression=compression, threshold=0)
+                for _, value in values
+            ]
+            size = sum(map(len, encoded))
+            duration = min(
+                timeit.repeat(
+                    lambda: [srlz.decode(data) for data in encoded],
+                    number=1,
+                    repeat=repeat,
+                )
+            )
+            click.echo(
+                f"{codec.NAME:>8s} {compression.NAME:>12s} {size:12d} {1000 * duration:12.2f}"
+            )
+
+
+@benchmark.command()
+@click.option(
+    "-a", "--activities", default=2000, type=int, help="Number of activities."
+)
+@click.option(
+    "-e", "--events", default=12, type=int, help="Number of events per activity."
+)
+@click.option(
+    "-r", "--resources", default=200000, type=int, help="Number of resources."
+)
+def ingestion(activities, events, resources):
+    """Compares the tree-based and the streaming parsing of large synthetic responses."""
+    contents = {
+        "activities": synthetic_activities(activities, events),
+        "resources": synthetic_resources(resources),
+    }
+    parsers = {
+        "activities": [("tree", tree_to_events), ("stream", stream_to_events)],
+        "resources": [("tree", tree_to_resources), ("stream", stream_to_resources)],
+    }
+
+    click.echo(
+        f"{'response':>12s} {'parser':>8s} {'MiB':>8s} {'time (s)':>10s} "
+        f"{'MiB/s':>8s} {'peak (MiB)':>12s}"
+    )
+
+    # Each parsing is done in a fresh process to measure its own peak memory usage
+    context = multiprocessing.get_context("spawn")
+
+    for name, content in contents.items():
+        size = len(content) / 2 ** 20
+
+        # Outputs must be identical
+        response = synthetic_response(content)
+        outputs = [func(response) for _, func in parsers[name]]
+        if any(output != outputs[0] for output in outputs[1:]):
+            click.secho(f"Parsers disagree on {name} response!", fg="red")
+
+        for parser, func in parsers[name]:
+            with context.Pool(1) as pool:
+                duration, peak = pool.apply(measure, (func, content))
+
+            click.echo(
+                f"{name:>12s} {parser:>8s} {size:8.2f} {duration:10.3f} "
+                f"{size / duration:8.2f} {peak:12.2f}"
+            )
+
+
+@benchmark.command()
+@click.option(
+    "-f",
+    "--file",
+    "files",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Recorded activities response, either pickled (as saved for the fake API) "
+    "or raw XML. If absent, a synthetic response is used.",
+)
+@click.option(
+    "-a", "--activities", default=500, type=int, help="Number of synthetic activities."
+)
+@click.option(
+    "-e", "--events", default=12, type=int, help="Number of events per activity."
+)
+@click.option("-r", "--repeat", default=3, type=int, help="Number of parsings.")
+def parsing(files, activities, events, repeat):
+    """Compares the per-event XPath and the single-pass parsing of courses."""
+    responses = {}
+    for file in files:
+        with open(file, "rb") as f:
+            if file.endswith(".pickle"):
+                responses[file] = pickle.load(f)
+            else:
+                responses[file] = synthetic_response(f.read())
+
+    if not responses:
+        responses["synthetic"] = synthetic_response(
+            synthetic_activities(activities, events)
+        )
+
+    click.echo(
+        f"{'response':>20s} {'events':>8s} {'step':>8s} {'xpath (s)':>10s} "
+        f"{'single (s)':>10s} {'speedup':>8s}"
+    )
+
+    for name, response in responses.items():
+        expected = courses_to_tuples(xpath_to_courses(response))
+        got = courses_to_tuples(ade.response_to_courses(response))
+        if expected != got:
+            click.secho(f"Parsers disagree on {name} response!", fg="red")
+
+        # Walking the tree only, then parsing the whole response into courses
+        root = ade.response_to_root(response)
+        steps = {
+            "walk": (xpath_walk, single_pass_walk, root),
+            "courses": (xpath_to_courses, ade.response_to_courses, response),
+        }
+
+        for step, (old, new, arg) in steps.items():
+            durations = [
+                min(timeit.repeat(lambda: func(arg), number=1, repeat=repeat))
+                for func in (old, new)
+            ]
+            click.echo(
+                f"{name[-20:]:>20s} {len(got):8d} {step:>8s} {durations[0]:10.3f} "
+                f"{durations[1]:10.3f} {durations[0] / durations[1]:8.2f}"
+            )
+
+
+@benchmark.command()
+@click.option("-n", default=100000, type=int, help="Number of events.")
+@click.option("-r", "--repeat", default=3, type=int, help="Number of parsings.")
+def datetimes(n, repeat):
+    """Compares the per-event and the vectorized parsing of event dates and hours."""
+    start = date(2021, 9, 13)
+    dates = [(start + timedelta(days=i % 300)).strftime("%d/%m/%Y") for i in range(n)]
+    starts = [f"{8 + i % 10:02d}:{15 * (i % 4):02d}" for i in range(n)]
+    ends = [f"{10 + i % 10:02d}:{15 * (i % 4):02d}" for i in range(n)]
+
+    def per_event():
+        return list(zip(*map(evt.extract_datetime, dates, starts, ends)))
+
+    def vectorized():
+        return evt.extract_datetimes(dates, starts, ends)
+
+    if [list(times) for times in per_event()] != list(vectorized()):
+        click.secho("Parsers disagree!", fg="red")
+
+    durations = [
+        min(timeit.repeat(func, number=1, repeat=repeat))
+        for func in (per_event, vectorized)
+    ]
+    click.echo(f"{'parser':>12s} {'time (s)':>10s} {'events/s':>12s}")
+    for name, duration in zip(("per-event", "vectorized"), durations):
+        click.echo(f"{name:>12s} {duration:10.3f} {n / duration:12.0f}")
+
+
+def synthetic_week(
+    n_groups: int, n_alternatives: int, n_events: int, seed: int
+) -> list:
+    """
+    Generates the events of a week, as grouped by :func:`Schedule.compute_best`.
+
+    :param n_groups: the number of groups (course and type)
+    :type n_groups: int
+    :param n_alternatives: the number of alternatives (id) per group
+    :type n_alternatives: int
+    :param n_events: the number of events per alternative
+    :type n_events: int
+    :param seed: the seed of the random generator
+    :type seed: int
+    :return: for each group, the events of each alternative
+    :rtype: list
+    """
+    rng = random.Random(seed)
+    monday = evt.TZ.localize(datetime(2021, 9, 13, 8))
+
+    def event():
+        # Two hours slots, from 8:00 to 18:00, Monday to Friday
+        begin = monday + timedelta(days=rng.randrange(5), hours=2 * rng.randrange(5))
+        return evt.CustomEvent(
+            name="event", begin=begin, end=begin + timedelta(hours=2), weight=5
+        )
+
+    return [
+        [[event() for _ in range(n_events)] for _ in range(n_alternatives)]
+        for _ in range(n_groups)
+    ]
+
+
+@benchmark.command()
+@click.option("-g", "--groups", default=8, type=int, help="Number of groups.")
+@click.option(
+    "-a",
+    "--alternatives",
+    default=4,
+    type=int,
+    help="Number of alternatives per group.",
+)
+# By default, more events than the 25 slots of a week, so that every schedule conflicts
+@click.option(
+    "-e", "--events", default=4, type=int, help="Number of events per alternative."
+)
+@click.option("-k", default=5, type=int, help="Number of best schedules.")
+@click.option(
+    "--max-exhaustive",
+    default=10 ** 6,
+    type=int,
+    help="Maximum number of schedules for the exhaustive search to be run.",
+)
+@click.option("-s", "--seed", default=0, type=int, help="Seed of the synthetic week.")
+def solver(groups, alternatives, events, k, max_exhaustive, seed):
+    """Compares the exhaustive and the branch and bound search of the best weeks."""
+    week = synthetic_week(groups, alternatives, events, seed)
+
+    start = time.perf_counter()
+    unary, pairwise = slv.week_costs(week)
+    costs = time.perf_counter() - start
+
+    n_schedules = alternatives ** groups
+    click.echo(f"{n_schedules} schedules, costs computed in {costs:.3f}s")
+    click.echo(f"{'search':>12s} {'time (s)':>10s} best costs")
+
+    searches = {"branch": slv.k_best}
+    if n_schedules <= max_exhaustive:
+        searches["exhaustive"] = slv.exhaustive_k_best
+
+    results = {}
+    for name, search in searches.items():
+        start = time.perf_counter()
+        results[name] = search(unary, pairwise, k)
+        duration = time.perf_counter() - start
+        best_costs = ", ".join(f"{cost:g}" for cost, _ in results[name])
+        click.echo(f"{name:>12s} {duration:10.3f} {best_costs}")
+
+    if len(results) > 1 and results["branch"] != results["exhaustive"]:
+        click.secho("Searches disagree!", fg="red")
+
+    if results["branch"] and results["branch"][0][0] == 0:
+        click.secho(
+            "The week has no conflict, add events to measure the search.", fg="yellow"
+        )
+
+
+@benchmark.command()
+@click.option("-w", "--weeks", default=13, type=int, help="Number of weeks.")
+@click.option("-g", "--groups", default=12, type=int, help="Number of groups.")
+@click.option(
+    "-a",
+    "--alternatives",
+    default=5,
+    type=int,
+    help="Number of alternatives per group.",
+)
+@click.option(
+    "-e", "--events", default=3, type=int, help="Number of events per alternative."
+)
+@click.option("-k", default=5, type=int, help="Number of best schedules.")
+@click.option(
+    "-p",
+    "--processes",
+    "workers",
+    multiple=True,
+    type=int,
+    help="Number of worker processes to compare. Defaults to 1, 2, 4, ... up to the "
+    "number of CPUs.",
+)
+def weeks(weeks, groups, alternatives, events, k, workers):
+    """Compares the serial and the parallel search of the best weeks of a schedule."""
+    problems = [
+        slv.week_costs(synthetic_week(groups, alternatives, events, seed))
+        for seed in range(weeks)
+    ]
+
+    if not workers:
+        workers = [1]
+        while 2 * workers[-1] <= multiprocessing.cpu_count():
+            workers.append(2 * workers[-1])
+
+    click.echo(f"{'workers':>8s} {'time (s)':>10s} {'speedup':>8s}")
+
+    expected, reference = None, None
+    for n_workers in workers:
+        slv.configure_workers(n_workers)
+        list(slv.solve_weeks(problems[:2], 1))  # Starts the processes
+
+        start = time.perf_counter()
+        solutions = list(slv.solve_weeks(problems, k))
+        duration = time.perf_counter() - start
+
+        if expected is None:
+            expected, reference = solutions, duration
+        elif solutions != expected:
+            click.secho(f"Solutions differ with {n_workers} workers!", fg="red")
+
+        click.echo(f"{n_workers:8d} {duration:10.3f} {reference / duration:8.2f}")
+
+    slv.configure_workers(slv.WORKERS)
+
+
+@benchmark.command()
+@click.option("-n", default=500, type=int, help="Number of events.")
+@click.option("-r", "--repeat", default=3, type=int, help="Number of serializations.")
+def ics(n, repeat):
+    """Compares the ics library and the direct serialization of calendars."""
+    monday = datetime(2021, 9, 13, 8)
+    events = [
+        evt.EventRecord(
+            evt.EventTP,
+            name=f"Synthetic activity n°{i // 12}, with a rather long name",
+            # Localized as parsed events are, whatever the daylight saving time
+            begin=evt.TZ.localize(monday + timedelta(days=i % 90, hours=2 * (i % 5))),
+            end=evt.TZ.localize(monday + timedelta(days=i % 90, hours=2 * (i % 5) + 2)),
+            professor=Professor("Synthetic professor"),
+            id=f"LSYNT{1000 + i // 96}_Q{i // 12 % 8}",
+            code=f"LSYNT{1000 + i // 96}",
+        )
+        for i in range(n)
+    ]
+
+    def library():
+        return str(Calendar(events=[event.to_event() for event in events]))
+
+    def direct():
+        return ical.to_calendar(events)
+
+    def summary(text):
+        return sorted(
+            (e.name, e.begin, e.end, e.description, e.location)
+            for e in Calendar(text).events
+        )
+
+    if summary(library()) != summary(direct()):
+        click.secho("Serializers disagree!", fg="red")
+
+    click.echo(f"{'serializer':>12s} {'time (s)':>10s} {'events/s':>12s} {'KiB':>8s}")
+    for name, func in (("library", library), ("direct", direct)):
+        duration = min(timeit.repeat(func, number=1, repeat=repeat))
+        size = len(func().encode()) / 1024
+        click.echo(f"{name:>12s} {duration:10.3f} {n / duration:12.0f} {size:8.1f}")
+
+
+@benchmark.command()
+@click.option(
+    "-n", default=1000, type=int, help="Maximum number of sessions to sample."
+)
+@click.option(
+    "-r", "--repeat", default=3, type=int, help="Number of (de)serializations."
+)
+@with_appcontext
+def sessions(n, repeat):
+    """Compares the size and the (de)serialization time of sessions, with their
+    schedules pickled with their full or their compact state."""
+    rd = app.config["MANAGER"].server
+    prefix = app.config.get("SESSION_KEY_PREFIX", "session:")
+
+    values = []
+    for key in rd.scan_iter(match=f"{prefix}*"):
+        if len(values) >= n:
+            break
+        try:
+            values.append(srlz.SessionSerializer.loads(rd.get(key)))
+        except Exception:  # Expired meanwhile, or not a session
+            continue
+
+    if not values:
+        click.secho("No session found.", fg="red")
+        return
+
+    click.echo(f"Sampled {len(values)} sessions.")
+    click.echo(
+        f"{'format':>8s} {'mean (B)':>10s} {'p50 (B)':>10s} {'p90 (B)':>10s} "
+        f"{'p99 (B)':>10s} {'max (B)':>10s} {'dumps (ms)':>11s} {'loads (ms)':>11s}"
+    )
+
+    for name, dumps in (
+        ("full", pickle.dumps),
+        ("compact", srlz.SessionSerializer.dumps),
+    ):
+        data = [dumps(value) for value in values]
+        sizes = pd.Series([len(d) for d in data])
+        dumps_duration = min(
+            timeit.repeat(lambda: [dumps(v) for v in values], number=1, repeat=repeat)
+        )
+        loads_duration = min(
+            timeit.repeat(
+                lambda: [pickle.loads(d) for d in data], number=1, repeat=repeat
+            )
+        )
+        click.echo(
+            f"{name:>8s} {sizes.mean():10.0f} {sizes.quantile(0.5):10.0f} "
+            f"{sizes.quantile(0.9):10.0f} {sizes.quantile(0.99):10.0f} "
+            f"{sizes.max():10d} {1000 * dumps_duration:11.2f} "
+            f"{1000 * loads_duration:11.2f}"
+        )
@@ -87,6 +87,28 @@ def expire(pattern, time, random):
     click.secho(f"Successfully applied expire to {i} keys.", fg="green")
 
 
+@redis.command()
+@click.option(
+    "-p",
+    "--pattern",
+    default="*",
+    help="Pattern of the keys. By default, selects all the keys.",
+)
+@with_appcontext
+def migrate(pattern):
+    """Re-encodes values stored as plain pickles with the current codecs."""
+    rd = app.config["MANAGER"].server
+    session_prefix = app.config.get("SESSION_KEY_PREFIX", "session:").encode()
+
+    i = 0
+    for key in rd.scan_iter(match=f"{pattern}"):
+        if key.startswith(session_prefix) or key.endswith(b"_is_alive"):
+            continue
+        if rd.migrate_value(key):
+            i += 1
+    click.secho(f"Successfully migrated {i} keys.", fg="green")
+
+
 @redis.command()
 @click.option(
     "-p",
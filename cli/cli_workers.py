@@ -0,0 +1,157 @@
+import functools
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+
+@click.group()
+def workers():
+    """Runs background workers."""
+
+
+def worker_options(func: Callable) -> Callable:
+    """
+    Adds the options common to all workers to a command, see :func:`run_worker`.
+
+    :param func: the command
+    :type func: Callable
+    :return: the command, with its options
+    :rtype: Callable
+    """
+    func = click.option(
+        "-t",
+        "--timeout",
+        default=0,
+        type=int,
+        help="Stop after waiting this number of seconds for a job. By default, waits forever.",
+    )(func)
+    return click.option(
+        "-n",
+        "--max-jobs",
+        default=-1,
+        type=int,
+        help="Stop after processing this number of jobs. By default, runs forever.",
+    )(func)
+
+
+def run_worker(
+    process: Callable[..., Optional[Any]],
+    handler: Callable[[Any, float], None],
+    action: str,
+    max_jobs: int,
+    timeout: int,
+) -> Tuple[int, int]:
+    """
+    Processes the jobs of a queue until it is empty for `timeout` seconds or
+    `max_jobs` jobs were processed. A failed job is reported and rolled back, without
+    stopping the worker.
+
+    :param process: processes the next job of the queue, waiting at most `timeout`
+        seconds for it; returns None if there was none
+    :type process: Callable[..., Optional[Any]]
+    :param handler: called with the result of each job and its duration, in seconds
+    :type handler: Callable[[Any, float], None]
+    :param action: what a job does, for failure messages
+    :type action: str
+    :param max_jobs: the maximum number of jobs, negative for no maximum
+    :type max_jobs: int
+    :param timeout: the maximum number of seconds to wait for a job, 0 for no maximum
+    :type timeout: int
+    :return: the number of jobs processed and failed
+    :rtype: Tuple[int, int]
+    """
+    mng = app.config["MANAGER"]
+
+    i = 0
+    n_failed = 0
+    while max_jobs < 0 or i + n_failed < max_jobs:
+        t0 = time.time()
+        try:
+            result = process(timeout=timeout)
+        except Exception as e:
+            n_failed += 1
+            click.secho(f"Failed to {action}: {e!r}", fg="red")
+            mng.database.session.rollback()
+            continue
+
+        if result is None:
+            break
+
+        i += 1
+        handler(result, time.time() - t0)
+
+    return i, n_failed
+
+
+@workers.command()
+@worker_options
+@with_appcontext
+def courses(max_jobs, timeout):
+    """Refreshes the expired courses queued by the application."""
+    mng = app.config["MANAGER"]
+
+    def handler(code, duration):
+        click.echo(f"Refreshed {code} in {duration:.2f} seconds.")
+
+    i, n_failed = run_worker(
+        mng.process_course_refresh, handler, "refresh a course", max_jobs, timeout
+    )
+    click.secho(f"Successfully refreshed {i} courses ({n_failed} failed).", fg="green")
+
+
+@workers.command()
+@worker_options
+@with_appcontext
+def schedules(max_jobs, timeout):
+    """Computes the best schedules submitted by the application."""
+    mng = app.config["MANAGER"]
+
+    def handler(job_id, duration):
+        click.echo(
+            f"Computed best schedules of job {job_id} in {duration:.2f} seconds."
+        )
+
+    i, n_failed = run_worker(
+        mng.process_best_schedules,
+        handler,
+        "compute best schedules",
+        max_jobs,
+        timeout,
+    )
+    click.secho(
+        f"Successfully computed {i} best schedules ({n_failed} failed).", fg="green"
+    )
+
+
+@workers.command()
+@worker_options
+@with_appcontext
+def feeds(max_jobs, timeout):
+    """Renders again the ICS feeds of the courses changed by the application."""
+    mng = app.config["MANAGER"]
+
+    def progress(done, total):
+        click.echo(f"\t{done}/{total} feeds processed.")
+
+    n_feeds = 0
+
+    def handler(job, duration):
+        nonlocal n_feeds
+        code, n_rendered = job
+        n_feeds += n_rendered
+        click.echo(f"Rendered {n_rendered} feeds of {code} in {duration:.2f} seconds.")
+
+    i, n_failed = run_worker(
+        functools.partial(mng.process_ics_feeds_render, progress=progress),
+        handler,
+        "render feeds",
+        max_jobs,
+        timeout,
+    )
+    click.secho(
+        f"Successfully rendered {n_feeds} feeds of {i} courses ({n_failed} failed).",
+        fg="green",
+    )
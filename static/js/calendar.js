@@ -476,10 +476,25 @@ document.addEventListener('DOMContentLoaded', () => {
       },
       compute() {
         this.computing = true;
+        // The best schedules are computed by a job, polled until it is done
+        const poll = (resp) => {
+          if (resp.status === 202) {
+            return new Promise((resolve) => setTimeout(resolve, 1000)).then(() =>
+              axios({
+                method: 'GET',
+                url: Flask.url_for('calendar.get_best_schedules_job', {
+                  job_id: resp.data.job_id,
+                }),
+              }).then(poll)
+            );
+          }
+          return resp;
+        };
         axios({
           method: 'PUT',
           url: Flask.url_for('calendar.compute'),
         })
+          .then(poll)
           .then((resp) => {
             this.n_schedules = resp.data.n_schedules;
             this.selected_schedule = resp.data.selected_schedule;
@@ -1,10 +1,13 @@
 import os
+from datetime import datetime, timedelta
 
 import pytest
 
 import backend.ade_api as ade
+import backend.events as evt
 import backend.servers as srv
 from app import app as ade_scheduler
+from backend.professors import Professor
 
 
 @pytest.fixture(scope="session")
@@ -74,3 +77,25 @@ def courses(ade_client, project_id, resource_ids, app):
 @pytest.fixture
 def server():
     return srv.Server()
+
+
+@pytest.fixture
+def make_events():
+    def make_events(id, n, week_offset=0, **kwargs):
+        """Returns the weekly events of an activity, as stored in courses."""
+        begin = evt.TZ.localize(datetime(2021, 9, 13, 8, 30))
+        kwargs = dict(
+            dict(name=id, professor=Professor("Professor"), code="LEPL1101"), **kwargs
+        )
+        return [
+            evt.EventRecord(
+                evt.EventTP,
+                begin=begin + timedelta(weeks=week_offset + i),
+                end=begin + timedelta(weeks=week_offset + i, hours=2),
+                id=id,
+                **kwargs,
+            )
+            for i in range(n)
+        ]
+
+    return make_events
@@ -1,5 +1,7 @@
 from time import time
 
+import requests
+
 import backend.ade_api as ade
 
 
@@ -149,3 +151,99 @@ def test_all_requests(ade_client, app):
         event = ade.parse_event(events[0], AcademicalEvent, "", "", "")
 
         assert event is not None
+
+
+def test_iterparse_response():
+    content = (
+        b'<?xml version="1.0" encoding="UTF-8"?>'
+        b"<resources>"
+        b'<resource id="1" name="lepl1101"><resource id="3" name="LEPL1101"/></resource>'
+        b'<resource id="2" name="LEPL1102"/>'
+        b"</resources>"
+    )
+    resp = requests.Response()
+    resp._content = content
+
+    resource_ids = ade.response_to_resource_ids(resp)
+
+    assert resource_ids == {"LEPL1101": "1|3", "LEPL1102": "2"}
+
+    resources = ade.response_to_resources(resp)
+    root = ade.response_to_root(resp)
+
+    assert resources.index.tolist() == root.xpath("//resource/@id")
+    assert resources["name"].tolist() == root.xpath("//resource/@name")
+
+    # Elements are cleared once consumed
+    elements = list(ade.iterparse_response(resp, "resource"))
+
+    assert len(elements) == 3
+    assert all(element.get("id") is None for element in elements)
+
+
+def test_response_to_courses_by_resource():
+    def activity(name, code, *participants):
+        return (
+            f'<activity id="{name}" name="{name}" type="TP" code="{code}"><events>'
+            '<event date="13/09/2021" startHour="08:30" endHour="10:30" note="">'
+            "<eventParticipants>"
+            + "".join(
+                f'<eventParticipant category="category5" name="{name}" id="{i}"/>'
+                for name, i in participants
+            )
+            + "</eventParticipants></event></events></activity>"
+        )
+
+    def response(*activities):
+        resp = requests.Response()
+        resp._content = (
+            '<?xml version="1.0" encoding="UTF-8"?><activities>'
+            + "".join(activities)
+            + "</activities>"
+        ).encode()
+        return resp
+
+    activities = [
+        activity("LEPL1101-1", "Course A", ("LEPL1101", "1")),
+        activity("LEPL1101-2", "Course A", ("LEPL1101", "3"), ("LEPL1102", "2")),
+        activity("LEPL1103-1", "Course C", ("LEPL1103", "4")),
+    ]
+    ids = {"LEPL1101": "1|3", "LEPL1102": "2", "LEPL1103": "4", "LEPL1104": "6"}
+    courses, not_matched = ade.response_to_courses_by_resource(
+        response(*activities), ids
+    )
+
+    # Shared activities are attributed to each code, whatever their own code
+    assert courses.keys() == {"LEPL1101", "LEPL1102", "LEPL1103"}
+    assert [len(course) for course in courses["LEPL1101"]] == [2]
+    assert courses["LEPL1102"][0].code == "LEPL1101"
+    assert not_matched == ["LEPL1104"]
+
+    # A resource shared by several codes gives its activities to each of them
+    shared = dict(ids, LEPL1105="3")
+    courses, not_matched = ade.response_to_courses_by_resource(
+        response(*activities), shared
+    )
+
+    assert [len(course) for course in courses["LEPL1105"]] == [1]
+    assert courses["LEPL1105"][0].code == "LEPL1101"
+    assert [len(course) for course in courses["LEPL1101"]] == [2]
+    assert not_matched == ["LEPL1104"]
+
+    # The activity of a sub-resource cannot be attributed, its code is fetched alone
+    activities.append(activity("LEPL1103-2", "Course C", ("LEPL1103A", "5")))
+    courses, not_matched = ade.response_to_courses_by_resource(
+        response(*activities), ids
+    )
+
+    assert courses.keys() == {"LEPL1101", "LEPL1102"}
+    assert not_matched == ["LEPL1103", "LEPL1104"]
+
+    # Unless it was not requested, any code may then be missing the activity
+    activities.append(activity("LEPL1106-1", "Course F", ("LEPL1106A", "7")))
+    courses, not_matched = ade.response_to_courses_by_resource(
+        response(*activities), ids
+    )
+
+    assert courses == dict()
+    assert not_matched == list(ids)
@@ -0,0 +1,75 @@
+import pickle
+
+import backend.courses as crs
+
+
+def test_columnar_course(make_events):
+    course = crs.Course("LEPL1101", "Course")
+    course.add_activity(make_events("A", 3))
+    course.add_activity(make_events("B", 2, week_offset=1))
+
+    assert len(course) == 5
+    assert course.get_summary() == {"TP": {"A", "B"}}
+
+    df = course.get_activities()
+
+    assert df.index.names == crs.INDEX
+    assert df["week"].tolist() == [36, 37, 38, 37, 38]
+
+    assert len(course.get_events(view=["TP: A"])) == 3
+    assert len(course.get_events(view={"TP: A"}, reverse=True)) == 2
+    assert len(course.get_events(view={37: ["TP: A"]})) == 1
+    assert len(course.get_events(view={37: ["TP: A"]}, reverse=True)) == 1
+
+    merged = crs.merge_courses([course, course], views={"LEPL1101": ["TP: B"]})
+
+    assert len(merged) == 4
+    assert merged.get_summary() == {"TP": {"B"}}
+
+
+def test_old_pickles_are_migrated(make_events):
+    events = make_events("A", 3)
+    course = crs.Course("LEPL1101", "Course")
+    course.add_activity(events)
+
+    # Courses used to store their activities in a dataframe
+    old = crs.Course.__new__(crs.Course)
+    old.__dict__.update(
+        code="LEPL1101", name="Course", weight=1, activities=course.get_activities()
+    )
+    migrated = pickle.loads(pickle.dumps(old))
+
+    assert len(migrated) == 3
+    assert migrated.to_columns()["begins"] == course.to_columns()["begins"]
+    assert migrated.get_summary() == course.get_summary()
+
+
+def test_revision(make_events):
+    course = crs.Course("LEPL1101", "Course")
+    course.add_activity(make_events("A", 3))
+    revision = course.revision
+
+    # The revision identifies the content, wherever it is stored
+    assert pickle.loads(pickle.dumps(course)).revision == revision
+    assert crs.Course.from_columns(course.to_columns()).revision == revision
+
+    course.add_activity(make_events("B", 2))
+
+    assert course.revision != revision
+
+
+def test_digest(make_events):
+    course = crs.Course("LEPL1101", "Course")
+    course.add_activity(make_events("A", 3))
+    same = crs.Course("LEPL1101", "Course")
+    same.add_activity(make_events("A", 3))
+
+    # Contrary to the revision, the digest only depends on the content
+    assert same.revision != course.revision
+    assert same.get_digest() == course.get_digest()
+
+    same.set_weights(percentage=80)
+    assert same.get_digest() == course.get_digest()
+
+    same.add_activity(make_events("B", 1))
+    assert same.get_digest() != course.get_digest()
@@ -0,0 +1,89 @@
+import pickle
+from datetime import datetime
+
+import backend.events as evt
+from backend.classrooms import Address, Classroom
+from backend.professors import Professor
+
+
+def test_extract_datetimes():
+    dates = ["13/09/2021", "31/10/2021", "01/01/2022"]
+    starts = ["08:30", "02:30", "16:00"]
+    ends = ["10:30", "03:00", "14:00"]
+
+    begins, ends_ = evt.extract_datetimes(dates, starts, ends)
+
+    expected = [evt.extract_datetime(*args) for args in zip(dates, starts, ends)]
+
+    assert list(zip(begins, ends_)) == expected
+
+    # Hours are local to Brussels, whatever the timezone of the host
+    assert str(begins[0]) == "2021-09-13 08:30:00+02:00"
+    assert str(begins[2]) == "2022-01-01 14:00:00+01:00"
+    assert evt.extract_datetimes([], [], []) == ([], [])
+
+
+def test_extract_datetimes_gap():
+    # 02:30 does not exist in Brussels on the day daylight saving time starts
+    dates = ["28/03/2021", "28/03/2021"]
+    starts = ["02:30", "01:30"]
+    ends = ["04:00", "02:00"]
+
+    begins, ends_ = evt.extract_datetimes(dates, starts, ends)
+
+    expected = [evt.extract_datetime(*args) for args in zip(dates, starts, ends)]
+
+    assert list(zip(begins, ends_)) == expected
+    assert str(begins[0]) == "2021-03-28 03:30:00+02:00"
+    assert str(ends_[1]) == "2021-03-28 03:00:00+02:00"
+
+
+def test_event_record():
+    kwargs = dict(
+        name="LEPL1101",
+        begin=evt.TZ.localize(datetime(2021, 9, 13, 8, 30)),
+        end=evt.TZ.localize(datetime(2021, 9, 13, 10, 30)),
+        professor=Professor("Professor"),
+        classrooms=[
+            Classroom(
+                name="BARB 91",
+                type="Auditoire",
+                size="100",
+                id="42",
+                address=Address(
+                    address1="Place Sainte Barbe 1",
+                    address2="",
+                    zipCode="1348",
+                    city="Louvain-la-Neuve",
+                    country="Belgique",
+                ),
+            )
+        ],
+        id="LEPL1101-1",
+        code="LEPL1101",
+        note="Note",
+    )
+    event = evt.EventCM(**kwargs)
+    record = evt.EventRecord(evt.EventCM, **kwargs)
+
+    assert record == event and event == record
+    assert record.event_type is evt.EventCM
+    assert record.classroom_ids == ("42",)
+
+    # Rendered exactly as the event
+    event.uid = record.uid
+    assert record.json("#000000") == event.json("#000000")
+    assert str(record.to_event()) == str(event)
+
+    unpickled = pickle.loads(pickle.dumps(record))
+    assert unpickled.json("#000000") == record.json("#000000")
+
+    # Ids are the same in every process, even if not computed before pickling
+    fresh = evt.EventRecord(evt.EventCM, **kwargs)
+    assert pickle.loads(pickle.dumps(fresh)).uid == record.uid
+
+    # External events are rendered without their prefix
+    kwargs.pop("classrooms")
+    external = evt.EventEXTERN(**kwargs)
+    record = evt.EventRecord(evt.EventEXTERN, **kwargs)
+    assert record.json()["title"] == external.json()["title"] == "LEPL1101"
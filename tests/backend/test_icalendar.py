@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+import pytest
+from ics import Calendar
+
+import backend.events as evt
+import backend.icalendar as ical
+
+
+@pytest.fixture
+def events(make_events):
+    name = "Théorie des graphes, partie 1; cours\\exercices " * 3
+    events = make_events("LEPL1101_Q1A", 5, name=name)
+    for record in events[1::2]:
+        record.note = "Note"
+
+    begin = events[0].begin
+    events.append(
+        evt.CustomEvent(
+            name="Sport",
+            begin=begin,
+            end=begin + timedelta(hours=1),
+            description="First line\nSecond line",
+            location="Sports hall",
+        )
+    )
+    events.append(
+        evt.RecurringCustomEvent(
+            name="Work",
+            begin=begin,
+            end=begin + timedelta(hours=3),
+            end_recurrence=begin + timedelta(weeks=4),
+            freq=[1, 3],
+        )
+    )
+    return events
+
+
+def summarize(calendar):
+    return sorted(
+        (e.name, e.begin, e.end, e.description or "", e.location or "")
+        for e in calendar.events
+    )
+
+
+def test_to_calendar(events):
+    text = ical.to_calendar(events)
+    expected = Calendar(events=[event.to_event() for event in events])
+
+    # Same events as with the ics library, once parsed
+    assert summarize(Calendar(text)) == summarize(expected)
+
+    lines = text.split("\r\n")
+    assert lines[-1] == ""
+    assert all(len(line.encode()) <= ical.LINE_LENGTH for line in lines)
+    assert "RRULE:FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,WE;UNTIL=20211011T063000Z" in lines
+
+    # Chunks do not change the calendar
+    assert "".join(ical.iter_calendar(events, chunk_size=2)) == text
+
+
+def test_stable_uids(events, make_events):
+    # Courses are parsed again, thus their events built again, each time they are fetched
+    text = ical.to_calendar(make_events("LEPL1101_Q1A", 5))
+
+    assert ical.to_calendar(make_events("LEPL1101_Q1A", 5)) == text
+
+    custom = events[5]
+    assert f"UID:{custom.uid}" in ical.to_calendar([custom])
+
+
+def test_shared_activity(make_events):
+    # The same activity can be in several courses, its events then have distinct UIDs
+    record = make_events("LEPL1101_Q1A", 1)[0]
+    shared = make_events("LEPL1101_Q1A", 1, code="LEPL1102")[0]
+
+    assert shared.uid != record.uid
+
+    text = ical.to_calendar([record, shared, record])
+
+    assert text.count("BEGIN:VEVENT") == 2
+    assert text.count(f"UID:{record.uid}") == 1
+
+
+def test_sequences(events):
+    revisions = dict()
+
+    ical.to_calendar(events, revisions=revisions)
+    assert all(sequence == 0 for _, sequence in revisions.values())
+
+    # Only the events whose content changed get a new sequence
+    events[0].note = "Moved"
+    text = ical.to_calendar(events, revisions=revisions)
+
+    assert text.count("SEQUENCE:1") == 1
+    assert text.count("SEQUENCE:0") == len(events) - 1
+    assert ical.to_calendar(events, revisions=revisions) == text
+
+    # Events removed from the calendar are forgotten
+    removed = events.pop()
+    ical.to_calendar(events, revisions=revisions)
+
+    assert removed.uid not in revisions
+    assert len(revisions) == len(events)
+
+
+def test_fold():
+    assert ical.fold("SUMMARY:short") == "SUMMARY:short"
+
+    line = "DESCRIPTION:" + "é" * 100
+    folded = ical.fold(line)
+
+    assert folded.replace("\r\n ", "") == line
+    assert all(len(part.encode()) <= 75 for part in folded.split("\r\n"))
@@ -0,0 +1,197 @@
+import backend.courses as crs
+import backend.manager as mng
+import backend.schedules as schd
+
+
+class WeeklySchedule(schd.Schedule):
+    """Stands for a schedule whose best schedules take three weeks to compute."""
+
+    def __init__(self):
+        super().__init__("__useless_project__")
+        self.codes = ["LEPL1101"]
+        self.n_computed = 0
+
+    def compute_best(self, n_best=5, progress=None, seed=None):
+        assert seed == schd.DETERMINISTIC_SEED
+
+        self.n_computed += 1
+        self.best_schedules = []
+        for week in range(3):
+            self.best_schedules.append({"LEPL1101": {week: {"TP: LEPL1101_Q1A"}}})
+            progress(week + 1, 3, 1)
+        return [[]]
+
+
+def test_best_schedules_job(server):
+    ttl = {
+        "best_schedules": {"minutes": 1},
+        "best_schedules_cache": {"minutes": 1},
+        "courses": {"minutes": 1},
+    }
+    manager = mng.Manager(None, server, None, ttl)
+    states = []
+
+    def set_best_schedules_job(job_id, status, **kwargs):
+        states.append((status, kwargs.get("done")))
+        mng.Manager.set_best_schedules_job(manager, job_id, status, **kwargs)
+
+    manager.set_best_schedules_job = set_best_schedules_job
+    refreshed = []
+
+    def get_courses(*codes, project_id=None):
+        # The course has expired, and is refreshed when first fetched
+        if not refreshed:
+            refreshed.append(codes)
+            manager.bump_course_version("LEPL1101", project_id=project_id)
+        return []
+
+    manager.get_courses = get_courses
+    schedule = WeeklySchedule()
+    # A new version of the course, for which nothing is cached yet
+    manager.bump_course_version("LEPL1101", project_id=schedule.project_id)
+
+    # Without background worker, the job is done when submitted
+    job_id = manager.submit_best_schedules(schedule)
+    job = manager.get_best_schedules_job(job_id)
+
+    assert states == [
+        ("queued", None),
+        ("running", 0),
+        ("running", 1),
+        ("running", 2),
+        ("running", 3),
+        ("done", None),
+    ]
+    assert job["status"] == "done"
+    assert job["n_schedules"] == 3
+    assert job["best_schedules"] == schedule.best_schedules
+    assert manager.get_best_schedules_job("missing") is None
+
+    # The same content is only computed once, until its course changes
+    job_id = manager.submit_best_schedules(schedule)
+    assert manager.get_best_schedules_job(job_id)["n_schedules"] == 3
+    assert schedule.n_computed == 1
+
+    manager.bump_course_version("LEPL1101", project_id=schedule.project_id)
+    manager.submit_best_schedules(schedule)
+    assert schedule.n_computed == 2
+
+
+def test_get_events_json(server, make_events):
+    course = crs.Course("LEPL1101", "Course")
+    course.add_activity(make_events("A", 3))
+    course.add_activity(make_events("B", 2))
+
+    manager = mng.Manager(None, server, None, {})
+    events = manager.get_events_json(course, {"TP: B"}, "#000000")
+
+    assert [event["title"] for event in events] == ["TP: A"] * 3
+    assert all(event["backgroundColor"] == "#000000" for event in events)
+
+    # Rendered events are cached until the course changes
+    assert manager.get_events_json(course, {"TP: B"}, "#000000") is events
+    assert manager.get_events_json(course, {36: {"TP: A"}}, "#000000") is not events
+
+    course.add_activity(make_events("C", 1))
+
+    assert len(manager.get_events_json(course, {"TP: B"}, "#000000")) == 4
+
+
+def test_store_course(server, make_events):
+    ttl = {"courses": {"minutes": 1}, "courses_notify": {"minutes": 1}}
+    manager = mng.Manager(None, server, None, ttl)
+    key = "[COURSE_VERSION,project_id=__useless_project__]LEPL1101"
+    server.delete("[COURSE_DIGEST,project_id=__useless_project__]LEPL1101")
+
+    def store(*ids):
+        course = crs.Course("LEPL1101", "Course")
+        for id in ids:
+            course.add_activity(make_events(id, 2))
+        manager.store_course("LEPL1101", course, project_id="__useless_project__")
+        return manager.get_course_versions("LEPL1101", project_id="__useless_project__")
+
+    version = store("A")
+
+    # Only changes of content renew the version, which expires with the course
+    assert store("A") == version
+    assert store("A", "B") != version
+    assert 0 < server.ttl(key) <= 60
+
+
+def test_ics_feed(server):
+    schedule = schd.Schedule("1", schedule_id=42, label="Feed")
+    schedule.codes = ["LEPL1101"]
+    schedule.get_ics_file = lambda schedule_number, revisions: "BEGIN:VCALENDAR"
+
+    ttl = {
+        "courses": {"minutes": 1},
+        "ics_feeds": {"minutes": 1},
+        "ics_revisions": {"minutes": 1},
+    }
+    manager = mng.Manager(None, server, None, ttl)
+    manager.get_schedule = lambda link: (schedule, 0)
+    manager.get_project_ids = lambda: [{"id": "1"}]
+
+    assert manager.get_ics_feed("link", 0) is None
+
+    feed = manager.render_ics_feed("link", 0)
+    cached = manager.get_ics_feed("link", 0)
+
+    assert cached["etag"] == feed["etag"]
+    assert cached["label"] == "Feed"
+    assert manager.get_ics_feed_body("link", 0) == feed["body"]
+
+    # Saving the schedule or refreshing one of its courses invalidates the feed
+    manager.bump_schedule_version(42)
+    assert manager.get_ics_feed("link", 0) is None
+
+    manager.render_ics_feed("link", 0)
+    manager.bump_course_version("LEPL1101", project_id="1")
+    assert manager.get_ics_feed("link", 0) is None
+
+
+def test_render_ics_feeds(server):
+    schedules = dict()
+    for link in ("a", "b"):
+        schedules[link] = schd.Schedule("1", schedule_id=len(schedules), label=link)
+        schedules[link].codes = ["LEPL1101"]
+        schedules[
+            link
+        ].get_ics_file = lambda schedule_number, revisions: "BEGIN:VCALENDAR"
+
+    ttl = {
+        "courses": {"minutes": 1},
+        "ics_feeds": {"minutes": 1},
+        "ics_revisions": {"minutes": 1},
+    }
+    manager = mng.Manager(None, server, None, ttl, background_ics_feeds=True)
+    manager.get_schedule = lambda link: (schedules[link], 0)
+    manager.get_schedules = lambda *links: {
+        link: schedules[link] for link in links if link in schedules
+    }
+    manager.get_project_ids = lambda: [{"id": "1"}]
+
+    manager.render_ics_feed("a", 0)
+    manager.render_ics_feed("b", 1)
+    assert manager.get_indexed_ics_feeds("LEPL1101", "1") == [("a", 0), ("b", 1)]
+
+    # A change of the course queues its feeds once, which are then rendered again
+    manager.bump_course_version("LEPL1101", project_id="1")
+    manager.bump_course_version("LEPL1101", project_id="1")
+    assert manager.get_ics_feed("a", 0) is None
+
+    progress = []
+    job = manager.process_ics_feeds_render(
+        timeout=1, progress=lambda *args: progress.append(args)
+    )
+
+    assert job == ("LEPL1101", 2)
+    assert progress == [(2, 2)]
+    assert manager.get_ics_feed("a", 0) is not None
+    assert manager.get_ics_feed("b", 1) is not None
+    assert manager.process_ics_feeds_render(timeout=1) is None
+
+    # Feeds of deleted links are dropped from the index
+    del schedules["b"]
+    assert manager.render_ics_feeds("LEPL1101", "1") == 1
+    assert manager.get_indexed_ics_feeds("LEPL1101", "1") == [("a", 0)]
@@ -0,0 +1,150 @@
+import pickle
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import backend.events as evt
+import backend.schedules as schd
+import backend.serializers as srlz
+
+
+def test_get_etag():
+    schedule = schd.Schedule("__useless_project__")
+    schedule.codes = ["LEPL1101", "LEPL1102"]
+    etag = schedule.get_etag([1, 1])
+
+    assert schedule.get_etag([1, 1]) == etag
+    assert schedule.get_etag([1, 2]) != etag
+
+    # Events are rendered with translated texts
+    assert schedule.get_etag([1, 1], locale="fr") != schedule.get_etag(
+        [1, 1], locale="en"
+    )
+
+    schedule.add_filter("LEPL1101", ["TP: LEPL1101_Q1A"])
+    filtered = schedule.get_etag([1, 1])
+
+    assert filtered != etag
+
+    # Best schedules are only used if selected
+    schedule.best_schedules = [{"LEPL1101": {36: {"TP: LEPL1101_Q1B"}}}]
+
+    assert schedule.get_etag([1, 1]) == filtered
+    assert schedule.get_etag([1, 1], schedule_number=1) != filtered
+
+
+def test_best_schedules_key():
+    schedule = schd.Schedule("__useless_project__")
+    schedule.codes = ["LEPL1101", "LEPL1102"]
+    key = schedule.best_schedules_key()
+
+    # Without versions, only the content of the schedule matters
+    assert schedule.best_schedules_key([1, 1]) != schedule.best_schedules_key([1, 2])
+    assert schedule.best_schedules_key() == key
+
+    schedule.add_filter("LEPL1101", ["TP: LEPL1101_Q1A"])
+
+    assert schedule.best_schedules_key() != key
+
+
+def make_schedule():
+    schedule = schd.Schedule("__useless_project__", schedule_id=1, label="Label")
+    schedule.codes = ["LEPL1101", "LEPL1102"]
+    schedule.add_filter("LEPL1101", ["TP: LEPL1101_Q1A", "TP: LEPL1101_Q1B"])
+    schedule.best_schedules = [
+        {"LEPL1101": {36: {"TP: LEPL1101_Q1B"}, 37: set()}, "LEPL1102": {}}
+    ]
+    begin = evt.TZ.localize(datetime(2021, 9, 13, 8, 30))
+    schedule.add_custom_event(
+        evt.CustomEvent(
+            name="Sport", begin=begin, end=begin + timedelta(hours=1), location="Hall"
+        )
+    )
+    schedule.add_custom_event(
+        evt.RecurringCustomEvent(
+            name="Work",
+            begin=begin,
+            end=begin + timedelta(hours=3),
+            end_recurrence=begin + timedelta(weeks=4),
+            freq=[1, 3],
+        )
+    )
+    schedule.custom_events[0].color = "#000000"
+    return schedule
+
+
+def test_session_state():
+    schedule = make_schedule()
+    data = srlz.SessionSerializer.dumps({"current_schedule": schedule})
+    copy = srlz.SessionSerializer.loads(data)["current_schedule"]
+
+    assert len(data) < len(pickle.dumps(schedule))
+    assert copy.label == "Label"
+    assert copy.codes == schedule.codes
+    assert copy.filtered_subcodes == schedule.filtered_subcodes
+    assert copy.best_schedules == schedule.best_schedules
+    assert copy.color_palette == schedule.color_palette
+    assert [event.json() for event in copy.custom_events] == [
+        event.json() for event in schedule.custom_events
+    ]
+
+    # Best schedules can still be completed
+    copy.best_schedules[0]["LEPL1103"][36].add("TP: LEPL1103_Q1A")
+
+    # Sessions written when custom events did not keep their time zone
+    state = schedule.to_state()
+    custom_events = [fields[:8] + fields[9:] for fields in state[8]]
+    copy = schd.Schedule.from_state((1, *state[1:8], custom_events, *state[9:]))
+
+    assert [event.json() for event in copy.custom_events] == [
+        event.json() for event in schedule.custom_events
+    ]
+
+    # States of unknown versions are not read blindly
+    with pytest.raises(ValueError):
+        schd.Schedule.from_state((schd.STATE_VERSION + 1, *state[1:]))
+
+
+def test_database_state():
+    schedule = make_schedule()
+
+    # Saved schedules keep their full state, readable by any release
+    assert isinstance(schedule.__reduce_ex__(pickle.DEFAULT_PROTOCOL)[2], dict)
+
+    copy = pickle.loads(pickle.dumps(schedule))
+
+    assert copy.__dict__.keys() == schedule.__dict__.keys()
+    assert copy.filtered_subcodes == schedule.filtered_subcodes
+    assert copy.best_schedules == schedule.best_schedules
+
+    # Schedules saved when the compact state was also used in the database
+    copy = pickle.loads(pickle.dumps(schd.Schedule.from_state(schedule.to_state())))
+
+    assert copy.filtered_subcodes == schedule.filtered_subcodes
+
+
+def test_custom_event_time_zone():
+    begin = pytz.timezone("America/New_York").localize(datetime(2021, 11, 5, 8, 30))
+    event = evt.RecurringCustomEvent(
+        name="Call",
+        begin=begin,
+        end=begin + timedelta(hours=1),
+        end_recurrence=begin + timedelta(weeks=2),
+        freq=[4],
+    )
+    copy = schd.decode_custom_event(schd.encode_custom_event(event))
+
+    assert copy.begin == event.begin
+    assert copy.begin.utcoffset() == event.begin.utcoffset()
+    assert copy.end.utcoffset() == event.end.utcoffset()
+    assert copy.end_recurrence == event.end_recurrence
+
+    # Events in the default time zone do not store it
+    event = make_schedule().custom_events[0]
+
+    assert schd.encode_custom_event(event)[8] is None
+    assert (
+        schd.decode_custom_event(schd.encode_custom_event(event)).begin.utcoffset()
+        == event.begin.utcoffset()
+    )
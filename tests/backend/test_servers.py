@@ -1,3 +1,10 @@
+import pickle
+
+import backend.courses as crs
+import backend.serializers as srlz
+import backend.servers as srv
+
+
 class TestServer:
     @staticmethod
     def test_is_running(server):
@@ -24,3 +31,78 @@ class TestServer:
             value_stored = server.get_value(key)
 
             assert value == value_stored
+
+    @staticmethod
+    def test_get_multiple_values_and_expired(server):
+        func = server.get_multiple_values_and_expired
+
+        prefix = "[__useless_key__]"
+
+        server.set_value(prefix + "alive", 1234, notify_expire_in={"hours": 10})
+        server.set_value(prefix + "expired", 1111)
+        server.delete(prefix + "missing")
+
+        values, keys_not_found, expired = func(
+            "alive", "expired", "missing", prefix=prefix
+        )
+
+        assert values == {"alive": 1234, "expired": 1111}
+        assert keys_not_found == ["missing"]
+        assert expired == {"alive": False, "expired": True, "missing": None}
+
+        assert (
+            server.get_multiple_values_expired(
+                "alive", "expired", "missing", prefix=prefix
+            )
+            == expired
+        )
+        assert server.get_multiple_values(
+            "alive", "expired", "missing", prefix=prefix
+        ) == (values, keys_not_found)
+
+        # A course without any event is still found
+        course = crs.Course("LEPL1101", "Course")
+        server.set_value(prefix + "empty", course)
+
+        assert func("empty", prefix=prefix)[:2] == ({"empty": course}, [])
+
+    @staticmethod
+    def test_migrate_value(server):
+        key = "[__useless_key__]legacy"
+        value = {1: "a", 2: "b"}
+
+        server.set(key, pickle.dumps(value), ex=60)
+
+        assert server.get_value(key) == value
+        assert server.migrate_value(key)
+        assert srlz.is_encoded(server.get(key))
+        assert server.get_value(key) == value
+        assert 0 < server.ttl(key) <= 60
+        assert not server.migrate_value(key)
+
+
+class TestLocalCache:
+    @staticmethod
+    def test_get_or_set(server):
+        cache = srv.LocalCache(server, maxsize=2, check_interval=0)
+
+        assert cache.get_or_set("a", lambda: 1) == 1
+        assert cache.get_or_set("a", lambda: 2) == 1
+
+        cache.set("b", 2)
+        cache.set("c", 3)
+
+        assert len(cache) == 2
+        assert cache.get("a") is None  # Least recently used entry was evicted
+
+    @staticmethod
+    def test_version_invalidation(server):
+        cache = srv.LocalCache(server, check_interval=0)
+        cache.check_version()
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+
+        server.bump_cache_version()
+
+        assert cache.get("a") is None
@@ -0,0 +1,80 @@
+import random
+from datetime import datetime, timedelta
+from itertools import product
+
+import backend.events as evt
+import backend.schedules as schd
+import backend.solvers as slv
+
+
+def random_costs(rng, n_groups, max_alternatives, max_cost):
+    sizes = [rng.randint(1, max_alternatives) for _ in range(n_groups)]
+    unary = [[rng.randint(0, max_cost) for _ in range(size)] for size in sizes]
+    pairwise = [
+        [
+            [[rng.randint(0, max_cost) for _ in range(sizes[h])] for _ in range(size)]
+            for h in range(g)
+        ]
+        for g, size in enumerate(sizes)
+    ]
+    return unary, pairwise
+
+
+def test_k_best():
+    rng = random.Random(42)
+
+    for _ in range(200):
+        # Small costs produce many ties, which must be broken the same way
+        unary, pairwise = random_costs(
+            rng, rng.randint(0, 5), 4, rng.choice([0, 1, 3, 20])
+        )
+        k = rng.randint(1, 8)
+
+        assert slv.k_best(unary, pairwise, k) == slv.exhaustive_k_best(
+            unary, pairwise, k
+        )
+
+
+def test_week_costs():
+    rng = random.Random(0)
+    begin = evt.TZ.localize(datetime(2021, 9, 13, 8))
+
+    def event():
+        start = begin + timedelta(hours=rng.randint(0, 20))
+        return evt.CustomEvent(
+            name="event",
+            begin=start,
+            end=start + timedelta(hours=rng.randint(1, 3)),
+            weight=rng.randint(1, 5),
+        )
+
+    groups = [
+        [[event() for _ in range(rng.randint(1, 2))] for _ in range(rng.randint(1, 3))]
+        for _ in range(4)
+    ]
+    fts = [event(), event()]
+    fts[1].end += timedelta(weeks=1)  # Out of the week
+    fts[1].begin += timedelta(weeks=1)
+
+    unary, pairwise = slv.week_costs(groups, slv.to_intervals(fts))
+
+    # The cost of each assignment is the score of its week
+    for assignment in product(*(range(len(group)) for group in groups)):
+        week = [groups[g][a] for g, a in enumerate(assignment)]
+        assert slv.solution_cost(unary, pairwise, assignment) == schd.evaluate_week(
+            week, fts
+        )
+
+
+def test_solve_weeks():
+    rng = random.Random(1)
+    problems = [random_costs(rng, 4, 3, 10) for _ in range(5)]
+    expected = [slv.k_best(unary, pairwise, 3) for unary, pairwise in problems]
+
+    try:
+        slv.configure_workers(2)
+        assert list(slv.solve_weeks(problems, 3)) == expected
+    finally:
+        slv.configure_workers(slv.WORKERS)
+
+    assert list(slv.solve_weeks(problems, 3)) == expected
@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import backend.uclouvain_apis as ucl
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keeps connections alive
+
+    def do_GET(self):
+        self.server.n_requests += 1
+        body = b"<projects/>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.n_connections = 0
+        self.n_requests = 0
+
+    def process_request(self, request, client_address):
+        self.n_connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def stub_api():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    class StubAPI(ucl.API):
+        BASE_URL = f"http://127.0.0.1:{server.server_port}"
+        ENDPOINT = "stub/v0"
+
+    yield server, StubAPI
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # The session shared by the process is restored, without being closed
+    monkeypatch.setattr(ucl, "_session", None)
+    session = ucl.configure_session(pool_size=2)
+
+    yield session
+
+    session.close()
+
+
+def test_session_reuses_connections(stub_api, session):
+    server, api = stub_api
+
+    for _ in range(10):
+        resp = api.get("projects")
+        resp.raise_for_status()
+
+    assert server.n_requests == 10
+    assert server.n_connections == 1
+
+
+def test_session_default_timeout():
+    session = ucl.create_session(timeout=(1, 2))
+
+    assert session.timeout == (1, 2)
+    assert session.get_adapter("https://").max_retries.total == ucl.RETRIES
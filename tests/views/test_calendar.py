@@ -494,6 +494,38 @@ def test_get_events(client, user):
         )
 
 
+@pytest.mark.parametrize("user", ["jyl", "louwi"], indirect=True)
+def test_get_events_not_modified(client, user, manager, monkeypatch):
+    """Test that unchanged events are neither fetched nor sent again"""
+    rv = client.get(
+        url_for("calendar.get_events"), query_string=dict(schedule_number=0)
+    )
+    etag = rv.headers["ETag"]
+
+    assert rv.status_code == 200
+    assert etag.startswith("W/")
+
+    n_calls = 0
+    get_courses = manager.get_courses
+
+    def counted_get_courses(*args, **kwargs):
+        nonlocal n_calls
+        n_calls += 1
+        return get_courses(*args, **kwargs)
+
+    monkeypatch.setattr(manager, "get_courses", counted_get_courses)
+
+    rv = client.get(
+        url_for("calendar.get_events"),
+        query_string=dict(schedule_number=0),
+        headers={"If-None-Match": etag},
+    )
+
+    assert rv.status_code == 304
+    assert rv.headers["ETag"] == etag
+    assert n_calls == 0
+
+
 @pytest.mark.parametrize("user", ["jyl", "louwi"], indirect=True)
 def test_compute(client, user):
     """Test the compute route"""
@@ -510,6 +542,28 @@ def test_compute(client, user):
     )
 
 
+@pytest.mark.parametrize("user", ["jyl", "louwi"], indirect=True)
+def test_compute_changed(client, user, manager, monkeypatch):
+    """Test that best schedules are discarded if the schedule changed meanwhile"""
+    monkeypatch.setattr(manager, "background_best_schedules", True)
+
+    rv = client.put(url_for("calendar.compute"))
+    job_id = json.loads(rv.data)["job_id"]
+
+    assert rv.status_code == 202
+
+    client.patch(url_for("calendar.add_code", code="ELME2M"))
+
+    assert manager.process_best_schedules(timeout=1) == job_id
+
+    best_schedules = session["current_schedule"].best_schedules
+    rv = client.get(url_for("calendar.get_best_schedules_job", job_id=job_id))
+
+    assert rv.status_code == 409
+    assert session["current_schedule"].best_schedules == best_schedules
+    assert "best_schedules_job" not in session
+
+
 @pytest.mark.parametrize("user", ["jyl", "louwi"], indirect=True)
 def test_update_color(client, user):
     """Test the update_color route"""
@@ -142,6 +142,7 @@ def delete_schedule(id):
 
     if schedule is not None:
         current_user.remove_schedule(schedule)
+        app.config["MANAGER"].bump_schedule_version(id)
 
     if id == session["current_schedule"].id or id == -1:
         mng = app.config["MANAGER"]
@@ -187,6 +188,7 @@ def update_label(id):
     if schedule and session["current_schedule"].id == int(id):
         session["current_schedule"].label = label
         schedule.update_label(label)
+        app.config["MANAGER"].bump_schedule_version(schedule.id)
         return "OK", 200
     return gettext("Schedule n°%d is not in your schedule list.") % int(id), 403
 
@@ -97,7 +97,10 @@ def get_events():
         session["current_schedule"] = schedule
         return redirect(url_for("calendar.index"))
 
-    return (jsonify({"events": schedule.get_events(json=True)}), 200)
+    def build():
+        return jsonify({"events": schedule.get_events(json=True)}), 200
+
+    return utl.conditional_response(utl.schedule_etag(schedule), build, weak=True)
 
 
 @api.route("/shield/user", methods=["GET"])
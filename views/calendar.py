@@ -5,6 +5,7 @@ from typing import Any
 from flask import Blueprint
 from flask import current_app as app
 from flask import (
+    Response,
     g,
     jsonify,
     make_response,
@@ -329,30 +330,65 @@ def download():
     except ValueError:
         choice = 0
 
-    if link:
-        schedule = mng.get_schedule(link)[0]
-    else:
-        schedule = session["current_schedule"]
-
-    project_ids = [int(year["id"]) for year in mng.get_project_ids()]
-    if int(schedule.project_id) not in project_ids:
-        schedule.project_id = mng.get_default_project_id()
-
-    if schedule is None:
+    def does_not_exist():
         return (
             gettext("The schedule you requested does not exist in our database !"),
             400,
         )
+
+    if link:
+        feed = mng.get_ics_feed(link, choice)
+
+        if feed is None:
+            feed = mng.render_ics_feed(link, choice)
+
+            if feed is None:
+                return does_not_exist()
+
+        def build():
+            body = feed.get("body") or mng.get_ics_feed_body(link, choice)
+            if body is None:  # Expired since the feed was read
+                rendered = mng.render_ics_feed(link, choice)
+                if rendered is None:  # The link was deleted meanwhile
+                    return does_not_exist()
+                body = rendered["body"]
+            resp = make_response(body)
+            resp.mimetype = "text/calendar"
+            return resp
+
+        resp = utl.conditional_response(
+            feed["etag"], build, last_modified=feed["last_modified"]
+        )
+
+        if resp.status_code == 400:
+            return resp
+        label, schedule_id = feed["label"], feed["schedule_id"]
     else:
-        resp = make_response(schedule.get_ics_file(schedule_number=choice))
-        resp.mimetype = "text/calendar"
-        resp.headers["Content-Disposition"] = (
-            "attachment; filename="
-            + "".join(c for c in schedule.label if c.isalnum() or c in ("_")).rstrip()
-            + ".ics"
+        schedule = session["current_schedule"]
+
+        project_ids = [int(year["id"]) for year in mng.get_project_ids()]
+        if int(schedule.project_id) not in project_ids:
+            schedule.project_id = mng.get_default_project_id()
+
+        def build():
+            # Streamed, as the calendar is not kept
+            return Response(
+                schedule.iter_ics_file(schedule_number=choice),
+                mimetype="text/calendar",
+            )
+
+        resp = utl.conditional_response(
+            utl.schedule_etag(schedule, schedule_number=choice), build, weak=True
         )
-        g.track_var["schedule download"] = schedule.id
-        return resp
+        label, schedule_id = schedule.label, schedule.id
+
+    resp.headers["Content-Disposition"] = (
+        "attachment; filename="
+        + "".join(c for c in label if c.isalnum() or c in ("_")).rstrip()
+        + ".ics"
+    )
+    g.track_var["schedule download"] = schedule_id
+    return resp
 
 
 @calendar.route("/share", methods=["GET"])
@@ -416,29 +452,77 @@ def export():
 
 @calendar.route("/schedule/events", methods=["GET"])
 def get_events():
+    schedule = session["current_schedule"]
     schedule_number = int(request.args.get("schedule_number"))
-    return (
-        jsonify(
-            {
-                "events": session["current_schedule"].get_events(
-                    json=True, schedule_number=schedule_number
-                )
-            }
-        ),
-        200,
-    )
+    etag = utl.schedule_etag(schedule, schedule_number=schedule_number)
 
+    # The autosave adds the unsaved status to the response
+    if session["current_schedule_modified"]:
+        etag = f"{etag}-unsaved"
+
+    def build():
+        events = schedule.get_events(json=True, schedule_number=schedule_number)
+        return jsonify({"events": events}), 200
+
+    return utl.conditional_response(etag, build, weak=True)
+
+
+def best_schedules_job_response(job_id: str):
+    """
+    Returns the state of a best schedules job of the current session. Once the job is
+    done, its results are written in the current schedule and returned, unless the
+    schedule changed since the job was submitted.
+    """
+    mng = app.config["MANAGER"]
+    job = mng.get_best_schedules_job(job_id)
+
+    if job is None or job_id != session.get("best_schedules_job"):
+        return gettext("This job does not exist or expired."), 404
+
+    if job["status"] == "failed":
+        session.pop("best_schedules_job")
+        session.pop("best_schedules_key", None)
+        return gettext("The best schedules could not be computed."), 500
+
+    if job["status"] != "done":
+        return (
+            jsonify(
+                {
+                    "job_id": job_id,
+                    "status": job["status"],
+                    "done": job.get("done", 0),
+                    "total": job.get("total"),
+                    "n_schedules": job.get("n_schedules", 0),
+                }
+            ),
+            202,
+        )
+
+    session.pop("best_schedules_job")
+    key = session.pop("best_schedules_key", None)
+
+    # Codes, filters or custom events were changed while the job was running
+    if key != session["current_schedule"].best_schedules_key():
+        return (
+            gettext(
+                "Your schedule changed while its best schedules were computed, "
+                "please compute them again."
+            ),
+            409,
+        )
+
+    bests = job["best_schedules"]
+
+    if bests is not None:
+        session["current_schedule"].best_schedules = bests
+        session["current_schedule_modified"] = True
 
-@calendar.route("/schedule/best", methods=["PUT"])
-def compute():
-    bests = session["current_schedule"].compute_best()
-    session["current_schedule_modified"] = True
     return (
         jsonify(
             {
-                "n_schedules": len(session["current_schedule"].best_schedules)
-                if bests is not None
-                else 0,
+                "job_id": job_id,
+                "status": job["status"],
+                "n_schedules": job["n_schedules"],
                 "events": session["current_schedule"].get_events(
                     json=True, schedule_number=1
                 )
@@ -451,6 +535,22 @@ def compute():
     )
 
 
+@calendar.route("/schedule/best", methods=["PUT"])
+def compute():
+    mng = app.config["MANAGER"]
+    schedule = session["current_schedule"]
+    key = schedule.best_schedules_key()
+    job_id = mng.submit_best_schedules(schedule)
+    session["best_schedules_job"] = job_id
+    session["best_schedules_key"] = key
+    return best_schedules_job_response(job_id)
+
+
+@calendar.route("/schedule/best/<job_id>", methods=["GET"])
+def get_best_schedules_job(job_id):
+    return best_schedules_job_response(job_id)
+
+
 @calendar.route("/schedule/best", methods=["DELETE"])
 def reset_best_schedules():
     session["current_schedule"].reset_best_schedules()
@@ -1,8 +1,12 @@
 import json
 import uuid
+from datetime import datetime
+from typing import Any, Callable, Optional
 
+from flask import Response
 from flask import current_app as app
-from flask import session
+from flask import make_response, request, session
+from flask_babel import get_locale
 from flask_login import current_user
 
 import backend.schedules as schd
@@ -57,3 +61,60 @@ def autoload_schedule():
         ):
             session["current_schedule"] = schedule.data
             schedule.update_last_modified_by(session["uuid"])
+
+
+def schedule_etag(schedule: schd.Schedule, schedule_number: int = 0) -> str:
+    """
+    Returns the ETag of the events of a schedule, from its content and the versions of
+    its courses and the locale, without fetching them. It is to be sent as a weak ETag,
+    see :func:`conditional_response`.
+    """
+    mng = app.config["MANAGER"]
+    versions = mng.get_course_versions(*schedule.codes, project_id=schedule.project_id)
+    return schedule.get_etag(
+        versions, schedule_number=schedule_number, locale=str(get_locale())
+    )
+
+
+def conditional_response(
+    etag: str,
+    build: Callable[[], Any],
+    last_modified: Optional[datetime] = None,
+    weak: bool = False,
+) -> Response:
+    """
+    Returns a `304 Not Modified` response if the client already has this ETag, or a
+    copy as recent as `last_modified` when it sends no ETag, else the response built by
+    `build`, which is only called in that case. Error responses are returned as built.
+
+    A weak ETag only guarantees that the response is semantically the same, not that
+    its body is byte-identical (e.g. translated texts or SEQUENCE numbers may differ).
+    """
+    if request.if_none_match:
+        if weak:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (
+            last_modified is not None
+            and request.if_modified_since is not None
+            and request.if_modified_since >= last_modified
+        )
+
+    if not_modified:
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+
+        # Errors do not get validators, so that they are not cached
+        if response.status_code >= 400:
+            return response
+
+    response.set_etag(etag, weak=weak)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients must check that their copy is still valid before using it
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response